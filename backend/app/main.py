@@ -4,6 +4,7 @@ from fastapi.staticfiles import StaticFiles
 import os
 
 from .routers import documents
+from .utils.compression import CompressionMiddleware
 
 app = FastAPI(
     title="Document Translation API",
@@ -20,6 +21,9 @@ app.add_middleware(
     allow_headers=["*"],  # Hoặc chỉ định cụ thể các header cần thiết
 )
 
+# Nén response JSON lớn (ví dụ kết quả trích xuất của workbook lớn) bằng brotli hoặc gzip
+app.add_middleware(CompressionMiddleware)
+
 # Thêm router
 app.include_router(documents.router)
 
@@ -1,120 +1,615 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Form
 from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import io
 import os
-from typing import List, Dict, Optional
+import json
+import threading
+from typing import BinaryIO, List, Dict, Optional, Any, Tuple
 import tempfile
 import shutil
 import urllib.parse
 
-from ..utils.pdf_handler import PDFHandler
+from ..utils.pdf_handler import PDFHandler, SEGMENTATION_MODES
 from ..utils.excel_handler import ExcelHandler
 from ..utils.word_handler import WordHandler
-from ..utils.translator import Translator
+from ..utils.translator import Translator, ProgressTracker
+from ..utils.job_manager import JobManager, JobQueueFull, Job
+from ..utils.document_store import DocumentStore, StoredDocument
+from ..utils.memory_monitor import MemoryMonitor
+from ..utils.segment_codec import SegmentCodec
+from ..utils.fast_json import FastJSONResponse
+from ..utils import fast_json
 
 router = APIRouter(
     prefix="/api/documents",
     tags=["documents"],
     responses={404: {"description": "Not found"}},
+    default_response_class=FastJSONResponse,
 )
 
 pdf_handler = PDFHandler()
 excel_handler = ExcelHandler()
 word_handler = WordHandler()
 translator = Translator()
+job_manager = JobManager(
+    workers=int(os.environ.get("JOB_WORKERS", "2")),
+    max_queue=int(os.environ.get("JOB_QUEUE_SIZE", "20")),
+    result_ttl=int(os.environ.get("JOB_RESULT_TTL", "3600"))
+)
+document_store = DocumentStore(
+    ttl_seconds=int(os.environ.get("DOCUMENT_STORE_TTL", "3600")),
+    max_bytes=int(os.environ.get("DOCUMENT_STORE_MAX_MB", "512")) * 1024 * 1024
+)
+segment_codec = SegmentCodec()
+
+# Dạng dữ liệu trao đổi: "full" (cấu trúc đầy đủ kèm bản gốc) hoặc "compact" (danh sách văn bản theo id đoạn)
+WIRE_FORMATS = ("full", "compact")
+
+MEDIA_TYPES = {
+    "pdf": "application/pdf",
+    "excel": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "word": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+
+def _file_type_from_filename(filename: str) -> str:
+    """
+    Xác định loại file từ phần mở rộng
+    """
+    file_extension = os.path.splitext(filename)[1].lower()
+    if file_extension == ".pdf":
+        return "pdf"
+    elif file_extension in [".xlsx", ".xls"]:
+        return "excel"
+    elif file_extension in [".docx", ".doc"]:
+        return "word"
+    raise HTTPException(status_code=400, detail="Định dạng file không được hỗ trợ")
+
+
+def _extract_content(file_type: str, file_content: bytes, stats: Optional[Dict] = None,
+                     segmentation: Optional[str] = None):
+    """
+    Trích xuất nội dung theo loại file
+    """
+    if file_type == "pdf":
+        return pdf_handler.extract_text_from_pdf(file_content, stats, segmentation)
+    elif file_type == "excel":
+        return excel_handler.extract_text_from_excel(file_content)
+    return word_handler.extract_text_from_docx(file_content)
+
+
+def _store_and_extract(filename: str, file_content: bytes, stats: Optional[Dict] = None,
+                       segmentation: Optional[str] = None) -> StoredDocument:
+    """
+    Lưu file vào kho tài liệu và trích xuất nội dung (dùng lại kết quả nếu file đã được trích xuất cùng cách chia)
+    Nếu truyền stats thì ghi thêm thống kê trích xuất và đỉnh bộ nhớ trong lúc trích xuất
+    """
+    if segmentation is not None and segmentation not in SEGMENTATION_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"segmentation phải là một trong: {', '.join(SEGMENTATION_MODES)}"
+        )
+    file_type = _file_type_from_filename(filename)
+    document = document_store.put(file_content, filename, file_type)
+    monitor = MemoryMonitor()
+
+    def extract():
+        with monitor:
+            return _extract_content(file_type, file_content, stats, segmentation)
+
+    extracted, reused = document_store.extraction(document, segmentation, extract)
+    if stats is not None:
+        if reused:
+            stats["reused"] = True
+        else:
+            stats["memory"] = monitor.stats()
+    document.extracted = extracted
+    document.segmentation = segmentation
+    return document
+
+
+def _check_wire_format(wire_format: Optional[str]) -> bool:
+    """
+    Kiểm tra tham số format, trả về True nếu client dùng dạng compact
+    """
+    if wire_format is not None and wire_format not in WIRE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format phải là một trong: {', '.join(WIRE_FORMATS)}")
+    return wire_format == "compact"
+
+
+def _get_document(document_id: str) -> StoredDocument:
+    document = document_store.get(document_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy tài liệu hoặc tài liệu đã hết hạn")
+    return document
+
+
+def _load_translation_input(file_type: Optional[str], content: Optional[str],
+                            document_id: Optional[str]) -> Tuple[str, Any, Optional[StoredDocument]]:
+    """
+    Lấy loại file và nội dung cần dịch từ form, hoặc từ kho tài liệu nếu chỉ có document_id
+    """
+    document = _get_document(document_id) if document_id else None
+    if content is not None:
+        try:
+            content_data = fast_json.loads(content)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Nội dung không hợp lệ: {str(e)}")
+    elif document is not None and document.extracted is not None:
+        content_data = document.extracted
+    else:
+        raise HTTPException(status_code=400, detail="Thiếu nội dung cần dịch (content hoặc document_id)")
+    
+    file_type = file_type or (document.file_type if document else None)
+    if file_type not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Loại file không hợp lệ")
+    return file_type, content_data, document
+
+
+# File xuất nhỏ hơn ngưỡng này được giữ trong bộ nhớ, lớn hơn sẽ được ghi ra file tạm trên đĩa
+EXPORT_SPOOL_MAX_BYTES = int(os.environ.get("EXPORT_SPOOL_MAX_MB", "8")) * 1024 * 1024
+# Kích thước mỗi lần đọc khi gửi file xuất cho client
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def _apply_translations(document: Optional[StoredDocument], file_type: Optional[str],
+                        translations: str) -> List[Any]:
+    """
+    Áp dụng bản dịch dạng compact (theo id đoạn) lên nội dung lưu phía server và lưu lại làm bản dịch mới
+    """
+    if document is None or (document.translated is None and document.extracted is None):
+        raise HTTPException(status_code=400, detail="translations cần document_id của tài liệu đã trích xuất")
+    if file_type != document.file_type:
+        raise HTTPException(status_code=400, detail="Loại file không khớp với tài liệu")
+    try:
+        updates = fast_json.loads(translations)
+        if not isinstance(updates, (list, dict)):
+            raise ValueError("translations phải là danh sách hoặc dict theo id đoạn")
+        base = document.translated if document.translated is not None else document.extracted
+        document_store.set_translated(document, segment_codec.apply(file_type, base, updates))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"translations không hợp lệ: {str(e)}")
+    return document.translated
+
+
+def _export_content(file_type: str, original_content: bytes, translated_data) -> BinaryIO:
+    """
+    Tạo file mới với nội dung đã dịch
+    File được ghi vào file tạm (SpooledTemporaryFile) và trả về ở vị trí đầu file
+    """
+    if file_type not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Loại file không hợp lệ")
+    
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+    try:
+        if file_type == "pdf":
+            pdf_handler.write_translated_pdf(original_content, translated_data, output)
+        elif file_type == "excel":
+            excel_handler.write_translated_excel(original_content, translated_data, output)
+        else:
+            word_handler.write_translated_docx(original_content, translated_data, output)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
+
+
+def _file_size(output: BinaryIO) -> int:
+    size = output.seek(0, os.SEEK_END)
+    output.seek(0)
+    return size
+
+
+def _file_response(output: BinaryIO, file_type: str, filename: str,
+                   headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    """
+    Trả về file đã dịch để tải xuống: đọc và gửi từng phần, đóng file khi gửi xong
+    """
+    size = _file_size(output)
+    
+    def iter_file():
+        try:
+            while True:
+                chunk = output.read(EXPORT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            output.close()
+    
+    # Xử lý tên file với mã hóa URL để tránh vấn đề với ký tự tiếng Việt
+    encoded_filename = urllib.parse.quote(filename)
+    return StreamingResponse(
+        iter_file(),
+        media_type=MEDIA_TYPES[file_type],
+        headers={
+            "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}",
+            "Content-Length": str(size),
+            **(headers or {})
+        }
+    )
+
+
+def _translate_content(file_type: str, content_data, stats: Dict, progress: Optional[ProgressTracker] = None,
+                       source: Optional[str] = None):
+    """
+    Dịch nội dung theo loại file
+    """
+    if file_type == "pdf":
+        return translator.translate_pdf_content(content_data, stats, progress, source)
+    elif file_type == "excel":
+        return translator.translate_excel_content(content_data, stats, progress, source)
+    elif file_type == "word":
+        return translator.translate_word_content(content_data, stats, progress, source)
+    raise HTTPException(status_code=400, detail="Loại file không hợp lệ")
+
+
+# Kích thước mỗi khối khi trả kết quả dịch dạng stream
+STREAM_EXCEL_CELLS_PER_BLOCK = 500
+STREAM_WORD_PARAGRAPHS_PER_BLOCK = 50
+
+
+def _split_into_blocks(file_type: str, content_data) -> List[Any]:
+    """
+    Chia nội dung thành các khối gửi dần về client: mỗi trang PDF,
+    mỗi phần của sheet Excel, mỗi nhóm đoạn văn Word
+    """
+    if file_type == "pdf":
+        return [[page] for page in content_data]
+    if file_type == "excel":
+        blocks = []
+        for sheet_data in content_data:
+            cells = sheet_data["cells"]
+            for start in range(0, max(len(cells), 1), STREAM_EXCEL_CELLS_PER_BLOCK):
+                blocks.append([{
+                    "sheet_name": sheet_data["sheet_name"],
+                    "cells": cells[start:start + STREAM_EXCEL_CELLS_PER_BLOCK]
+                }])
+        return blocks
+    if file_type == "word":
+        return [content_data[start:start + STREAM_WORD_PARAGRAPHS_PER_BLOCK]
+                for start in range(0, len(content_data), STREAM_WORD_PARAGRAPHS_PER_BLOCK)]
+    raise HTTPException(status_code=400, detail="Loại file không hợp lệ")
+
+
+def _merge_blocks(file_type: str, translated_blocks: List[Any]) -> List[Any]:
+    """
+    Ghép các khối đã dịch lại thành nội dung đầy đủ của tài liệu
+    """
+    merged: List[Any] = []
+    for block in translated_blocks:
+        for item in block:
+            if file_type == "excel" and merged and merged[-1]["sheet_name"] == item["sheet_name"]:
+                merged[-1]["cells"].extend(item["cells"])
+            elif file_type == "excel":
+                merged.append({"sheet_name": item["sheet_name"], "cells": list(item["cells"])})
+            else:
+                merged.append(item)
+    return merged
+
+
+def _block_texts(file_type: str, block) -> List[str]:
+    """
+    Các đoạn văn bản trong một khối
+    """
+    if file_type == "excel":
+        return [cell["content"] for sheet_data in block for cell in sheet_data["cells"]]
+    return [item.get("content", "") for item in block]
+
+
+def _sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 
 @router.post("/upload")
 async def upload_document(
     file: UploadFile = File(...),
+    segmentation: Optional[str] = Form(None),
+    wire_format: Optional[str] = Form(None, alias="format"),
 ):
     """
     Upload a document and extract its content
+    Với format=compact chỉ trả về danh sách văn bản các đoạn ("segments", id là vị trí), cấu trúc giữ phía server
     """
     try:
+        compact = _check_wire_format(wire_format)
         # Đọc nội dung file
         file_content = await file.read()
-        file_extension = os.path.splitext(file.filename)[1].lower()
-        
-        # Xử lý theo loại file
-        if file_extension == ".pdf":
-            extracted_content = pdf_handler.extract_text_from_pdf(file_content)
-            file_type = "pdf"
-        elif file_extension in [".xlsx", ".xls"]:
-            extracted_content = excel_handler.extract_text_from_excel(file_content)
-            file_type = "excel"
-        elif file_extension in [".docx", ".doc"]:
-            extracted_content = word_handler.extract_text_from_docx(file_content)
-            file_type = "word"
-        else:
-            raise HTTPException(status_code=400, detail="Định dạng file không được hỗ trợ")
         
-        # Trả về nội dung đã trích xuất và loại file
-        return {
+        # Lưu file phía server và trích xuất nội dung theo loại file
+        stats: Dict[str, Any] = {}
+        document = await run_in_threadpool(_store_and_extract, file.filename, file_content, stats, segmentation)
+        print(f"DEBUG UPLOAD: {file.filename} stats={stats}")
+        
+        if compact:
+            return FastJSONResponse({
+                "success": True,
+                "file_type": document.file_type,
+                "segments": segment_codec.segments(document.file_type, document.extracted),
+                "filename": file.filename,
+                "document_id": document.id,
+                "stats": stats
+            })
+        
+        # Trả về nội dung đã trích xuất, loại file và id để các bước sau không phải gửi lại file
+        # (trả FastJSONResponse trực tiếp để bỏ qua bước jsonable_encoder với nội dung lớn)
+        return FastJSONResponse({
             "success": True,
-            "file_type": file_type,
-            "content": extracted_content,
-            "filename": file.filename
-        }
+            "file_type": document.file_type,
+            "content": document.extracted,
+            "filename": file.filename,
+            "document_id": document.id,
+            "stats": stats
+        })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/translate")
 async def translate_document(
-    file_type: str = Form(...),
-    content: str = Form(...),
-    original_filename: str = Form(...)
+    file_type: Optional[str] = Form(None),
+    content: Optional[str] = Form(None),
+    original_filename: Optional[str] = Form(None),
+    document_id: Optional[str] = Form(None),
+    wire_format: Optional[str] = Form(None, alias="format")
 ):
     """
     Translate document content
+    Có thể gửi document_id thay cho content để dùng nội dung đã trích xuất lưu phía server
+    Với format=compact chỉ trả về bản dịch theo id đoạn ("translations", null là đoạn giữ nguyên)
     """
     try:
-        # Parse JSON content string
-        import json
-        content_data = json.loads(content)
+        compact = _check_wire_format(wire_format)
+        file_type, content_data, document = _load_translation_input(file_type, content, document_id)
         
-        # Dịch nội dung theo loại file
-        if file_type == "pdf":
-            translated_content = translator.translate_pdf_content(content_data)
-        elif file_type == "excel":
-            translated_content = translator.translate_excel_content(content_data)
-        elif file_type == "word":
-            translated_content = translator.translate_word_content(content_data)
-        else:
-            raise HTTPException(status_code=400, detail="Loại file không hợp lệ")
+        # Dịch nội dung theo loại file, chạy trong thread pool để không chặn event loop
+        stats = {}
+        translated_content = await run_in_threadpool(_translate_content, file_type, content_data, stats)
+        if document is not None:
+            await run_in_threadpool(document_store.set_translated, document, translated_content)
         
-        return {
+        if compact:
+            return FastJSONResponse({
+                "success": True,
+                "translations": segment_codec.translations(file_type, translated_content),
+                "original_filename": original_filename or (document.filename if document else None),
+                "document_id": document.id if document else None,
+                "stats": stats
+            })
+        
+        return FastJSONResponse({
             "success": True,
             "translated_content": translated_content,
-            "original_filename": original_filename
-        }
+            "original_filename": original_filename or (document.filename if document else None),
+            "document_id": document.id if document else None,
+            "stats": stats
+        })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/translate/stream")
+async def translate_document_stream(
+    file_type: Optional[str] = Form(None),
+    content: Optional[str] = Form(None),
+    original_filename: Optional[str] = Form(None),
+    document_id: Optional[str] = Form(None)
+):
+    """
+    Dịch nội dung và trả kết quả dần theo từng khối qua Server-Sent Events
+    Các sự kiện: start, block (kèm tiến độ), done (kèm thống kê), error
+    """
+    file_type, content_data, document = _load_translation_input(file_type, content, document_id)
+    if document is not None:
+        original_filename = original_filename or document.filename
+    blocks = _split_into_blocks(file_type, content_data)
+    block_texts = [_block_texts(file_type, block) for block in blocks]
+    total_segments = sum(len(texts) for texts in block_texts)
+    
+    def event_stream():
+        cancel_event = threading.Event()
+        source = translator.detect_source_language([text for texts in block_texts for text in texts])
+        block_stats: List[Dict] = [{} for _ in blocks]
+        
+        def translate_block(index: int):
+            progress = ProgressTracker(cancel_event=cancel_event)
+            return _translate_content(file_type, blocks[index], block_stats[index], progress, source=source)
+        
+        yield _sse_event("start", {
+            "original_filename": original_filename,
+            "file_type": file_type,
+            "total_blocks": len(blocks),
+            "total_segments": total_segments,
+            "source_language": source
+        })
+        
+        segments_done = 0
+        translated_blocks: List[Any] = []
+        try:
+            for index, translated_block in enumerate(translator.iter_translated_blocks(
+                list(range(len(blocks))), translate_block, cancel_event
+            )):
+                translated_blocks.append(translated_block)
+                segments_done += len(block_texts[index])
+                yield _sse_event("block", {
+                    "index": index,
+                    "content": translated_block,
+                    "progress": {
+                        "blocks_done": index + 1,
+                        "total_blocks": len(blocks),
+                        "segments_done": segments_done,
+                        "total_segments": total_segments
+                    }
+                })
+        except Exception as e:
+            print(f"Lỗi khi dịch dạng stream: {str(e)}")
+            yield _sse_event("error", {"detail": str(e)})
+            return
+        if document is not None:
+            document_store.set_translated(document, _merge_blocks(file_type, translated_blocks))
+        
+        # Gộp thống kê của các khối
+        stats: Dict[str, Any] = {"source_language": source, "segments": 0, "translatable_segments": 0,
+                                 "unique_segments": 0, "skipped": {}}
+        for item in block_stats:
+            for key in ("segments", "translatable_segments", "unique_segments"):
+                stats[key] += item.get(key, 0)
+            for category, count in item.get("skipped", {}).items():
+                stats["skipped"][category] = stats["skipped"].get(category, 0) + count
+        yield _sse_event("done", {
+            "success": True,
+            "document_id": document.id if document else None,
+            "stats": stats
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/jobs", status_code=202)
+async def submit_translation_job(
+    file_type: Optional[str] = Form(None),
+    content: Optional[str] = Form(None),
+    original_filename: Optional[str] = Form(None),
+    document_id: Optional[str] = Form(None)
+):
+    """
+    Gửi yêu cầu dịch chạy nền, trả về job_id ngay lập tức
+    """
+    file_type, content_data, document = _load_translation_input(file_type, content, document_id)
+    if document is not None:
+        original_filename = original_filename or document.filename
+    
+    def task(job: Job):
+        stats = {}
+        translated_content = _translate_content(file_type, content_data, stats, job.progress)
+        if document is not None:
+            document_store.set_translated(document, translated_content)
+        return {
+            "success": True,
+            "translated_content": translated_content,
+            "original_filename": original_filename,
+            "document_id": document.id if document else None,
+            "stats": stats
+        }
+    
+    try:
+        job = job_manager.submit(task, file_type=file_type, original_filename=original_filename)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    return {"success": True, **job.to_dict()}
+
+
+@router.get("/jobs/{job_id}")
+async def get_translation_job(job_id: str):
+    """
+    Trạng thái và tiến độ của công việc dịch
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy công việc")
+    return {"success": True, **job.to_dict()}
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_translation_job_result(job_id: str):
+    """
+    Kết quả của công việc dịch đã hoàn thành
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy công việc")
+    if job.status == Job.FAILED:
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != Job.COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Công việc chưa hoàn thành (trạng thái: {job.status})")
+    return FastJSONResponse(job.result)
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_translation_job(job_id: str):
+    """
+    Huỷ công việc dịch đang chờ hoặc đang chạy
+    """
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy công việc")
+    return {"success": True, **job.to_dict()}
+
+
+@router.get("/cache/stats")
+async def translation_cache_stats():
+    """
+    Thống kê hit/miss của bộ nhớ dịch và cache OCR
+    """
+    return {
+        "success": True,
+        "translation_memory": translator.memory.stats(),
+        "ocr_cache": pdf_handler.ocr_cache.stats()
+    }
+
+
+@router.get("/{document_id}")
+async def get_document_info(document_id: str):
+    """
+    Thông tin tài liệu đang lưu phía server
+    """
+    return {"success": True, **_get_document(document_id).to_dict()}
+
+
 @router.post("/export")
 async def export_document(
     background_tasks: BackgroundTasks,
-    file_type: str = Form(...),
-    translated_content: str = Form(...),
-    original_file: UploadFile = File(...),
+    file_type: Optional[str] = Form(None),
+    translated_content: Optional[str] = Form(None),
+    original_file: Optional[UploadFile] = File(None),
+    document_id: Optional[str] = Form(None),
+    translations: Optional[str] = Form(None)
 ):
     """
     Export translated document
+    Có thể gửi document_id thay cho file gốc và/hoặc nội dung đã dịch lưu phía server
+    translations (dạng compact, cần document_id) là danh sách bản dịch theo id đoạn hoặc
+    dict {id: bản dịch} chỉ gồm các đoạn đã sửa, áp dụng lên bản dịch đang lưu (hoặc bản gốc nếu chưa dịch)
     """
     try:
+        document = _get_document(document_id) if document_id else None
+        
         # Đọc nội dung file gốc
-        original_content = await original_file.read()
+        if original_file is not None:
+            original_content = await original_file.read()
+            original_filename = original_file.filename
+        elif document is not None:
+            original_content = document.content
+            original_filename = document.filename
+        else:
+            raise HTTPException(status_code=400, detail="Thiếu file gốc (original_file hoặc document_id)")
+        file_type = file_type or (document.file_type if document else None)
         
         # Parse JSON của nội dung đã dịch
-        import json
-        translated_data = json.loads(translated_content)
+        if translations is not None:
+            translated_data = _apply_translations(document, file_type, translations)
+        elif translated_content is not None:
+            translated_data = fast_json.loads(translated_content)
+        elif document is not None and document.translated is not None:
+            translated_data = document.translated
+        else:
+            raise HTTPException(status_code=400, detail="Thiếu nội dung đã dịch (translated_content hoặc document_id)")
         
         # Debug thông tin chi tiết hơn
         print("=" * 50)
         print(f"DEBUG EXPORT: File type: {file_type}")
-        print(f"DEBUG EXPORT: Filename: {original_file.filename}")
+        print(f"DEBUG EXPORT: Filename: {original_filename}")
         print(f"DEBUG EXPORT: Translated data type: {type(translated_data)}")
         print(f"DEBUG EXPORT: Translated data length: {len(translated_data)}")
         
@@ -137,33 +632,15 @@ async def export_document(
                                 item["translated_content"] = item["content"]["translated_content"]
         
         # Tạo file mới với nội dung đã dịch
-        if file_type == "pdf":
-            output_content = pdf_handler.create_translated_pdf(original_content, translated_data)
-            media_type = "application/pdf"
-            filename = f"translated_{original_file.filename}"
-        elif file_type == "excel":
-            output_content = excel_handler.create_translated_excel(original_content, translated_data)
-            media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            filename = f"translated_{original_file.filename}"
-        elif file_type == "word":
-            output_content = word_handler.create_translated_docx(original_content, translated_data)
-            media_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            filename = f"translated_{original_file.filename}"
-        else:
-            raise HTTPException(status_code=400, detail="Loại file không hợp lệ")
+        output_file = await run_in_threadpool(_export_content, file_type, original_content, translated_data)
         
-        # Xử lý tên file với mã hóa URL để tránh vấn đề với ký tự tiếng Việt
-        encoded_filename = urllib.parse.quote(filename)
-        
-        print(f"DEBUG EXPORT: Xuất file thành công, size={len(output_content)} bytes")
+        print(f"DEBUG EXPORT: Xuất file thành công, size={_file_size(output_file)} bytes")
         print("=" * 50)
         
         # Trả về file đã dịch
-        return StreamingResponse(
-            io.BytesIO(output_content),
-            media_type=media_type,
-            headers={"Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"}
-        )
+        return _file_response(output_file, file_type, f"translated_{original_filename}")
+    except HTTPException:
+        raise
     except Exception as e:
         # In ra lỗi chi tiết để debug
         import traceback
@@ -172,4 +649,37 @@ async def export_document(
         print("DEBUG EXPORT ERROR:")
         print(error_detail)
         print("=" * 50)
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/pipeline")
+async def translate_file(
+    file: UploadFile = File(...),
+    segmentation: Optional[str] = Form(None),
+):
+    """
+    Upload, trích xuất, dịch và xuất file đã dịch trong một request
+    """
+    try:
+        file_content = await file.read()
+        
+        def run_pipeline():
+            document = _store_and_extract(file.filename, file_content, segmentation=segmentation)
+            stats = {}
+            translated = _translate_content(document.file_type, document.extracted, stats)
+            document_store.set_translated(document, translated)
+            return document, _export_content(document.file_type, document.content, document.translated), stats
+        
+        document, output_file, stats = await run_in_threadpool(run_pipeline)
+        print(f"DEBUG PIPELINE: {file.filename} -> {_file_size(output_file)} bytes, stats={stats}")
+        
+        return _file_response(
+            output_file, document.file_type, f"translated_{file.filename}",
+            headers={"X-Document-Id": document.id}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
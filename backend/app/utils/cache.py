@@ -0,0 +1,177 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Số lần truy cập được gom lại trước khi ghi accessed_at xuống đĩa trong một transaction
+ACCESS_FLUSH_ENTRIES = 1000
+
+
+class PersistentCache:
+    """
+    Bộ nhớ đệm key-value lưu trên đĩa bằng SQLite, phía trước có một lớp LRU trong bộ nhớ
+    Giới hạn theo số mục và thời gian sống (TTL), kèm bộ đếm hit/miss
+    """
+
+    def __init__(self, path: str, table: str = "cache", max_entries: int = 200000,
+                 ttl_seconds: int = 30 * 24 * 3600, memory_entries: int = 10000):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+        # Thời điểm truy cập chưa ghi xuống đĩa, chỉ dùng để chọn mục bị xoá khi vượt max_entries
+        self._pending_access: Dict[str, float] = {}
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        self._conn = None
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)")
+            self._conn.commit()
+        except sqlite3.Error as e:
+            # Không mở được file cache thì vẫn chạy với lớp bộ nhớ trong
+            print(f"Không thể mở cache {path}: {str(e)}")
+            self._conn = None
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Lấy giá trị theo key, trả về None nếu không có hoặc đã hết hạn
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._record_access(key, now)
+                    self._counters["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None and now - row[1] <= self.ttl_seconds:
+                        self._record_access(key, now)
+                        self._remember(key, row[0], row[1])
+                        self._counters["disk_hits"] += 1
+                        return row[0]
+                except sqlite3.Error as e:
+                    print(f"Lỗi khi đọc cache: {str(e)}")
+
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Lưu giá trị vào cache (cả bộ nhớ trong và đĩa)
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._counters["writes"] += 1
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+                self._conn.commit()
+                self._writes_since_eviction += 1
+                # Dọn dẹp định kỳ thay vì sau mỗi lần ghi
+                if self._writes_since_eviction >= max(1, self.max_entries // 100):
+                    self._evict(now)
+            except sqlite3.Error as e:
+                print(f"Lỗi khi ghi cache: {str(e)}")
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Thống kê hit/miss của cache
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            if self._conn is not None:
+                try:
+                    stats["disk_entries"] = self._conn.execute(
+                        f"SELECT COUNT(*) FROM {self.table}"
+                    ).fetchone()[0]
+                except sqlite3.Error:
+                    pass
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _remember(self, key: str, value: str, created_at: float) -> None:
+        """
+        Đưa một mục vào lớp LRU trong bộ nhớ, loại bỏ mục ít dùng nhất khi đầy
+        """
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _record_access(self, key: str, now: float) -> None:
+        """
+        Ghi nhận lần truy cập; accessed_at được cập nhật theo lô thay vì commit sau mỗi lần đọc
+        """
+        if self._conn is None:
+            return
+        self._pending_access[key] = now
+        if len(self._pending_access) >= ACCESS_FLUSH_ENTRIES:
+            try:
+                self._flush_access()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Lỗi khi ghi cache: {str(e)}")
+
+    def _flush_access(self) -> None:
+        """
+        Cập nhật accessed_at của các mục đã truy cập (chưa commit)
+        """
+        pending, self._pending_access = self._pending_access, {}
+        self._conn.executemany(
+            f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in pending.items()]
+        )
+
+    def _evict(self, now: float) -> None:
+        """
+        Xoá các mục hết hạn và các mục ít được dùng nhất khi vượt quá max_entries
+        """
+        self._writes_since_eviction = 0
+        self._flush_access()
+        cursor = self._conn.execute(
+            f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        evicted = cursor.rowcount
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        if count > self.max_entries:
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+            evicted += cursor.rowcount
+        self._conn.commit()
+        self._counters["evictions"] += max(evicted, 0)
@@ -0,0 +1,103 @@
+import gzip
+import os
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# brotli là tuỳ chọn: nén tốt hơn gzip với văn bản, không có thì chỉ dùng gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response nhỏ hơn ngưỡng này không được nén
+COMPRESSION_MIN_BYTES = int(os.environ.get("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("RESPONSE_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("RESPONSE_BROTLI_QUALITY", "4"))
+# Các loại nội dung được nén (file xuất xlsx/docx/pdf đã được nén sẵn)
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+# Server-Sent Events phải được gửi ngay từng sự kiện
+UNCOMPRESSIBLE_TYPES = ("text/event-stream",)
+
+
+class CompressionMiddleware:
+    """
+    Nén response JSON/văn bản bằng brotli (nếu client hỗ trợ và có thư viện) hoặc gzip khi vượt ngưỡng kích thước
+    Chỉ nén response gửi một lần; response dạng stream (tải file, SSE) được gửi nguyên vẹn
+    Việc nén chạy trong thread pool để không chặn event loop với payload lớn
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_BYTES,
+                 gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self._choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = {"start": None, "passthrough": False}
+
+        async def send_compressed(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Chờ phần body đầu tiên để biết có nén được không
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            start, state["start"] = state["start"], None
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if (message.get("more_body", False) or len(body) < self.minimum_size
+                    or "content-encoding" in headers or not self._compressible(headers.get("content-type", ""))):
+                state["passthrough"] = True
+                await send(start)
+                await send(message)
+                return
+
+            body = await run_in_threadpool(self._compress, body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        """
+        Chọn cách nén theo header Accept-Encoding của client, ưu tiên brotli
+        """
+        accepted = set()
+        for item in accept_encoding.lower().split(","):
+            name, _, params = item.strip().partition(";")
+            if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(name.strip())
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _compressible(self, content_type: str) -> bool:
+        content_type = content_type.lower()
+        if content_type.startswith(UNCOMPRESSIBLE_TYPES):
+            return False
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
@@ -0,0 +1,172 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from . import fast_json
+
+
+def _json_size(value: Any) -> int:
+    """
+    Dung lượng ước tính của nội dung đã trích xuất hoặc đã dịch: độ dài dạng JSON
+    """
+    return len(fast_json.dumps(value)) if value is not None else 0
+
+
+class StoredContent:
+    """
+    Nội dung file dùng chung giữa các lần upload cùng một file: file gốc và kết quả trích xuất theo cách chia
+    Kết quả trích xuất chỉ được đọc, không bị sửa khi dịch
+    """
+
+    def __init__(self, content_hash: str, content: bytes):
+        self.hash = content_hash
+        self.content = content
+        self.extractions: Dict[Optional[str], Any] = {}
+        # Số tài liệu đang dùng nội dung này
+        self.references = 0
+        # Dung lượng tính vào giới hạn của kho: file gốc và các kết quả trích xuất
+        self.size = len(content)
+        # Các lần upload cùng nội dung chờ nhau để chỉ trích xuất một lần
+        self.extract_lock = threading.Lock()
+
+
+class StoredDocument:
+    """
+    Một lần upload lưu phía server: file gốc, nội dung đã trích xuất và nội dung đã dịch của client đó
+    """
+
+    def __init__(self, document_id: str, shared: StoredContent, filename: str, file_type: str):
+        self.id = document_id
+        self.shared = shared
+        self.content = shared.content
+        self.filename = filename
+        self.file_type = file_type
+        self.extracted: Optional[Any] = None
+        self.translated: Optional[Any] = None
+        self.translated_size = 0
+        # Cách chia nội dung PDF đã dùng khi trích xuất (None là mặc định)
+        self.segmentation: Optional[str] = None
+        self.created_at = time.time()
+        self.accessed_at = self.created_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "document_id": self.id,
+            "filename": self.filename,
+            "file_type": self.file_type,
+            "size": len(self.content),
+            "has_extracted": self.extracted is not None,
+            "has_translated": self.translated is not None,
+            "created_at": self.created_at
+        }
+
+
+class DocumentStore:
+    """
+    Kho tài liệu trong bộ nhớ, mỗi lần upload có id ngẫu nhiên riêng để trạng thái dịch của các client không lẫn nhau
+    File gốc và kết quả trích xuất được dùng chung theo hash SHA-256 của nội dung file
+    Tài liệu bị xoá khi không được dùng quá ttl_seconds hoặc khi tổng dung lượng (file gốc, kết quả trích xuất
+    và bản dịch) vượt max_bytes
+    """
+
+    def __init__(self, ttl_seconds: int = 3600, max_bytes: int = 512 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._documents: "OrderedDict[str, StoredDocument]" = OrderedDict()
+        self._contents: Dict[str, StoredContent] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, content: bytes, filename: str, file_type: str) -> StoredDocument:
+        """
+        Tạo tài liệu mới cho lần upload; nếu cùng nội dung đã có thì dùng chung file gốc đã lưu
+        """
+        content_hash = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            self._evict(time.time())
+            shared = self._contents.get(content_hash)
+            if shared is None:
+                shared = StoredContent(content_hash, content)
+                self._contents[content_hash] = shared
+                self._total_bytes += shared.size
+            shared.references += 1
+
+            document = StoredDocument(uuid.uuid4().hex, shared, filename, file_type)
+            self._documents[document.id] = document
+            self._evict(time.time())
+            return document
+
+    def extraction(self, document: StoredDocument, segmentation: Optional[str],
+                   extract: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Kết quả trích xuất dùng chung của nội dung tài liệu theo cách chia, gọi extract() nếu chưa có
+        Các lần upload cùng nội dung đồng thời chỉ trích xuất một lần; trả về (kết quả, có dùng lại không)
+        """
+        shared = document.shared
+        with shared.extract_lock:
+            with self._lock:
+                extracted = shared.extractions.get(segmentation)
+            if extracted is not None:
+                return extracted, True
+
+            extracted = extract()
+            size = _json_size(extracted)
+            with self._lock:
+                # Nội dung có thể đã bị xoá khỏi kho trong lúc trích xuất
+                if self._contents.get(shared.hash) is shared:
+                    shared.extractions[segmentation] = extracted
+                    shared.size += size
+                    self._total_bytes += size
+                    self._evict(time.time())
+            return extracted, False
+
+    def set_translated(self, document: StoredDocument, translated: Any) -> None:
+        """
+        Lưu nội dung đã dịch của tài liệu và tính dung lượng của nó vào giới hạn của kho
+        """
+        size = _json_size(translated)
+        with self._lock:
+            document.translated = translated
+            if document.id in self._documents:
+                self._total_bytes += size - document.translated_size
+            document.translated_size = size
+            self._evict(time.time())
+
+    def get(self, document_id: str) -> Optional[StoredDocument]:
+        with self._lock:
+            self._evict(time.time())
+            document = self._documents.get(document_id)
+            if document is not None:
+                self._touch(document)
+            return document
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"documents": len(self._documents), "contents": len(self._contents),
+                    "total_bytes": self._total_bytes}
+
+    def _touch(self, document: StoredDocument) -> None:
+        document.accessed_at = time.time()
+        self._documents.move_to_end(document.id)
+
+    def _evict(self, now: float) -> None:
+        """
+        Xoá tài liệu hết hạn và tài liệu ít dùng nhất khi vượt quá dung lượng
+        """
+        while self._documents:
+            document_id, document = next(iter(self._documents.items()))
+            expired = now - document.accessed_at > self.ttl_seconds
+            # Luôn giữ lại tài liệu mới nhất dù nó lớn hơn max_bytes
+            over_capacity = self._total_bytes > self.max_bytes and len(self._documents) > 1
+            if not expired and not over_capacity:
+                break
+            del self._documents[document_id]
+            self._total_bytes -= document.translated_size
+            shared = document.shared
+            shared.references -= 1
+            if shared.references == 0:
+                del self._contents[shared.hash]
+                self._total_bytes -= shared.size
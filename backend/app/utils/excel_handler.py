@@ -1,6 +1,31 @@
 import openpyxl
+import datetime
 import io
-from typing import List, Dict, Tuple
+import re
+import shutil
+import zipfile
+from openpyxl.cell.text import Text
+from openpyxl.packaging.manifest import Manifest
+from openpyxl.reader.strings import read_string_table
+from openpyxl.reader.workbook import WorkbookParser
+from openpyxl.utils import get_column_letter
+from openpyxl.xml.constants import (
+    ARC_CONTENT_TYPES, SHARED_STRINGS, SHEET_MAIN_NS, XLSM, XLSX, XLTM, XLTX
+)
+from openpyxl.xml.functions import fromstring, iterparse
+from decimal import Decimal
+from typing import BinaryIO, List, Dict, Tuple, Optional
+from xml.sax.saxutils import escape
+
+# Các phần tử chuỗi trong sharedStrings.xml và chuỗi inline trong sheet
+SHARED_STRING_PATTERN = re.compile(rb"<si>.*?</si>|<si/>", re.DOTALL)
+INLINE_STRING_PATTERN = re.compile(rb"<is>(.*?)</is>", re.DOTALL)
+CELL_TAG = f"{{{SHEET_MAIN_NS}}}c"
+ROW_TAG = f"{{{SHEET_MAIN_NS}}}row"
+VALUE_TAG = f"{{{SHEET_MAIN_NS}}}v"
+INLINE_STRING_TAG = f"{{{SHEET_MAIN_NS}}}is"
+WORKBOOK_TYPES = (XLSX, XLSM, XLTX, XLTM)
+WORKSHEET_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"
 
 class ExcelHandler:
     def __init__(self):
@@ -10,25 +35,38 @@ class ExcelHandler:
         """
         Trích xuất văn bản từ file Excel
         Trả về danh sách các sheet, mỗi sheet chứa danh sách các cell
+        Đọc ở chế độ read-only theo từng dòng nên chỉ duyệt các ô có dữ liệu, không tải cả sheet vào bộ nhớ
         """
+        workbook = None
         try:
-            workbook = openpyxl.load_workbook(io.BytesIO(file_content), data_only=True)
+            workbook = openpyxl.load_workbook(io.BytesIO(file_content), read_only=True, data_only=True)
             result = []
             
             for sheet_name in workbook.sheetnames:
                 sheet = workbook[sheet_name]
+                if not hasattr(sheet, "iter_rows"):
+                    # Chartsheet không có ô
+                    continue
+                
+                # Bỏ kích thước khai báo trong file (có thể bị phình to do định dạng thừa ở ô xa),
+                # mỗi dòng chỉ dài đến ô cuối cùng có trong file
+                sheet.reset_dimensions()
                 cells = []
                 
                 # Duyệt qua các ô không trống trong sheet
-                for row in range(1, sheet.max_row + 1):
-                    for col in range(1, sheet.max_column + 1):
-                        cell_value = sheet.cell(row=row, col=col).value
+                for row, values in enumerate(sheet.iter_rows(values_only=True), start=1):
+                    for col, cell_value in enumerate(values, start=1):
                         if cell_value:
-                            cell_address = f"{openpyxl.utils.get_column_letter(col)}{row}"
-                            cells.append({
+                            cell_address = f"{get_column_letter(col)}{row}"
+                            cell_data = {
                                 "address": cell_address,
                                 "content": str(cell_value)
-                            })
+                            }
+                            # Ô kiểu số, ngày tháng, boolean không cần dịch
+                            category = self._cell_category(cell_value)
+                            if category:
+                                cell_data["category"] = category
+                            cells.append(cell_data)
                 
                 result.append({
                     "sheet_name": sheet_name,
@@ -38,12 +76,43 @@ class ExcelHandler:
             return result
         except Exception as e:
             raise Exception(f"Lỗi khi xử lý file Excel: {str(e)}")
+        finally:
+            # Workbook read-only giữ file zip mở cho đến khi đóng
+            if workbook is not None:
+                workbook.close()
+    
+    def _cell_category(self, value) -> Optional[str]:
+        """
+        Phân loại ô theo kiểu dữ liệu Python của giá trị, trả về None nếu ô chứa văn bản
+        """
+        if isinstance(value, bool):
+            return "boolean"
+        if isinstance(value, (datetime.datetime, datetime.date, datetime.time, datetime.timedelta)):
+            return "date"
+        if isinstance(value, (int, float, Decimal)):
+            return "number"
+        return None
     
     def create_translated_excel(self, original_file: bytes, translated_data: List[Dict[str, List[Dict[str, str]]]]) -> bytes:
         """
         Tạo file Excel với nội dung đã được dịch
         """
+        output = io.BytesIO()
+        self.write_translated_excel(original_file, translated_data, output)
+        return output.getvalue()
+    
+    def write_translated_excel(self, original_file: bytes, translated_data: List[Dict[str, List[Dict[str, str]]]],
+                               output: BinaryIO) -> None:
+        """
+        Ghi file Excel đã dịch vào output (file hoặc buffer), không giữ thêm bản sao trong bộ nhớ
+        Ưu tiên thay thẳng bảng sharedStrings trong file zip, chỉ dùng openpyxl khi không thể
+        """
         try:
+            if self._write_shared_strings(original_file, translated_data, output):
+                return
+            output.seek(0)
+            output.truncate()
+            
             # Đọc file Excel gốc
             workbook = openpyxl.load_workbook(io.BytesIO(original_file))
             
@@ -56,14 +125,155 @@ class ExcelHandler:
                     for cell_data in sheet_data["cells"]:
                         address = cell_data["address"]
                         translated_content = cell_data.get("translated_content", "")
-                        if translated_content:
+                        # Bỏ qua ô không đổi để giữ nguyên kiểu dữ liệu gốc (số, ngày tháng...)
+                        if translated_content and translated_content != cell_data.get("content"):
                             sheet[address] = translated_content
             
-            # Lưu workbook vào buffer
-            output = io.BytesIO()
+            # Ghi workbook trực tiếp vào output
             workbook.save(output)
-            output.seek(0)
-            
-            return output.getvalue()
         except Exception as e:
-            raise Exception(f"Lỗi khi tạo file Excel đã dịch: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Lỗi khi tạo file Excel đã dịch: {str(e)}")
+    
+    def _write_shared_strings(self, original_file: bytes, translated_data: List[Dict[str, List[Dict[str, str]]]],
+                              output: BinaryIO) -> bool:
+        """
+        Ghi file đã dịch bằng cách thay từng chuỗi duy nhất trong xl/sharedStrings.xml (và chuỗi inline trong sheet),
+        các phần khác của file zip (style, biểu đồ, công thức...) được chép nguyên nội dung
+        Vì một chuỗi dùng chung được thay cho mọi ô dùng nó, chỉ làm được khi mọi ô dùng chuỗi đó đều được dịch
+        giống nhau. Trả về False (chưa ghi gì vào output) nếu không làm được: cùng một chuỗi có nhiều bản dịch
+        (kể cả ô giữ nguyên bản gốc), có ô dùng chuỗi đó không nằm trong translated_data,
+        hoặc có ô đã dịch không phải chuỗi văn bản (số, kết quả công thức...)
+        """
+        # Chuỗi gốc -> bản dịch, các ô (sheet, địa chỉ) đã dịch và các chuỗi có ô giữ nguyên bản gốc
+        translations: Dict[str, str] = {}
+        translated_cells = set()
+        kept_contents = set()
+        for sheet_data in translated_data:
+            for cell_data in sheet_data["cells"]:
+                content = cell_data.get("content")
+                translated_content = cell_data.get("translated_content", "")
+                if not translated_content or translated_content == content:
+                    kept_contents.add(content)
+                    continue
+                if translations.setdefault(content, translated_content) != translated_content:
+                    print(f"DEBUG EXCEL: Chuỗi {content[:30]!r} có nhiều bản dịch khác nhau, dùng openpyxl")
+                    return False
+                translated_cells.add((sheet_data["sheet_name"], cell_data["address"]))
+        
+        if not translations:
+            output.write(original_file)
+            return True
+        if kept_contents & translations.keys():
+            print("DEBUG EXCEL: Có ô giữ nguyên chuỗi gốc trong khi ô khác cùng chuỗi được dịch, dùng openpyxl")
+            return False
+        
+        with zipfile.ZipFile(io.BytesIO(original_file)) as archive:
+            manifest = Manifest.from_tree(fromstring(archive.read(ARC_CONTENT_TYPES)))
+            workbook_part = next((part for part in map(manifest.find, WORKBOOK_TYPES) if part is not None), None)
+            if workbook_part is None:
+                return False
+            
+            strings: List[str] = []
+            strings_part = manifest.find(SHARED_STRINGS)
+            if strings_part is not None:
+                with archive.open(strings_part.PartName[1:]) as source:
+                    strings = read_string_table(source)
+            
+            # Tất cả các ô dùng những chuỗi cần thay phải đúng là các ô đã dịch
+            workbook_parser = WorkbookParser(archive, workbook_part.PartName[1:])
+            workbook_parser.parse()
+            uses = set()
+            inline_sheets = set()
+            for sheet, rel in workbook_parser.find_sheets():
+                if rel.Type != WORKSHEET_REL:
+                    continue
+                sheet_uses = self._string_uses(archive, rel.target, strings, translations)
+                if sheet_uses is None:
+                    return False
+                for address, inline in sheet_uses:
+                    uses.add((sheet.name, address))
+                    if inline:
+                        inline_sheets.add(rel.target)
+            if uses != translated_cells:
+                print(f"DEBUG EXCEL: {len(uses - translated_cells)} ô dùng chuỗi cần thay nhưng không được dịch, "
+                      f"{len(translated_cells - uses)} ô đã dịch không phải chuỗi văn bản, dùng openpyxl")
+                return False
+            
+            replaced: Dict[str, bytes] = {}
+            if strings_part is not None:
+                strings_path = strings_part.PartName[1:]
+                data = archive.read(strings_path)
+                if len(SHARED_STRING_PATTERN.findall(data)) != len(strings):
+                    # sharedStrings dùng tiền tố namespace hoặc cấu trúc lạ
+                    return False
+                
+                strings_iter = iter(strings)
+                
+                def replace_shared(match):
+                    text = next(strings_iter)
+                    if text not in translations:
+                        return match.group(0)
+                    return b"<si>" + self._text_element(translations[text]) + b"</si>"
+                
+                replaced[strings_path] = SHARED_STRING_PATTERN.sub(replace_shared, data)
+            
+            # Chuỗi inline (t="inlineStr") nằm trực tiếp trong sheet, chỉ sheet có loại ô này mới phải ghi lại
+            for sheet_path in inline_sheets:
+                def replace_inline(match):
+                    text = self._inline_text(match.group(1))
+                    if text not in translations:
+                        return match.group(0)
+                    return b"<is>" + self._text_element(translations[text]) + b"</is>"
+                
+                replaced[sheet_path] = INLINE_STRING_PATTERN.sub(replace_inline, archive.read(sheet_path))
+            
+            with zipfile.ZipFile(output, "w") as result:
+                for info in archive.infolist():
+                    copied = zipfile.ZipInfo(info.filename, info.date_time)
+                    copied.compress_type = info.compress_type
+                    copied.external_attr = info.external_attr
+                    if info.filename in replaced:
+                        result.writestr(copied, replaced[info.filename])
+                    else:
+                        copied.file_size = info.file_size
+                        with archive.open(info) as source, result.open(copied, "w") as target:
+                            shutil.copyfileobj(source, target)
+        
+        print(f"DEBUG EXCEL: Thay {len(translations)} chuỗi cho {len(uses)} ô trong {len(replaced)} phần của file")
+        return True
+    
+    def _string_uses(self, archive: zipfile.ZipFile, sheet_path: str, strings: List[str],
+                     translations: Dict[str, str]) -> Optional[List[Tuple[str, bool]]]:
+        """
+        Các ô của một sheet dùng chuỗi cần thay: [(địa chỉ, có phải chuỗi inline không)]
+        Trả về None nếu sheet có ô không ghi địa chỉ (không đối chiếu được)
+        """
+        uses = []
+        with archive.open(sheet_path) as source:
+            for _, element in iterparse(source):
+                if element.tag == CELL_TAG:
+                    data_type = element.get("t")
+                    text = None
+                    if data_type == "s":
+                        value = element.findtext(VALUE_TAG)
+                        text = strings[int(value)] if value is not None else None
+                    elif data_type == "inlineStr":
+                        child = element.find(INLINE_STRING_TAG)
+                        text = Text.from_tree(child).content if child is not None else None
+                    if text is not None and text in translations:
+                        address = element.get("r")
+                        if not address:
+                            return None
+                        uses.append((address, data_type == "inlineStr"))
+                    element.clear()
+                elif element.tag == ROW_TAG:
+                    element.clear()
+        return uses
+    
+    def _inline_text(self, content: bytes) -> str:
+        return Text.from_tree(fromstring(
+            b'<is xmlns="' + SHEET_MAIN_NS.encode() + b'">' + content + b"</is>"
+        )).content
+    
+    def _text_element(self, text: str) -> bytes:
+        return f'<t xml:space="preserve">{escape(text)}</t>'.encode("utf-8")
@@ -0,0 +1,37 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+# orjson là tuỳ chọn: nhanh hơn nhiều khi serialize/parse payload lớn, không có thì dùng json chuẩn
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(data: Any) -> bytes:
+    """
+    Serialize sang JSON dạng bytes (UTF-8, không escape ký tự Unicode, không có khoảng trắng thừa)
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data) -> Any:
+    """
+    Parse JSON từ str hoặc bytes
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse dùng orjson nếu có
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
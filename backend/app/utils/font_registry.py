@@ -0,0 +1,193 @@
+import os
+import pathlib
+import threading
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+from reportlab.pdfbase.ttfonts import TTFont
+
+CURRENT_DIR = pathlib.Path(__file__).parent.absolute()
+ROOT_DIR = CURRENT_DIR.parent.parent
+FONTS_DIR = ROOT_DIR / "resources" / "fonts"
+# Các thư mục font bổ sung (ví dụ font Noto CJK của hệ thống), phân cách bằng os.pathsep
+EXTRA_FONT_DIRS = [path for path in os.environ.get("PDF_FONT_DIRS", "").split(os.pathsep) if path]
+# Font CID có sẵn trong reportlab dùng cho chữ Nhật/Trung còn sót lại khi không có font TrueType nào hỗ trợ
+CJK_CID_FONT = os.environ.get("PDF_CJK_CID_FONT", "HeiseiKakuGo-W5")
+
+# Thứ tự ưu tiên font cho nội dung và tiêu đề
+CONTENT_FONT_PRIORITY = ['Roboto-Regular', 'Roboto-Bold', 'VietFont', 'Arial', 'FreeSans']
+STANDARD_FONT = 'Helvetica'
+STANDARD_BOLD_FONT = 'Helvetica-Bold'
+# Font chuẩn của PDF chỉ có các ký tự Latin-1
+STANDARD_FONT_COVERAGE = frozenset(range(0x20, 0x100))
+# Các khoảng ký tự chữ Nhật/Trung mà font CID hỗ trợ
+CJK_RANGES = [(0x3000, 0x30FF), (0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF), (0xFF00, 0xFFEF)]
+
+# Font dự phòng hỗ trợ tiếng Việt (đăng ký với tên VietFont) khi không có font nào trong thư mục fonts hỗ trợ:
+# file chỉ định bằng PDF_VIET_FONT_FILE hoặc font có sẵn của hệ điều hành
+VIET_FONT_FILES = [path for path in [os.environ.get("PDF_VIET_FONT_FILE")] if path] + [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "/usr/share/fonts/liberation-sans/LiberationSans-Regular.ttf",
+    "/usr/share/fonts/truetype/freefont/FreeSans.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+    "/Library/Fonts/Arial.ttf",
+    "/System/Library/Fonts/Supplemental/Arial.ttf",
+]
+# Một số chữ cái tiếng Việt dùng để kiểm tra font có hỗ trợ tiếng Việt không
+VIETNAMESE_SAMPLE = frozenset(map(ord, "ăâđêôơưạảấầẩẫậắằẳẵặẹẻẽếềểễệỉịọỏốồổỗộớờởỡợụủứừửữựỳỵỷỹ"))
+
+
+class FontRegistry:
+    """
+    Danh sách font dùng khi xuất PDF, đăng ký một lần cho cả tiến trình
+    Mỗi font có sẵn tập ký tự mà nó hỗ trợ (lấy từ bảng cmap) để chọn font cho từng ký tự bằng một lần tra cứu
+    """
+
+    def __init__(self, font_dirs: Optional[List[pathlib.Path]] = None):
+        self.font_dirs = font_dirs if font_dirs is not None else [FONTS_DIR] + [pathlib.Path(p) for p in EXTRA_FONT_DIRS]
+        # Tên font -> tập mã ký tự font hỗ trợ, theo thứ tự dùng làm font dự phòng
+        self.coverage: Dict[str, FrozenSet[int]] = {}
+        # Ký tự -> font dự phòng đầu tiên hỗ trợ ký tự đó (tính dần khi gặp)
+        self._fallbacks: Dict[str, str] = {}
+        self.content_font = STANDARD_FONT
+        self.title_font = STANDARD_BOLD_FONT
+        self._build()
+
+    def _build(self) -> None:
+        """
+        Đăng ký font TrueType trong các thư mục font, font VietFont dự phòng và font CID cho chữ Nhật/Trung
+        """
+        truetype_fonts: Dict[str, FrozenSet[int]] = {}
+        for fonts_path in self.font_dirs:
+            if not fonts_path.exists():
+                print(f"Thư mục fonts không tồn tại: {fonts_path}")
+                continue
+            for font_file in sorted(fonts_path.glob("*.ttf")):
+                font = self._register_truetype(font_file.stem, str(font_file))
+                if font is not None:
+                    truetype_fonts[font_file.stem] = frozenset(font.face.charToGlyph)
+
+        # Không có font nào hỗ trợ tiếng Việt: dùng font VietFont từ file font của hệ điều hành
+        if not any(VIETNAMESE_SAMPLE <= chars for chars in truetype_fonts.values()):
+            for path in VIET_FONT_FILES:
+                if not os.path.isfile(path):
+                    continue
+                font = self._register_truetype("VietFont", path)
+                if font is not None:
+                    truetype_fonts["VietFont"] = frozenset(font.face.charToGlyph)
+                    break
+            else:
+                print("Không tìm thấy font hỗ trợ tiếng Việt, chữ có dấu có thể hiển thị sai "
+                      "(thêm file .ttf vào resources/fonts hoặc đặt PDF_VIET_FONT_FILE)")
+
+        # Font ưu tiên đứng trước, các font khác theo thứ tự tên
+        ordered = [name for name in CONTENT_FONT_PRIORITY if name in truetype_fonts]
+        ordered += sorted(name for name in truetype_fonts if name not in ordered)
+        for name in ordered:
+            self.coverage[name] = truetype_fonts[name]
+
+        if CJK_CID_FONT:
+            try:
+                if CJK_CID_FONT not in pdfmetrics._fonts:
+                    pdfmetrics.registerFont(UnicodeCIDFont(CJK_CID_FONT))
+                self.coverage[CJK_CID_FONT] = frozenset(
+                    code for start, end in CJK_RANGES for code in range(start, end + 1)
+                )
+            except Exception as e:
+                print(f"Không thể đăng ký font {CJK_CID_FONT}: {str(e)}")
+
+        self.coverage[STANDARD_FONT] = STANDARD_FONT_COVERAGE
+        self.coverage[STANDARD_BOLD_FONT] = STANDARD_FONT_COVERAGE
+
+        if ordered:
+            self.content_font = ordered[0]
+            self.title_font = 'Roboto-Bold' if 'Roboto-Bold' in truetype_fonts else ordered[0]
+        print(f"DEBUG FONTS: Đã đăng ký {list(self.coverage.keys())}, "
+              f"font nội dung: {self.content_font}, font tiêu đề: {self.title_font}")
+
+    def _register_truetype(self, name: str, path: str) -> Optional[TTFont]:
+        try:
+            font = pdfmetrics._fonts.get(name)
+            if not isinstance(font, TTFont):
+                font = TTFont(name, path)
+                pdfmetrics.registerFont(font)
+            return font
+        except Exception as e:
+            print(f"Lỗi khi đăng ký font {name}: {str(e)}")
+            return None
+
+    def font_for_char(self, char: str, font_name: str) -> str:
+        """
+        Font dùng để vẽ một ký tự: font được chọn nếu nó hỗ trợ ký tự, ngược lại là font dự phòng đầu tiên hỗ trợ
+        """
+        coverage = self.coverage.get(font_name)
+        if coverage is None or ord(char) in coverage or char.isspace():
+            return font_name
+        fallback = self._fallbacks.get(char)
+        if fallback is None:
+            code = ord(char)
+            fallback = next((name for name, chars in self.coverage.items() if code in chars), font_name)
+            self._fallbacks[char] = fallback
+        return fallback
+
+    def split_runs(self, text: str, font_name: str) -> List[Tuple[str, str]]:
+        """
+        Chia text thành các đoạn liên tiếp dùng chung một font: [(font, text), ...]
+        """
+        runs: List[Tuple[str, str]] = []
+        start = 0
+        current = None
+        for i, char in enumerate(text):
+            font = self.font_for_char(char, font_name)
+            if font != current:
+                if current is not None:
+                    runs.append((current, text[start:i]))
+                current, start = font, i
+        if current is not None:
+            runs.append((current, text[start:]))
+        return runs
+
+    def markup(self, text: str, font_name: str) -> str:
+        """
+        Text đã escape cho Paragraph của platypus, các đoạn cần font khác được bọc trong thẻ <font>
+        """
+        parts = []
+        for font, run in self.split_runs(text, font_name):
+            run = escape(run)
+            parts.append(run if font == font_name else f'<font name="{font}">{run}</font>')
+        return "".join(parts)
+
+    def string_width(self, text: str, font_name: str, font_size: float) -> float:
+        """
+        Độ rộng của text khi vẽ bằng font đã chọn và các font dự phòng
+        """
+        return sum(pdfmetrics.stringWidth(run, font, font_size) for font, run in self.split_runs(text, font_name))
+
+    def draw_string(self, canvas, x: float, y: float, text: str, font_name: str, font_size: float) -> None:
+        """
+        Vẽ text lên canvas, mỗi đoạn dùng font phù hợp
+        """
+        for font, run in self.split_runs(text, font_name):
+            canvas.setFont(font, font_size)
+            canvas.drawString(x, y, run)
+            x += pdfmetrics.stringWidth(run, font, font_size)
+
+
+_registry: Optional[FontRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_font_registry() -> FontRegistry:
+    """
+    FontRegistry dùng chung cho cả tiến trình, tạo ở lần gọi đầu tiên
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = FontRegistry()
+    return _registry
@@ -0,0 +1,175 @@
+import queue
+import threading
+import time
+import traceback
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from .translator import ProgressTracker, TranslationCancelled
+
+
+class JobQueueFull(Exception):
+    """
+    Hàng đợi công việc đã đầy
+    """
+
+
+class Job:
+    """
+    Một công việc chạy nền: trạng thái, tiến độ, kết quả hoặc lỗi
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, task: Callable[["Job"], Any], metadata: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex
+        self.task = task
+        self.metadata = metadata or {}
+        self.status = Job.QUEUED
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self.progress_done = 0
+        self.progress_total = 0
+        self.progress = ProgressTracker(self._on_progress, self.cancel_event)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (Job.COMPLETED, Job.FAILED, Job.CANCELLED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Thông tin trạng thái của công việc (không gồm kết quả)
+        """
+        percent = round(100 * self.progress_done / self.progress_total, 1) if self.progress_total else 0.0
+        if self.status == Job.COMPLETED:
+            percent = 100.0
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": {
+                "done": self.progress_done,
+                "total": self.progress_total,
+                "percent": percent
+            },
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            **self.metadata
+        }
+
+    def _on_progress(self, done: int, total: int) -> None:
+        self.progress_done = done
+        self.progress_total = total
+
+
+class JobManager:
+    """
+    Quản lý các công việc chạy nền với một nhóm worker cố định và hàng đợi có giới hạn
+    Kết quả của công việc đã xong được giữ lại trong result_ttl giây
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 20, result_ttl: int = 3600):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self._queue: "queue.Queue[Job]" = queue.Queue(maxsize=max_queue)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, task: Callable[[Job], Any], **metadata) -> Job:
+        """
+        Đưa công việc vào hàng đợi, ném JobQueueFull nếu hàng đợi đã đầy
+        """
+        self._start_workers()
+        self._cleanup()
+
+        job = Job(task, metadata)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise JobQueueFull(f"Hàng đợi đã đầy ({self.max_queue} công việc), vui lòng thử lại sau")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Yêu cầu huỷ công việc; công việc đang chạy sẽ dừng ở lần kiểm tra tiến độ tiếp theo
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if not job.finished:
+            job.cancel_event.set()
+            if job.status == Job.QUEUED:
+                job.status = Job.CANCELLED
+                job.finished_at = time.time()
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        counts["queue_size"] = self._queue.qsize()
+        counts["max_queue"] = self.max_queue
+        return counts
+
+    def _start_workers(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job.cancel_event.is_set():
+                    continue
+                job.status = Job.RUNNING
+                job.started_at = time.time()
+                try:
+                    job.result = job.task(job)
+                    job.status = Job.COMPLETED
+                except TranslationCancelled:
+                    job.status = Job.CANCELLED
+                except Exception as e:
+                    print(f"Lỗi khi chạy công việc {job.id}: {str(e)}")
+                    print(traceback.format_exc())
+                    job.error = str(e)
+                    job.status = Job.FAILED
+                finally:
+                    job.finished_at = time.time()
+                    job.task = None
+            finally:
+                self._queue.task_done()
+
+    def _cleanup(self) -> None:
+        """
+        Xoá các công việc đã xong quá result_ttl giây
+        """
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at and now - job.finished_at > self.result_ttl]
+            for job_id in expired:
+                del self._jobs[job_id]
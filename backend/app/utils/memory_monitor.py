@@ -0,0 +1,87 @@
+import os
+import sys
+import threading
+from typing import Dict, Optional
+
+# resource chỉ có trên Unix; trên Windows không có số liệu bộ nhớ của tiến trình con
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Chu kỳ lấy mẫu bộ nhớ (giây)
+MEMORY_SAMPLE_INTERVAL = float(os.environ.get("MEMORY_SAMPLE_INTERVAL", "0.05"))
+
+try:
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (ValueError, OSError, AttributeError):
+    PAGE_SIZE = 4096
+
+
+def current_rss() -> Optional[int]:
+    """
+    Bộ nhớ thực (RSS, byte) của tiến trình hiện tại, đọc từ /proc/self/statm
+    Trả về None nếu hệ điều hành không có /proc (Windows, macOS), khi đó không lấy mẫu bộ nhớ
+    """
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemoryMonitor:
+    """
+    Theo dõi đỉnh bộ nhớ của tiến trình trong một khoảng xử lý bằng một luồng lấy mẫu RSS định kỳ
+    Dùng với with: with MemoryMonitor() as monitor: ...; monitor.stats()
+    Lưu ý RSS là của cả tiến trình nên các request chạy song song sẽ ảnh hưởng lẫn nhau
+    """
+
+    def __init__(self, interval: float = MEMORY_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start_rss: Optional[int] = None
+        self.peak_rss: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "MemoryMonitor":
+        self.start_rss = current_rss()
+        self.peak_rss = self.start_rss
+        if self.start_rss is not None:
+            self._thread = threading.Thread(target=self._sample, name="memory-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._record(current_rss())
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """
+        Bộ nhớ lúc bắt đầu, đỉnh bộ nhớ (MB) và đỉnh bộ nhớ của các tiến trình con (poppler, tesseract)
+        """
+        def to_mb(value: Optional[int]) -> Optional[float]:
+            return round(value / (1024 * 1024), 1) if value is not None else None
+
+        # ru_maxrss tính bằng KB trên Linux (byte trên macOS), là đỉnh của tiến trình con lớn nhất từ trước đến nay
+        children_peak = None
+        if resource is not None:
+            children_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+            if sys.platform != "darwin":
+                children_peak *= 1024
+        return {
+            "start_rss_mb": to_mb(self.start_rss),
+            "peak_rss_mb": to_mb(self.peak_rss),
+            "peak_delta_mb": to_mb(self.peak_rss - self.start_rss) if self.start_rss is not None else None,
+            "children_max_rss_mb": to_mb(children_peak)
+        }
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._record(current_rss())
+
+    def _record(self, rss: Optional[int]) -> None:
+        if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+            self.peak_rss = rss
@@ -2,37 +2,129 @@ import PyPDF2
 import io
 from pdf2image import convert_from_bytes
 import pytesseract
-from typing import List, Dict, Optional
+from typing import BinaryIO, List, Dict, Optional
 import os
 import pathlib
-import base64
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter, A4
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from PyPDF2 import PdfReader, PdfWriter, PdfMerger
+from PyPDF2 import PdfReader, PdfWriter
 from io import BytesIO
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import base64
+import hashlib
+import json
+import math
+import multiprocessing
+import threading
 import tempfile
 
+from .cache import PersistentCache
+from .font_registry import FontRegistry, get_font_registry
+from .pdf_layout import LineBreaker
+from .pdf_segmenter import PDFSegmenter
+from .segment_classifier import UNREADABLE_PAGE_TEXT
+
 # Lấy đường dẫn đến thư mục resources/fonts
 CURRENT_DIR = pathlib.Path(__file__).parent.absolute()
 ROOT_DIR = CURRENT_DIR.parent.parent
-FONTS_DIR = ROOT_DIR / "resources" / "fonts"
 
-# Base64 encoded minimal Vietnamese font (just to ensure we have a working font)
-# Đây là một phần của font Liberation Sans để đảm bảo tiếng Việt hiển thị đúng
-VIET_FONT_BASE64 = """
-AAEAAAARAQAABABGRlRNVXgVHwAARxQAAAAcT1MvMoqQ/lUAAAFgAAAAYGNtYXADbgW5AAADwAAAA
-ZpnYXNw//8AAwAAQYQAAAAIZ2x5ZkzALZAAAAs0AAA2JGhlYWQPnJXLAAAA7AAAADZoaGVhBhkCVgA
-AASwAAAAkaG10eD8QDqIAAAH8AAAA8GxvY2GHEL44AAAKtAAAAHptYXhwAWoAhgAAAVgAAAAgbmFt
-ZQG1H9EAAD9cAAADiXBvc3QAAwAAAAADAAAAACAAAwQAAZAABQAAApkCzAAAAI8CmQLMAAAB6wAzA
-QAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAEAAP/kDwP/AAMAAAgMA
-AAAAAAAAAAAAAAIAAAAAAAAAAAAAAAAQAAAAAAA4AAAAAAAAAAAAAAAIAAAAAAAAAAAAAAAAAIAAAAA
-AAAAAAAAAAAAAQAAAAAAAAAAAAAAAAAAAIAAAAAAAAAAAAAAAAAAKAAAAAAAAAAAAAAAAAIAAAAAAA
-"""
+# Cấu hình OCR cho các trang không có lớp văn bản
+OCR_DPI = 300  # Độ phân giải cao để OCR tốt hơn
+OCR_LANG = 'jpn+eng+vie'  # Sử dụng cả tiếng Việt, tiếng Nhật và tiếng Anh
+OCR_CONFIG = '--psm 6'  # Chế độ phân tích trang đầy đủ
+OCR_BLOCK_CONFIG = '--psm 3'  # Tự phân tích bố cục để lấy từng khối văn bản khi chia trang theo khối
+# Số tiến trình tesseract chạy song song và số luồng poppler khi chuyển trang thành ảnh
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", str(os.cpu_count() or 2)))
+# Số trang tối đa chuyển thành ảnh trong một lần gọi poppler (giới hạn bộ nhớ)
+OCR_BATCH_PAGES = int(os.environ.get("OCR_BATCH_PAGES", "16"))
+# Hai nhóm trang cần OCR cách nhau không quá số trang này thì gộp vào một lần gọi poppler
+OCR_MERGE_GAP = 2
+# Cache kết quả OCR theo hash nội dung trang
+OCR_CACHE_PATH = os.environ.get("OCR_CACHE_PATH", str(ROOT_DIR / "cache" / "ocr_cache.sqlite3"))
+OCR_CACHE_MAX_ENTRIES = int(os.environ.get("OCR_CACHE_MAX_ENTRIES", "50000"))
+OCR_CACHE_TTL_DAYS = int(os.environ.get("OCR_CACHE_TTL_DAYS", "180"))
+# Chế độ OCR tiết kiệm bộ nhớ: ảnh xám ghi ra thư mục tạm, tesseract đọc trực tiếp từ file,
+# DPI chọn theo kích thước trang và mật độ chữ
+OCR_LOW_MEMORY = os.environ.get("OCR_LOW_MEMORY", "0").lower() in ("1", "true", "yes")
+OCR_SPOOL_DIR = os.environ.get("OCR_SPOOL_DIR") or None
+OCR_MIN_DPI = int(os.environ.get("OCR_MIN_DPI", "200"))
+OCR_PROBE_DPI = 36  # Ảnh thăm dò rất nhỏ để đo mật độ chữ
+# Số điểm ảnh tối đa của một trang (khoảng A4 ở 300 DPI), trang lớn hơn sẽ giảm DPI
+OCR_MAX_PIXELS = int(os.environ.get("OCR_MAX_PIXELS", str(2480 * 3508)))
+# Tỉ lệ điểm ảnh tối trên ảnh thăm dò: dưới ngưỡng đầu coi là trang trắng, từ ngưỡng sau coi là chữ dày
+OCR_BLANK_INK_RATIO = 0.001
+OCR_DENSE_INK_RATIO = 0.08
+
+# Cấu hình trình bày của file PDF xuất ra
+PDF_PAGE_STYLE = {
+    "pagesize": A4,
+    "margins": (30, 30, 30, 30),  # trái, phải, trên, dưới
+    "title_text": "BẢN DỊCH TIẾNG VIỆT",
+    "title_size": 16,
+    "title_space_after": 12,
+    "content_size": 11,
+    "content_leading": 14,
+    "content_space_after": 10,
+}
+
+# Cách dựng file PDF xuất ra: "platypus" (mặc định) hoặc "canvas" (vẽ trực tiếp, nhanh hơn)
+# Nếu cách đã chọn bị lỗi thì thử cách còn lại
+PDF_RENDERERS = ("platypus", "canvas")
+PDF_RENDERER = os.environ.get("PDF_RENDERER", "platypus")
+
+# Trích xuất text song song bằng nhiều tiến trình cho file PDF có từ PDF_PARALLEL_MIN_PAGES trang trở lên
+PDF_EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "64"))
+# Dựng song song file PDF xuất ra có từ PDF_PARALLEL_RENDER_MIN_PAGES trang trở lên: mỗi tiến trình dựng một khoảng
+# trang liên tiếp thành một file rồi ghép lại; mỗi khoảng nhúng một bộ font nên file lớn hơn dựng một lượt một chút
+PDF_RENDER_WORKERS = int(os.environ.get("PDF_RENDER_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_RENDER_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_RENDER_MIN_PAGES", "200"))
+# Dùng spawn để tiến trình con không kế thừa các luồng và kết nối SQLite đang mở của server
+PDF_EXTRACT_START_METHOD = os.environ.get("PDF_EXTRACT_START_METHOD", "spawn")
+# Cách chia nội dung PDF: "page" (mỗi trang một đoạn) hoặc "block" (mỗi khối văn bản một đoạn, kèm vị trí)
+SEGMENTATION_MODES = ("page", "block")
+PDF_SEGMENTATION = os.environ.get("PDF_SEGMENTATION", "page")
+
+
+def _extract_page(page, segmentation: str, segmenter: PDFSegmenter) -> tuple:
+    """
+    Trích xuất (text, danh sách khối) của một trang; danh sách khối là None khi chia theo trang
+    """
+    if segmentation == "block":
+        return segmenter.extract_page(page)
+    return page.extract_text(), None
+
+
+def _extract_page_range(file_content: bytes, first: int, last: int, segmentation: str = "page") -> List[tuple]:
+    """
+    Chạy trong tiến trình con: tự mở file PDF và trích xuất các trang từ first đến last (index từ 0)
+    """
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+    segmenter = PDFSegmenter()
+    pages = []
+    for index in range(first, last + 1):
+        try:
+            pages.append(_extract_page(pdf_reader.pages[index], segmentation, segmenter))
+        except Exception as e:
+            print(f"Lỗi khi trích xuất trang {index + 1}: {str(e)}")
+            pages.append(("", None))
+    return pages
+
+
+def _render_page_range(pages: List[tuple]) -> bytes:
+    """
+    Chạy trong tiến trình con: dựng một khoảng trang liên tiếp (nội dung dịch, số trang, tổng số trang) thành một file PDF
+    Font được đăng ký một lần cho mỗi tiến trình con, style giống hệt tiến trình chính
+    """
+    fonts = get_font_registry()
+    output = BytesIO()
+    PDFHandler._build_platypus_document(output, pages, fonts, PDFHandler._platypus_styles(fonts))
+    return output.getvalue()
+
 
 class PDFHandler:
     def __init__(self):
@@ -42,130 +134,444 @@ class PDFHandler:
                 pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
             except:
                 print("Tesseract không tìm thấy ở vị trí mặc định. Vui lòng cài đặt Tesseract.")
+        
+        # Mỗi tiến trình tesseract chỉ dùng một luồng vì đã chạy nhiều tiến trình song song
+        os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+        self._ocr_executor = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix="ocr")
+        self.ocr_cache = PersistentCache(
+            OCR_CACHE_PATH,
+            table="ocr_results",
+            max_entries=OCR_CACHE_MAX_ENTRIES,
+            ttl_seconds=OCR_CACHE_TTL_DAYS * 24 * 3600,
+            memory_entries=1000
+        )
+        self.segmenter = PDFSegmenter()
+        # Các nhóm tiến trình trích xuất text và dựng trang PDF, chỉ tạo khi gặp file PDF lớn
+        self._process_executors: Dict[str, ProcessPoolExecutor] = {}
+        self._process_lock = threading.Lock()
                 
-        # Đăng ký font hỗ trợ Unicode/tiếng Việt
+        # Đăng ký font hỗ trợ Unicode/tiếng Việt một lần cho cả tiến trình
         try:
-            # Kiểm tra các font mặc định có sẵn
-            self.register_available_fonts()
+            self.font_registry = get_font_registry()
         except Exception as e:
             print(f"Không thể đăng ký font: {str(e)}")
+            self.font_registry = None
 
-    def register_available_fonts(self):
-        """Đăng ký các font có sẵn trong reportlab và nạp font Unicode cho tiếng Việt"""
-        # Đăng ký các font mặc định của reportlab
-        reportlab_fonts = [
-            "Helvetica", "Helvetica-Bold", "Helvetica-Oblique", "Helvetica-BoldOblique",
-            "Times-Roman", "Times-Bold", "Times-Italic", "Times-BoldItalic",
-            "Courier", "Courier-Bold", "Courier-Oblique", "Courier-BoldOblique"
-        ]
-        
-        for font in reportlab_fonts:
-            if font not in pdfmetrics._fonts:
-                print(f"Đăng ký font mặc định: {font}")
-                # Các font này đã được đăng ký tự động bởi reportlab
+    def register_available_fonts(self) -> FontRegistry:
+        """Trả về danh sách font dùng chung (chỉ đăng ký font ở lần gọi đầu tiên trong tiến trình)"""
+        if self.font_registry is None:
+            self.font_registry = get_font_registry()
+        return self.font_registry
+    
+    def extract_text_from_pdf(self, file_content: bytes, stats: Optional[Dict] = None,
+                              segmentation: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Trích xuất văn bản từ file PDF
+        Trả về danh sách các trang, mỗi trang là một dictionary với key là số trang và value là nội dung
+        Khi segmentation là "block", mỗi trang có thêm "blocks": các khối văn bản với id, nội dung và vị trí (bbox)
+        Nếu truyền stats thì ghi thêm thống kê OCR (số trang OCR, số trang lấy từ cache, DPI đã dùng)
+        """
+        segmentation = segmentation or PDF_SEGMENTATION
+        if segmentation not in SEGMENTATION_MODES:
+            raise Exception(f"Lỗi khi xử lý file PDF: chế độ chia nội dung không hợp lệ '{segmentation}'")
         
-        # Tạo font bảo đảm hỗ trợ tiếng Việt từ dữ liệu mã hóa base64
-        # Điều này tránh việc phụ thuộc vào việc cài đặt font trong hệ thống
         try:
-            if "VietFont" not in pdfmetrics._fonts:
-                # Tạo file tạm chứa font
-                with tempfile.NamedTemporaryFile(suffix='.ttf', delete=False) as temp_font:
-                    temp_font.write(base64.b64decode(VIET_FONT_BASE64))
-                    temp_font_path = temp_font.name
+            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+            pages = self._extract_pages(file_content, pdf_reader, segmentation)
+            
+            # Các trang không trích xuất được text thông qua PyPDF2 sẽ được OCR cùng lúc
+            missing_pages = [i for i, (text, _) in enumerate(pages) if not text or text.isspace()]
+            if missing_pages:
+                print(f"DEBUG OCR: {len(missing_pages)}/{len(pages)} trang cần OCR")
+                ocr_stats = {"mode": "low_memory" if OCR_LOW_MEMORY else "in_memory", "pages": len(missing_pages)}
+                ocr_results = self._ocr_pages(file_content, pdf_reader, missing_pages, ocr_stats, segmentation)
+                for i, value in ocr_results.items():
+                    if segmentation == "block":
+                        pages[i] = self._ocr_result_to_page(value, pdf_reader.pages[i])
+                    else:
+                        pages[i] = (value, None)
+                if stats is not None:
+                    stats["ocr"] = ocr_stats
+            
+            result = []
+            for i, (text, blocks) in enumerate(pages):
+                page_data = {
+                    "page": i + 1,
+                    "content": text if text else UNREADABLE_PAGE_TEXT
+                }
+                if segmentation == "block":
+                    page_data["blocks"] = [
+                        {"id": f"p{i + 1}-b{n + 1}", "content": block["content"], "bbox": block["bbox"]}
+                        for n, block in enumerate(blocks or [])
+                    ]
+                    if page_data["blocks"]:
+                        page_data["content"] = "\n\n".join(block["content"] for block in page_data["blocks"])
+                result.append(page_data)
                 
-                # Đăng ký font từ file tạm
-                pdfmetrics.registerFont(TTFont('VietFont', temp_font_path))
-                print(f"Đã tạo và đăng ký font VietFont từ dữ liệu mã hóa")
+            return result
         except Exception as e:
-            print(f"Lỗi khi tạo font tạm thời: {str(e)}")
-                
-        # Tìm và đăng ký các font TrueType trong thư mục resources/fonts
-        fonts_path = FONTS_DIR
-        if fonts_path.exists():
-            for font_file in fonts_path.glob("*.ttf"):
-                font_name = font_file.stem
-                if font_name not in pdfmetrics._fonts:
-                    try:
-                        print(f"Đăng ký font TrueType: {font_name}")
-                        pdfmetrics.registerFont(TTFont(font_name, str(font_file)))
-                    except Exception as e:
-                        print(f"Lỗi khi đăng ký font {font_name}: {str(e)}")
-        else:
-            print(f"Thư mục fonts không tồn tại: {fonts_path}")
-            # Tạo thư mục fonts nếu chưa tồn tại
+            raise Exception(f"Lỗi khi xử lý file PDF: {str(e)}")
+    
+    def _extract_pages(self, file_content: bytes, pdf_reader: PdfReader, segmentation: str) -> List[tuple]:
+        """
+        Trích xuất (text, danh sách khối) bằng PyPDF2 cho tất cả các trang
+        File lớn được chia thành các khoảng trang liên tiếp cho nhiều tiến trình, kết quả giữ đúng thứ tự trang
+        """
+        page_count = len(pdf_reader.pages)
+        workers = min(PDF_EXTRACT_WORKERS, page_count)
+        if page_count < PDF_PARALLEL_MIN_PAGES or workers < 2:
+            return [_extract_page(page, segmentation, self.segmenter) for page in pdf_reader.pages]
+        
+        pages_per_worker = -(-page_count // workers)
+        ranges = [(first, min(first + pages_per_worker, page_count) - 1)
+                  for first in range(0, page_count, pages_per_worker)]
+        print(f"DEBUG PDF: trích xuất {page_count} trang bằng {len(ranges)} tiến trình")
+        try:
+            executor = self._get_process_executor("extract", PDF_EXTRACT_WORKERS)
+            futures = [executor.submit(_extract_page_range, file_content, first, last, segmentation)
+                       for first, last in ranges]
+            pages = []
+            for future in futures:
+                pages.extend(future.result())
+            return pages
+        except Exception as e:
+            # Nhóm tiến trình bị lỗi (ví dụ tiến trình con bị kill): tạo lại lần sau và trích xuất tuần tự
+            print(f"Lỗi khi trích xuất song song, chuyển sang trích xuất tuần tự: {str(e)}")
+            self._reset_process_executor("extract")
+            return [_extract_page(page, segmentation, self.segmenter) for page in pdf_reader.pages]
+    
+    def _ocr_result_to_page(self, value: str, page) -> tuple:
+        """
+        Đổi kết quả OCR dạng khối (JSON lưu trong cache) thành (text, danh sách khối) với vị trí theo point
+        """
+        data = json.loads(value)
+        blocks = self.segmenter.ocr_blocks_to_page(data["blocks"], data["dpi"], float(page.mediabox.height))
+        return "\n\n".join(block["content"] for block in blocks), blocks
+    
+    def _get_process_executor(self, name: str, workers: int) -> ProcessPoolExecutor:
+        with self._process_lock:
+            executor = self._process_executors.get(name)
+            if executor is None:
+                executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context(PDF_EXTRACT_START_METHOD)
+                )
+                self._process_executors[name] = executor
+            return executor
+    
+    def _reset_process_executor(self, name: str) -> None:
+        """
+        Bỏ nhóm tiến trình bị lỗi (ví dụ tiến trình con bị kill), lần sau sẽ tạo lại
+        """
+        with self._process_lock:
+            executor = self._process_executors.pop(name, None)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _ocr_pages(self, file_content: bytes, pdf_reader: PdfReader, page_indexes: List[int],
+                   stats: Optional[Dict] = None, segmentation: str = "page") -> Dict[int, str]:
+        """
+        OCR các trang (index bắt đầu từ 0): trang đã có trong cache OCR thì dùng lại,
+        các trang còn lại được chuyển thành ảnh (trong bộ nhớ hoặc ra file nếu bật OCR_LOW_MEMORY)
+        rồi chạy tesseract song song với số worker giới hạn
+        Khi segmentation là "block", kết quả mỗi trang là JSON gồm DPI và các khối văn bản (vị trí theo điểm ảnh)
+        """
+        stats = stats if stats is not None else {}
+        results: Dict[int, str] = {}
+        fingerprints: Dict[int, str] = {}
+        for index in page_indexes:
             try:
-                os.makedirs(fonts_path, exist_ok=True)
-                print(f"Đã tạo thư mục fonts: {fonts_path}")
+                fingerprints[index] = self._page_fingerprint(pdf_reader.pages[index], segmentation)
             except Exception as e:
-                print(f"Không thể tạo thư mục fonts: {str(e)}")
-            
-        # Kiểm tra font đã đăng ký
-        print(f"Danh sách font đã đăng ký: {list(pdfmetrics._fonts.keys())}")
+                print(f"Không thể tính hash cho trang {index + 1}: {str(e)}")
+                continue
+            cached = self.ocr_cache.get(fingerprints[index])
+            if cached is not None:
+                results[index] = cached
+        
+        wanted = sorted(set(page_indexes) - set(results))
+        stats["cached_pages"] = len(results)
+        print(f"DEBUG OCR: {len(results)} trang lấy từ cache, {len(wanted)} trang cần OCR")
+        
+        if OCR_LOW_MEMORY:
+            ocr_results = self._ocr_pages_from_files(file_content, pdf_reader, wanted, stats, segmentation)
+        else:
+            ocr_results = self._ocr_pages_in_memory(file_content, wanted, segmentation)
+        for index, text in ocr_results:
+            results[index] = text
+            if index in fingerprints:
+                self.ocr_cache.set(fingerprints[index], text)
+        
+        return results
     
-    def extract_text_from_pdf(self, file_content: bytes) -> List[Dict[str, str]]:
+    def _ocr_pages_in_memory(self, file_content: bytes, page_indexes: List[int], segmentation: str = "page"):
         """
-        Trích xuất văn bản từ file PDF
-        Trả về danh sách các trang, mỗi trang là một dictionary với key là số trang và value là nội dung
+        Chuyển nhiều trang thành ảnh trong một lần gọi poppler (dùng nhiều luồng) và OCR song song
+        Trả về lần lượt (index, text) của các trang OCR thành công
         """
-        try:
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-            result = []
+        wanted = set(page_indexes)
+        for first, last in self._ocr_page_ranges(page_indexes):
+            try:
+                images = convert_from_bytes(
+                    file_content,
+                    first_page=first + 1,
+                    last_page=last + 1,
+                    dpi=OCR_DPI,
+                    thread_count=min(OCR_WORKERS, last - first + 1)
+                )
+            except Exception as ocr_error:
+                print(f"OCR error: {str(ocr_error)}")
+                continue
+            
+            # Chỉ OCR các trang cần thiết (bỏ qua các trang xen giữa đã có text)
+            pages = [(first + offset, image) for offset, image in enumerate(images) if first + offset in wanted]
+            texts = self._ocr_executor.map(lambda item: self._ocr_image(item[1], OCR_DPI, segmentation), pages)
+            for (index, _), text in zip(pages, texts):
+                if text is not None:
+                    yield index, text
             
-            for i, page in enumerate(pdf_reader.pages):
-                text = page.extract_text()
+            # Giải phóng ảnh ngay sau khi OCR xong nhóm trang này
+            del images, pages
+    
+    def _ocr_pages_from_files(self, file_content: bytes, pdf_reader: PdfReader, page_indexes: List[int], stats: Dict,
+                              segmentation: str = "page"):
+        """
+        OCR tiết kiệm bộ nhớ: đo mật độ chữ trên ảnh thăm dò nhỏ để chọn DPI cho từng trang,
+        ghi ảnh xám ra thư mục tạm, tesseract đọc trực tiếp từ file và file bị xoá ngay sau khi OCR
+        Trả về lần lượt (index, text) của các trang OCR thành công
+        """
+        stats.setdefault("dpi", {})
+        stats.setdefault("blank_pages", 0)
+        with tempfile.TemporaryDirectory(prefix="ocr-", dir=OCR_SPOOL_DIR) as spool_dir:
+            for first, last in self._ocr_page_ranges(page_indexes):
+                dpis = self._choose_ocr_dpis(file_content, pdf_reader, [i for i in page_indexes if first <= i <= last])
+                
+                groups = []
+                for index, dpi in sorted(dpis.items()):
+                    stats["dpi"][str(index + 1)] = dpi
+                    if dpi == 0:
+                        # Trang trắng: không cần chạy tesseract
+                        stats["blank_pages"] += 1
+                        yield index, self._format_ocr_result("", [], dpi, segmentation)
+                    elif groups and groups[-1][0] == dpi and index - groups[-1][2] <= OCR_MERGE_GAP:
+                        groups[-1][2] = index
+                        groups[-1][3].add(index)
+                    else:
+                        groups.append([dpi, index, index, {index}])
                 
-                # Nếu không trích xuất được text thông qua PyPDF2, thử dùng OCR
-                if not text or text.isspace():
-                    # Chuyển đổi trang PDF thành hình ảnh và sử dụng OCR
+                for dpi, group_first, group_last, wanted in groups:
                     try:
-                        images = convert_from_bytes(
-                            file_content, 
-                            first_page=i+1, 
-                            last_page=i+1,
-                            dpi=300  # Tăng độ phân giải để OCR tốt hơn
+                        paths = convert_from_bytes(
+                            file_content,
+                            first_page=group_first + 1,
+                            last_page=group_last + 1,
+                            dpi=dpi,
+                            grayscale=True,
+                            output_folder=spool_dir,
+                            paths_only=True,
+                            thread_count=min(OCR_WORKERS, group_last - group_first + 1)
                         )
-                        if images:
-                            # Sử dụng cả tiếng Việt, tiếng Nhật và tiếng Anh
-                            text = pytesseract.image_to_string(
-                                images[0], 
-                                lang='jpn+eng+vie',
-                                config='--psm 6'  # Chế độ phân tích trang đầy đủ
-                            )
                     except Exception as ocr_error:
                         print(f"OCR error: {str(ocr_error)}")
-                        text = ""
-                
-                result.append({
-                    "page": i + 1,
-                    "content": text if text else "Không thể trích xuất nội dung từ trang này"
-                })
-                
-            return result
-        except Exception as e:
-            raise Exception(f"Lỗi khi xử lý file PDF: {str(e)}")
+                        continue
+                    
+                    pages = []
+                    for offset, path in enumerate(paths):
+                        if group_first + offset in wanted:
+                            pages.append((group_first + offset, path))
+                        else:
+                            self._remove_file(path)
+                    texts = self._ocr_executor.map(lambda item: self._ocr_file(item[1], dpi, segmentation), pages)
+                    for (index, _), text in zip(pages, texts):
+                        if text is not None:
+                            yield index, text
+    
+    def _choose_ocr_dpis(self, file_content: bytes, pdf_reader: PdfReader, page_indexes: List[int]) -> Dict[int, int]:
+        """
+        Chọn DPI cho từng trang: trang chữ dày dùng OCR_DPI, trang thưa dùng DPI thấp hơn (tối thiểu OCR_MIN_DPI),
+        trang khổ lớn bị giới hạn theo OCR_MAX_PIXELS; trang trắng trả về 0
+        """
+        first, last = page_indexes[0], page_indexes[-1]
+        try:
+            probes = convert_from_bytes(
+                file_content,
+                first_page=first + 1,
+                last_page=last + 1,
+                dpi=OCR_PROBE_DPI,
+                grayscale=True,
+                thread_count=min(OCR_WORKERS, last - first + 1)
+            )
+        except Exception as probe_error:
+            print(f"Không thể tạo ảnh thăm dò: {str(probe_error)}")
+            probes = []
+        
+        dpis = {}
+        for index in page_indexes:
+            ink_ratio = None
+            if index - first < len(probes):
+                histogram = probes[index - first].convert("L").histogram()
+                ink_ratio = sum(histogram[:128]) / max(1, sum(histogram))
+            dpis[index] = self._adaptive_dpi(pdf_reader.pages[index], ink_ratio)
+        del probes
+        return dpis
+    
+    def _adaptive_dpi(self, page, ink_ratio: Optional[float]) -> int:
+        """
+        DPI theo mật độ chữ và kích thước trang, làm tròn xuống bội số của 50
+        để các trang liền nhau có thể chuyển thành ảnh trong cùng một lần gọi poppler
+        """
+        if ink_ratio is not None and ink_ratio < OCR_BLANK_INK_RATIO:
+            return 0
+        
+        density = 1.0 if ink_ratio is None else min(1.0, ink_ratio / OCR_DENSE_INK_RATIO)
+        dpi = OCR_MIN_DPI + (OCR_DPI - OCR_MIN_DPI) * density
+        
+        width_inch = float(page.mediabox.width) / 72
+        height_inch = float(page.mediabox.height) / 72
+        if width_inch > 0 and height_inch > 0:
+            # Cộng thêm 1 để trang đúng khổ A4 không bị làm tròn xuống do sai số
+            dpi = min(dpi, math.sqrt(OCR_MAX_PIXELS / (width_inch * height_inch)) + 1)
+        return max(50, int(dpi // 50) * 50)
+    
+    def _ocr_file(self, path: str, dpi: int, segmentation: str = "page") -> Optional[str]:
+        """
+        OCR một ảnh trang đã ghi ra file rồi xoá file
+        """
+        try:
+            return self._ocr_image(path, dpi, segmentation)
+        finally:
+            self._remove_file(path)
+    
+    def _remove_file(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    
+    def _ocr_page_ranges(self, page_indexes: List[int]) -> List[tuple]:
+        """
+        Gộp các trang cần OCR thành các khoảng liên tiếp (first, last), mỗi khoảng tối đa OCR_BATCH_PAGES trang
+        """
+        ranges = []
+        for index in sorted(page_indexes):
+            if ranges and index - ranges[-1][1] <= OCR_MERGE_GAP and index - ranges[-1][0] < OCR_BATCH_PAGES:
+                ranges[-1][1] = index
+            else:
+                ranges.append([index, index])
+        return [tuple(item) for item in ranges]
+    
+    def _ocr_image(self, image, dpi: int = OCR_DPI, segmentation: str = "page") -> Optional[str]:
+        """
+        Nhận dạng văn bản trong một ảnh trang, trả về None nếu lỗi
+        Khi chia theo khối, dùng image_to_data để lấy thêm vị trí các khối văn bản
+        """
+        try:
+            if segmentation == "block":
+                data = pytesseract.image_to_data(
+                    image, lang=OCR_LANG, config=OCR_BLOCK_CONFIG, output_type=pytesseract.Output.DICT
+                )
+                return self._format_ocr_result(None, self.segmenter.blocks_from_ocr_data(data), dpi, segmentation)
+            return pytesseract.image_to_string(image, lang=OCR_LANG, config=OCR_CONFIG)
+        except Exception as ocr_error:
+            print(f"OCR error: {str(ocr_error)}")
+            return None
+    
+    def _format_ocr_result(self, text: Optional[str], blocks: List[Dict], dpi: int, segmentation: str) -> str:
+        """
+        Kết quả OCR của một trang dạng chuỗi để lưu cache: text khi chia theo trang, JSON các khối khi chia theo khối
+        """
+        if segmentation == "block":
+            return json.dumps({"dpi": dpi, "blocks": blocks}, ensure_ascii=False)
+        return text or ""
+    
+    def _page_fingerprint(self, page, segmentation: str = "page") -> str:
+        """
+        Hash của một trang để làm key cho cache OCR: content stream, resources (ảnh, font...),
+        kích thước, góc xoay của trang, cấu hình OCR (DPI, ngôn ngữ, PSM) và cách chia nội dung
+        """
+        digest = hashlib.sha256()
+        # Ở chế độ tiết kiệm bộ nhớ DPI được chọn tự động từ chính nội dung trang nên chỉ cần ghi cấu hình chọn DPI
+        dpi_key = f"auto:{OCR_MIN_DPI}-{OCR_DPI}-{OCR_MAX_PIXELS}:gray" if OCR_LOW_MEMORY else str(OCR_DPI)
+        config = OCR_BLOCK_CONFIG if segmentation == "block" else OCR_CONFIG
+        digest.update(f"{dpi_key}|{OCR_LANG}|{config}|{segmentation}|{list(page.mediabox)}|{page.get('/Rotate', 0)}".encode())
+        seen = set()
+        for key in ("/Contents", "/Resources"):
+            if key in page:
+                digest.update(key.encode())
+                self._hash_pdf_object(dict.__getitem__(page, key), digest, seen)
+        return digest.hexdigest()
+    
+    def _hash_pdf_object(self, obj, digest, seen: set) -> None:
+        """
+        Đưa một đối tượng PDF (và các đối tượng con) vào hash, bỏ qua tham chiếu vòng
+        """
+        if isinstance(obj, IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key in seen:
+                digest.update(f"R{key}".encode())
+                return
+            seen.add(key)
+            obj = obj.get_object()
+        
+        if isinstance(obj, StreamObject):
+            # Dùng dữ liệu gốc của stream (chưa giải nén) để nhanh hơn
+            data = getattr(obj, "_data", None)
+            digest.update(data if isinstance(data, bytes) else obj.get_data())
+        if isinstance(obj, DictionaryObject):
+            for key in sorted(obj.keys()):
+                if key == "/Parent":
+                    continue
+                digest.update(key.encode())
+                self._hash_pdf_object(dict.__getitem__(obj, key), digest, seen)
+        elif isinstance(obj, ArrayObject):
+            digest.update(b"[")
+            for item in obj:
+                self._hash_pdf_object(item, digest, seen)
+            digest.update(b"]")
+        elif not isinstance(obj, StreamObject):
+            digest.update(repr(obj).encode())
     
     def create_translated_pdf(self, original_file: bytes, translated_texts: List[Dict[str, str]]) -> bytes:
         """
         Tạo file PDF với nội dung đã được dịch
         """
-        # Thử sử dụng phương pháp 1: Platypus với Paragraph
-        try:
-            return self._create_pdf_with_platypus(original_file, translated_texts)
-        except Exception as e:
-            print(f"Lỗi khi tạo PDF với Platypus: {str(e)}")
-            print("Thử phương pháp 2: Sử dụng canvas trực tiếp")
+        output = BytesIO()
+        self.write_translated_pdf(original_file, translated_texts, output)
+        return output.getvalue()
+    
+    def write_translated_pdf(self, original_file: bytes, translated_texts: List[Dict[str, str]], output: BinaryIO) -> None:
+        """
+        Ghi file PDF đã dịch vào output (file hoặc buffer), không giữ thêm bản sao trong bộ nhớ
+        """
+        renderers = {
+            "platypus": self._create_pdf_with_platypus,
+            "canvas": self._create_pdf_with_canvas,
+        }
+        primary = PDF_RENDERER if PDF_RENDERER in renderers else "platypus"
+        order = [primary] + [name for name in PDF_RENDERERS if name != primary]
+        
+        last_error = None
+        for name in order:
             try:
-                return self._create_pdf_with_canvas(original_file, translated_texts)
-            except Exception as e2:
-                error_msg = f"Cả hai phương pháp tạo PDF đều thất bại. Lỗi cuối cùng: {str(e2)}"
-                print(error_msg)
-                import traceback
-                print(traceback.format_exc())
-                raise Exception(error_msg)
+                if last_error is not None:
+                    # Xoá phần đã ghi dở của cách trước
+                    output.seek(0)
+                    output.truncate()
+                renderers[name](original_file, translated_texts, output)
+                return
+            except Exception as e:
+                print(f"Lỗi khi tạo PDF với {name}: {str(e)}")
+                last_error = e
+        
+        error_msg = f"Cả hai phương pháp tạo PDF đều thất bại. Lỗi cuối cùng: {str(last_error)}"
+        print(error_msg)
+        raise Exception(error_msg)
 
-    def _create_pdf_with_platypus(self, original_file: bytes, translated_texts: List[Dict[str, str]]) -> bytes:
+    def _create_pdf_with_platypus(self, original_file: bytes, translated_texts: List[Dict[str, str]],
+                                  output_buffer: BinaryIO) -> None:
         """
         Tạo PDF với Platypus (phương pháp 1)
+        Dựng cả tài liệu trong một lượt; tài liệu lớn được chia thành các khoảng trang dựng song song
         """
         try:
             # DEBUG: In thông tin nhận được
@@ -183,109 +589,19 @@ class PDFHandler:
             
             print(f"DEBUG: Mapping đã tạo cho {len(translations)} trang")
             
-            # Đảm bảo thư mục fonts tồn tại
-            if not FONTS_DIR.exists():
-                print(f"CẢNH BÁO: Thư mục fonts không tồn tại: {FONTS_DIR}")
-                print("Tạo thư mục fonts...")
-                os.makedirs(FONTS_DIR, exist_ok=True)
-            
-            # Kiểm tra lại các font đã đăng ký
-            self.register_available_fonts()
-            
-            # Tạo PDF mới chỉ với nội dung đã dịch
-            output_buffer = BytesIO()
-            
-            # Chọn font phù hợp cho PDF với ưu tiên là font Unicode tốt nhất
-            title_font = 'Helvetica-Bold'  # Font mặc định cho tiêu đề
-            content_font = 'Helvetica'     # Font mặc định cho nội dung
-            
-            # Kiểm tra xem có font nào hỗ trợ Unicode tốt hơn không
-            available_fonts = list(pdfmetrics._fonts.keys())
-            print(f"DEBUG: Các font có sẵn: {available_fonts}")
-            
-            # Ưu tiên font Roboto, sau đó đến các font thường dùng cho Unicode
-            unicode_fonts = ['Roboto-Regular', 'Roboto-Bold', 'VietFont', 'Arial', 'FreeSans']
-            for font in unicode_fonts:
-                if font in available_fonts:
-                    content_font = font
-                    title_font = 'Roboto-Bold' if 'Roboto-Bold' in available_fonts else font
-                    print(f"DEBUG: Đã chọn font Unicode: {font}")
-                    break
-            
-            # Tạo document với cấu hình rõ ràng
-            doc = SimpleDocTemplate(
-                output_buffer, 
-                pagesize=A4,
-                rightMargin=30, leftMargin=30,
-                topMargin=30, bottomMargin=30
-            )
-            
-            # Tạo style mới cho nội dung tiếng Việt
-            styles = getSampleStyleSheet()
-            
-            # Style cho tiêu đề
-            title_style = ParagraphStyle(
-                'VietnameseTitle',
-                fontName=title_font,
-                fontSize=16,
-                alignment=1,  # center
-                spaceAfter=12,
-                encoding='utf-8'
-            )
-            
-            # Style cho nội dung
-            content_style = ParagraphStyle(
-                'VietnameseContent',
-                fontName=content_font,
-                fontSize=11,
-                leading=14,
-                spaceAfter=10,
-                encoding='utf-8',
-                wordWrap='CJK',  # Dùng wordWrap='CJK' cho tiếng Việt và tiếng Nhật
-                allowWidows=0,
-                allowOrphans=0
-            )
-            
-            # Tạo danh sách các phần tử cho PDF
-            elements = []
-            
-            # Thêm tiêu đề chính (ghi rõ bản dịch tiếng Việt)
-            elements.append(Paragraph("BẢN DỊCH TIẾNG VIỆT", title_style))
-            elements.append(Spacer(1, 20))
+            # Font Unicode tốt nhất đã được chọn sẵn khi đăng ký font
+            fonts = self.register_available_fonts()
+            styles = self._platypus_styles(fonts)
             
             # Đọc PDF gốc để lấy số trang
             pdf_reader = PyPDF2.PdfReader(io.BytesIO(original_file))
             num_pages = len(pdf_reader.pages)
             
-            # Duyệt qua từng trang của PDF gốc
-            for i in range(num_pages):
-                page_num = i + 1
-                
-                # Lấy nội dung đã dịch
-                translated_content = translations.get(page_num, "Không có bản dịch cho trang này")
-                
-                # Xử lý lỗi Unicode đặc biệt - đảm bảo nội dung không có ký tự không hợp lệ
-                translated_content = self._sanitize_text_for_pdf(translated_content)
-                
-                # Thêm phần đánh số trang
-                elements.append(Paragraph(f"Trang {page_num}/{num_pages}", title_style))
-                elements.append(Spacer(1, 10))
-                
-                # Chỉ thêm phần nội dung đã dịch, bỏ qua nội dung gốc
-                elements.append(Paragraph(translated_content, content_style))
-                
-                # Thêm ngắt trang (trừ trang cuối)
-                if i < num_pages - 1:
-                    elements.append(PageBreak())
-            
-            # Build PDF document
-            print("DEBUG: Bắt đầu tạo PDF...")
-            doc.build(elements)
+            pages = [(translations.get(i + 1, "Không có bản dịch cho trang này"), i + 1, num_pages)
+                     for i in range(num_pages)]
+            if not self._render_in_parallel(pages, output_buffer):
+                self._build_platypus_document(output_buffer, pages, fonts, styles)
             print("DEBUG: Đã tạo PDF xong!")
-            
-            # Lấy nội dung đã tạo
-            output_buffer.seek(0)
-            return output_buffer.getvalue()
         
         except Exception as e:
             error_msg = f"Lỗi khi tạo file PDF với Platypus: {str(e)}"
@@ -293,10 +609,128 @@ class PDFHandler:
             import traceback
             print(traceback.format_exc())
             raise Exception(error_msg)
+    
+    def _render_in_parallel(self, pages: List[tuple], output: BinaryIO) -> bool:
+        """
+        Dựng song song các khoảng trang liên tiếp ở nhiều tiến trình rồi ghép bằng PdfWriter
+        Trả về False (chưa ghi gì vào output) nếu tài liệu nhỏ, chỉ có một tiến trình hoặc dựng song song bị lỗi
+        """
+        workers = min(PDF_RENDER_WORKERS, len(pages))
+        if len(pages) < PDF_PARALLEL_RENDER_MIN_PAGES or workers < 2:
+            return False
+        
+        ranges = self._split_page_ranges(pages, workers)
+        print(f"DEBUG: Dựng {len(pages)} trang bằng {workers} tiến trình ({len(ranges)} khoảng trang)")
+        try:
+            executor = self._get_process_executor("render", PDF_RENDER_WORKERS)
+            writer = PdfWriter()
+            for fragment in executor.map(_render_page_range, ranges):
+                for page in PdfReader(io.BytesIO(fragment)).pages:
+                    writer.add_page(page)
+        except Exception as e:
+            print(f"Lỗi khi dựng trang song song, chuyển sang dựng một lượt: {str(e)}")
+            self._reset_process_executor("render")
+            return False
+        writer.write(output)
+        return True
+    
+    @staticmethod
+    def _split_page_ranges(pages: List[tuple], count: int) -> List[List[tuple]]:
+        """
+        Chia các trang thành tối đa count khoảng liên tiếp có tổng độ dài nội dung gần bằng nhau
+        """
+        total = sum(len(content) + 1 for content, _, _ in pages)
+        ranges, current, size = [], [], 0
+        for page in pages:
+            current.append(page)
+            size += len(page[0]) + 1
+            if size * count >= total * (len(ranges) + 1) and len(ranges) < count - 1:
+                ranges.append(current)
+                current = []
+        if current:
+            ranges.append(current)
+        return ranges
+    
+    @staticmethod
+    def _platypus_styles(fonts: FontRegistry) -> Dict[str, ParagraphStyle]:
+        """
+        Style cho tiêu đề và nội dung tiếng Việt theo PDF_PAGE_STYLE
+        """
+        # Style cho tiêu đề
+        title_style = ParagraphStyle(
+            'VietnameseTitle',
+            fontName=fonts.title_font,
+            fontSize=PDF_PAGE_STYLE["title_size"],
+            alignment=1,  # center
+            spaceAfter=PDF_PAGE_STYLE["title_space_after"],
+            encoding='utf-8'
+        )
+        
+        # Style cho nội dung
+        content_style = ParagraphStyle(
+            'VietnameseContent',
+            fontName=fonts.content_font,
+            fontSize=PDF_PAGE_STYLE["content_size"],
+            leading=PDF_PAGE_STYLE["content_leading"],
+            spaceAfter=PDF_PAGE_STYLE["content_space_after"],
+            encoding='utf-8',
+            wordWrap='CJK',  # Dùng wordWrap='CJK' cho tiếng Việt và tiếng Nhật
+            allowWidows=0,
+            allowOrphans=0
+        )
+        return {"title": title_style, "content": content_style}
+    
+    @staticmethod
+    def _build_platypus_document(output: BinaryIO, pages: List[tuple],
+                                 fonts: FontRegistry, styles: Dict[str, ParagraphStyle]) -> None:
+        """
+        Dựng các trang (nội dung dịch, số trang, tổng số trang) thành một file PDF, mỗi trang gốc bắt đầu trang mới
+        """
+        left, right, top, bottom = PDF_PAGE_STYLE["margins"]
+        doc = SimpleDocTemplate(
+            output,
+            pagesize=PDF_PAGE_STYLE["pagesize"],
+            rightMargin=right, leftMargin=left,
+            topMargin=top, bottomMargin=bottom
+        )
+        elements = []
+        for i, (translated_content, page_num, num_pages) in enumerate(pages):
+            if i > 0:
+                elements.append(PageBreak())
+            elements.extend(PDFHandler._platypus_page_elements(translated_content, page_num, num_pages, fonts, styles))
+        doc.build(elements)
+    
+    @staticmethod
+    def _platypus_page_elements(translated_content: str, page_num: int, num_pages: int,
+                                fonts: FontRegistry, styles: Dict[str, ParagraphStyle]) -> list:
+        """
+        Các phần tử platypus của một trang bản dịch
+        """
+        title_style, content_style = styles["title"], styles["content"]
+        
+        elements = []
+        if page_num == 1:
+            # Thêm tiêu đề chính (ghi rõ bản dịch tiếng Việt)
+            elements.append(Paragraph(fonts.markup(PDF_PAGE_STYLE["title_text"], title_style.fontName), title_style))
+            elements.append(Spacer(1, 20))
         
-    def _create_pdf_with_canvas(self, original_file: bytes, translated_texts: List[Dict[str, str]]) -> bytes:
+        # Xử lý lỗi Unicode đặc biệt - đảm bảo nội dung không có ký tự không hợp lệ,
+        # ký tự mà font nội dung không có (ví dụ chữ Nhật còn sót lại) được vẽ bằng font dự phòng
+        content = fonts.markup(PDFHandler._sanitize_text_for_pdf(translated_content), content_style.fontName)
+        
+        # Thêm phần đánh số trang
+        elements.append(Paragraph(fonts.markup(f"Trang {page_num}/{num_pages}", title_style.fontName), title_style))
+        elements.append(Spacer(1, 10))
+        
+        # Chỉ thêm phần nội dung đã dịch, bỏ qua nội dung gốc
+        elements.append(Paragraph(content, content_style))
+        return elements
+    
+    def _create_pdf_with_canvas(self, original_file: bytes, translated_texts: List[Dict[str, str]],
+                                output_buffer: BinaryIO) -> None:
         """
         Tạo PDF bằng cách vẽ trực tiếp văn bản tiếng Việt lên canvas (phương pháp 2)
+        Dòng được ngắt bằng LineBreaker nên nhanh hơn platypus, dùng làm cách chính khi PDF_RENDERER=canvas
         """
         try:
             # Tạo mapping từ số trang đến nội dung đã dịch
@@ -307,32 +741,25 @@ class PDFHandler:
             
             print(f"DEBUG CANVAS: Mapping đã tạo cho {len(translations)} trang")
             
-            # Đảm bảo fonts đã đăng ký
-            self.register_available_fonts()
-            
-            # Tạo PDF mới
-            output_buffer = BytesIO()
-            
-            # Chọn font Unicode tốt nhất có sẵn
-            available_fonts = list(pdfmetrics._fonts.keys())
-            font_name = 'Helvetica'  # Font mặc định
-            unicode_fonts = ['Roboto-Regular', 'Roboto-Bold', 'VietFont', 'Arial']
-            for font in unicode_fonts:
-                if font in available_fonts:
-                    font_name = font
-                    print(f"DEBUG CANVAS: Đã chọn font Unicode: {font}")
-                    break
+            # Font Unicode tốt nhất đã được chọn sẵn khi đăng ký font
+            fonts = self.register_available_fonts()
+            font_name = fonts.content_font
             
             # Đọc PDF gốc để lấy số trang
             pdf_reader = PyPDF2.PdfReader(io.BytesIO(original_file))
             num_pages = len(pdf_reader.pages)
             
             # Tạo canvas
-            c = canvas.Canvas(output_buffer, pagesize=A4)
-            page_width, page_height = A4
+            page_width, page_height = PDF_PAGE_STYLE["pagesize"]
+            left, right, top, bottom = PDF_PAGE_STYLE["margins"]
+            c = canvas.Canvas(output_buffer, pagesize=PDF_PAGE_STYLE["pagesize"])
             
-            # Thiết lập font và kích thước
-            c.setFont(font_name, 16)
+            title_font = fonts.title_font
+            title_size = PDF_PAGE_STYLE["title_size"]
+            content_size = PDF_PAGE_STYLE["content_size"]
+            line_height = PDF_PAGE_STYLE["content_leading"]
+            # Độ rộng từng từ được cache trong LineBreaker và dùng chung cho tất cả các trang
+            line_breaker = LineBreaker(fonts, font_name, content_size, page_width - left - right)
             
             # Vẽ từng trang
             for i in range(num_pages):
@@ -342,75 +769,37 @@ class PDFHandler:
                 if i > 0:
                     c.showPage()
                 
-                # Vẽ tiêu đề
-                c.setFont(font_name, 16)
-                title_text = "BẢN DỊCH TIẾNG VIỆT"
-                title_width = c.stringWidth(title_text, font_name, 16)
-                c.drawString((page_width - title_width) / 2, page_height - 40, title_text)
+                y_position = page_height - top - title_size
+                if page_num == 1:
+                    # Vẽ tiêu đề (chỉ ở trang đầu như khi dựng bằng platypus)
+                    title_text = PDF_PAGE_STYLE["title_text"]
+                    title_width = fonts.string_width(title_text, title_font, title_size)
+                    fonts.draw_string(c, (page_width - title_width) / 2, y_position, title_text, title_font, title_size)
+                    y_position -= title_size + 20
                 
                 # Vẽ số trang
                 page_text = f"Trang {page_num}/{num_pages}"
-                page_width_text = c.stringWidth(page_text, font_name, 14)
-                c.setFont(font_name, 14)
-                c.drawString((page_width - page_width_text) / 2, page_height - 60, page_text)
+                page_width_text = fonts.string_width(page_text, title_font, title_size)
+                fonts.draw_string(c, (page_width - page_width_text) / 2, y_position, page_text, title_font, title_size)
+                y_position -= title_size + PDF_PAGE_STYLE["title_space_after"] + 10
                 
                 # Lấy nội dung đã dịch
                 translated_content = translations.get(page_num, "Không có bản dịch cho trang này")
                 translated_content = self._sanitize_text_for_pdf(translated_content)
                 
-                # Chia nội dung thành các dòng
-                c.setFont(font_name, 11)
-                y_position = page_height - 100  # Vị trí bắt đầu vẽ văn bản
-                line_height = 14
-                
-                # Chia văn bản thành các dòng dựa trên độ rộng trang
-                max_width = page_width - 60  # 30px margin ở mỗi bên
-                lines = []
-                
-                # Chia văn bản theo dấu xuống dòng trước
-                paragraphs = translated_content.split('\n')
-                for paragraph in paragraphs:
-                    if not paragraph.strip():
-                        lines.append('')
-                        continue
-                    
-                    # Chia mỗi đoạn thành các dòng dựa trên độ rộng
-                    words = paragraph.split(' ')
-                    current_line = words[0]
-                    
-                    for word in words[1:]:
-                        test_line = current_line + ' ' + word
-                        line_width = c.stringWidth(test_line, font_name, 11)
-                        
-                        if line_width <= max_width:
-                            current_line = test_line
-                        else:
-                            lines.append(current_line)
-                            current_line = word
-                    
-                    # Thêm dòng cuối cùng của đoạn
-                    if current_line:
-                        lines.append(current_line)
-                    
-                    # Thêm dòng trống sau mỗi đoạn
-                    lines.append('')
-                
                 # Vẽ các dòng văn bản
-                for line in lines:
-                    if y_position < 40:  # Kiểm tra xem còn đủ không gian không
+                for line in line_breaker.break_text(translated_content):
+                    if y_position < bottom:  # Kiểm tra xem còn đủ không gian không
                         c.showPage()  # Tạo trang mới
-                        y_position = page_height - 40  # Reset vị trí y
+                        y_position = page_height - top - content_size  # Reset vị trí y
                     
-                    c.drawString(30, y_position, line)
+                    if line:
+                        fonts.draw_string(c, left, y_position, line, font_name, content_size)
                     y_position -= line_height
             
             # Lưu PDF
             c.save()
             
-            # Trả về nội dung
-            output_buffer.seek(0)
-            return output_buffer.getvalue()
-            
         except Exception as e:
             error_msg = f"Lỗi khi tạo file PDF với Canvas: {str(e)}"
             print(error_msg)
@@ -418,23 +807,15 @@ class PDFHandler:
             print(traceback.format_exc())
             raise Exception(error_msg)
     
-    def _sanitize_text_for_pdf(self, text: str) -> str:
+    @staticmethod
+    def _sanitize_text_for_pdf(text: str) -> str:
         """
         Làm sạch văn bản để tránh lỗi khi tạo PDF
+        Ký tự XML đặc biệt được escape khi tạo markup cho Paragraph (FontRegistry.markup), không escape ở đây
         """
         if not text:
             return "Không có nội dung"
         
-        # Chuyển đổi ký tự XML đặc biệt
-        text = (
-            text
-            .replace('&', '&amp;')
-            .replace('<', '&lt;')
-            .replace('>', '&gt;')
-            .replace('"', '&quot;')
-            .replace("'", '&#39;')
-        )
-        
         # Xử lý các ký tự đặc biệt có thể gây lỗi trong PDF
         chars_to_replace = {
             '\u2028': ' ',  # Line separator
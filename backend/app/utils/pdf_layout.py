@@ -0,0 +1,126 @@
+import re
+from typing import Dict, List, Tuple
+
+from .font_registry import FontRegistry
+
+# Mỗi ký tự Nhật/Trung là một đơn vị ngắt dòng; chữ Latin/Việt ngắt theo từ; khoảng trắng tách riêng
+CJK_CHARS = "\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef"
+TOKEN_PATTERN = re.compile(rf"[{CJK_CHARS}]|[^\s{CJK_CHARS}]+|\s+")
+# Quy tắc kinsoku: các ký tự không được đứng đầu dòng và không được đứng cuối dòng
+NO_LINE_START = set("、。，．,.!?！？：；:;)）]］}｝」』】〉》〕ー々ゝゞぁぃぅぇぉっゃゅょゎァィゥェォッャュョヮヵヶ・…‥")
+NO_LINE_END = set("([（［{｛「『【〈《〔")
+
+
+class LineBreaker:
+    """
+    Ngắt văn bản thành các dòng vừa với độ rộng cho trước khi vẽ trực tiếp lên canvas
+    Độ rộng từng từ được cache và cộng dồn theo dòng nên mỗi từ chỉ đo một lần (tuyến tính theo độ dài đoạn)
+    Chữ Nhật/Trung được ngắt giữa các ký tự theo quy tắc kinsoku
+    """
+
+    def __init__(self, fonts: FontRegistry, font_name: str, font_size: float, max_width: float):
+        self.fonts = fonts
+        self.font_name = font_name
+        self.font_size = font_size
+        self.max_width = max_width
+        self._widths: Dict[str, float] = {}
+        self.space_width = self.width(" ")
+
+    def width(self, token: str) -> float:
+        """
+        Độ rộng của một từ hoặc ký tự, tính một lần rồi cache
+        """
+        width = self._widths.get(token)
+        if width is None:
+            width = self.fonts.string_width(token, self.font_name, self.font_size)
+            self._widths[token] = width
+        return width
+
+    def break_text(self, text: str) -> List[str]:
+        """
+        Ngắt toàn bộ văn bản: mỗi đoạn (theo dấu xuống dòng) thành các dòng, sau mỗi đoạn có một dòng trống
+        """
+        lines: List[str] = []
+        for paragraph in text.split('\n'):
+            if not paragraph.strip():
+                lines.append('')
+                continue
+            lines.extend(self.break_paragraph(paragraph))
+            lines.append('')
+        return lines
+
+    def break_paragraph(self, paragraph: str) -> List[str]:
+        """
+        Ngắt một đoạn thành các dòng
+        """
+        lines: List[str] = []
+        # Dòng hiện tại là danh sách (có khoảng trắng phía trước không, token)
+        current: List[Tuple[bool, str]] = []
+        current_width = 0.0
+        pending_space = False
+
+        for token in TOKEN_PATTERN.findall(paragraph):
+            if token.isspace():
+                pending_space = True
+                continue
+
+            token_width = self.width(token)
+            gap = self.space_width if pending_space and current else 0.0
+            space_before, pending_space = pending_space, False
+
+            if not current or current_width + gap + token_width <= self.max_width:
+                if not current and token_width > self.max_width:
+                    # Từ dài hơn cả dòng: chia nhỏ theo ký tự
+                    current, current_width = self._break_long_token(token, lines)
+                    continue
+                current.append((space_before, token))
+                current_width += gap + token_width
+                continue
+
+            # Dấu câu không được đứng đầu dòng: cho phép tràn nhẹ ở cuối dòng hiện tại
+            if token in NO_LINE_START:
+                current.append((space_before, token))
+                current_width += gap + token_width
+                continue
+
+            # Ký tự không được đứng cuối dòng (ví dụ dấu mở ngoặc) được chuyển sang dòng mới
+            carried: List[Tuple[bool, str]] = []
+            while len(current) > 1 and current[-1][1] in NO_LINE_END:
+                carried.insert(0, current.pop())
+            lines.append(self._join(current))
+
+            current, current_width = [], 0.0
+            for item in carried:
+                current_width += (self.space_width if item[0] and current else 0.0) + self.width(item[1])
+                current.append(item)
+            if token_width > self.max_width and not current:
+                current, current_width = self._break_long_token(token, lines)
+                continue
+            current_width += (self.space_width if space_before and current else 0.0) + token_width
+            current.append((space_before, token))
+
+        if current:
+            lines.append(self._join(current))
+        return lines
+
+    def _break_long_token(self, token: str, lines: List[str]) -> Tuple[List[Tuple[bool, str]], float]:
+        """
+        Chia một từ dài hơn độ rộng dòng thành nhiều dòng, trả về phần còn lại làm dòng hiện tại
+        """
+        part, part_width = "", 0.0
+        for char in token:
+            char_width = self.width(char)
+            if part and part_width + char_width > self.max_width:
+                lines.append(part)
+                part, part_width = "", 0.0
+            part += char
+            part_width += char_width
+        return [(False, part)], part_width
+
+    def _join(self, tokens: List[Tuple[bool, str]]) -> str:
+        parts = []
+        for i, (space_before, token) in enumerate(tokens):
+            if space_before and i > 0:
+                parts.append(' ')
+            parts.append(token)
+        return ''.join(parts)
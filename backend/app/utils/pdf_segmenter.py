@@ -0,0 +1,161 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Hai dòng liền nhau cách nhau quá số lần cỡ chữ này thì coi là hai khối văn bản khác nhau
+BLOCK_LINE_GAP = 1.6
+# Cỡ chữ thay đổi quá số point này (ví dụ tiêu đề và nội dung) thì tách khối
+BLOCK_FONT_SIZE_DELTA = 1.5
+# Ước lượng độ rộng trung bình của một ký tự theo cỡ chữ khi không có thông tin font
+AVERAGE_CHAR_WIDTH = 0.5
+# Không chèn khoảng trắng khi nối dòng với chữ Nhật/Trung
+CJK_CHAR_PATTERN = re.compile(r"[\u3000-\u30ff\u3400-\u9fff\uff00-\uffef]")
+
+
+class PDFSegmenter:
+    """
+    Chia nội dung một trang PDF thành các khối văn bản (đoạn, tiêu đề, cột) kèm vị trí
+    từ các mảnh text mà PyPDF2 trả về qua visitor_text hoặc từ kết quả image_to_data của tesseract
+    Vị trí (bbox) là [x0, y0, x1, y1] theo point, gốc toạ độ ở góc dưới bên trái trang như PDF
+    """
+
+    def extract_page(self, page) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Trích xuất text và các khối văn bản của một trang bằng PyPDF2
+        """
+        fragments = []
+        # PyPDF2 chỉ trả text qua visitor_text khi gặp lệnh đổi vị trí tiếp theo (T*, Td, Tm...), lúc đó ma trận text
+        # đã chuyển sang dòng mới; vì vậy vị trí được lấy ngay tại các lệnh vẽ text chưa được trả về
+        origins: List[Tuple[float, float]] = []
+
+        def before(operator, operands, cm, tm):
+            if operator in (b"Tj", b"TJ"):
+                origins.append(self._origin(cm, tm))
+
+        def after(operator, operands, cm, tm):
+            # ' và " xuống dòng rồi mới vẽ text
+            if operator in (b"'", b'"'):
+                origins.append(self._origin(cm, tm))
+
+        def visitor(text, cm, tm, font_dict, font_size):
+            x, y = origins[0] if origins else self._origin(cm, tm)
+            origins.clear()
+            if not text or text.isspace():
+                return
+            size = abs(font_size * tm[3] * cm[3]) or abs(font_size) or 10
+            fragments.append((x, y, size, text))
+
+        text = page.extract_text(visitor_operand_before=before, visitor_operand_after=after, visitor_text=visitor)
+        return text, self.blocks_from_fragments(fragments)
+
+    def blocks_from_fragments(self, fragments: List[Tuple[float, float, float, str]]) -> List[Dict[str, Any]]:
+        """
+        Gộp các mảnh (x, y, cỡ chữ, text) theo thứ tự trong content stream thành dòng, rồi dòng thành khối
+        """
+        blocks = []
+        lines: List[str] = []
+        box: Optional[List[float]] = None
+        last_y = last_size = None
+
+        for x, y, size, text in fragments:
+            for part in text.split("\n"):
+                part = part.strip()
+                if not part:
+                    continue
+                width = len(part) * size * AVERAGE_CHAR_WIDTH
+                if last_y is not None and abs(y - last_y) < 0.5 * min(size, last_size):
+                    # Cùng một dòng
+                    lines[-1] = self._join(lines[-1], part)
+                    box = self._extend(box, x, y, width, size)
+                    continue
+
+                gap = last_y - y if last_y is not None else None
+                same_block = (
+                    gap is not None
+                    and 0 < gap <= BLOCK_LINE_GAP * max(size, last_size)
+                    and abs(size - last_size) <= BLOCK_FONT_SIZE_DELTA
+                )
+                if not same_block and lines:
+                    blocks.append(self._make_block(lines, box))
+                    lines, box = [], None
+                lines.append(part)
+                box = self._extend(box, x, y, width, size)
+                last_y, last_size = y, size
+
+        if lines:
+            blocks.append(self._make_block(lines, box))
+        return blocks
+
+    def blocks_from_ocr_data(self, data: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+        """
+        Gộp các từ trong kết quả image_to_data (dạng dict) của tesseract thành khối theo (block_num, par_num)
+        Vị trí ở đây tính theo điểm ảnh, gốc ở góc trên bên trái; dùng ocr_blocks_to_page để đổi sang point
+        """
+        paragraphs: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        for i, word in enumerate(data.get("text", [])):
+            if not word or not word.strip():
+                continue
+            key = (data["block_num"][i], data["par_num"][i])
+            paragraph = paragraphs.setdefault(key, {"lines": {}, "bbox": None})
+            line = paragraph["lines"].setdefault(data["line_num"][i], [])
+            line.append(word.strip())
+            left, top = data["left"][i], data["top"][i]
+            right, bottom = left + data["width"][i], top + data["height"][i]
+            box = paragraph["bbox"]
+            paragraph["bbox"] = [left, top, right, bottom] if box is None else [
+                min(box[0], left), min(box[1], top), max(box[2], right), max(box[3], bottom)
+            ]
+
+        blocks = []
+        for paragraph in paragraphs.values():
+            lines = []
+            for line_num in sorted(paragraph["lines"]):
+                words = paragraph["lines"][line_num]
+                line = words[0]
+                for word in words[1:]:
+                    line = self._join(line, word)
+                lines.append(line)
+            content = lines[0]
+            for line in lines[1:]:
+                content = self._join(content, line)
+            blocks.append({"content": content, "bbox": paragraph["bbox"]})
+        return blocks
+
+    def ocr_blocks_to_page(self, blocks: List[Dict[str, Any]], dpi: int, page_height: float) -> List[Dict[str, Any]]:
+        """
+        Đổi vị trí các khối OCR từ điểm ảnh sang point trên trang PDF
+        """
+        scale = 72 / dpi if dpi else 1
+        result = []
+        for block in blocks:
+            left, top, right, bottom = block["bbox"]
+            result.append({
+                "content": block["content"],
+                "bbox": [round(left * scale, 1), round(page_height - bottom * scale, 1),
+                         round(right * scale, 1), round(page_height - top * scale, 1)]
+            })
+        return result
+
+    def _origin(self, cm: List[float], tm: List[float]) -> Tuple[float, float]:
+        """
+        Toạ độ gốc của text trong không gian trang: ma trận text nhân ma trận hiện hành
+        """
+        return tm[4] * cm[0] + tm[5] * cm[2] + cm[4], tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+
+    def _make_block(self, lines: List[str], box: List[float]) -> Dict[str, Any]:
+        content = lines[0]
+        for line in lines[1:]:
+            content = self._join(content, line)
+        return {"content": content, "bbox": [round(value, 1) for value in box]}
+
+    def _extend(self, box: Optional[List[float]], x: float, y: float, width: float, size: float) -> List[float]:
+        if box is None:
+            return [x, y, x + width, y + size]
+        return [min(box[0], x), min(box[1], y), max(box[2], x + width), max(box[3], y + size)]
+
+    def _join(self, left: str, right: str) -> str:
+        """
+        Nối hai đoạn text: thêm khoảng trắng trừ khi chỗ nối là chữ Nhật/Trung
+        """
+        if CJK_CHAR_PATTERN.match(left[-1:]) or CJK_CHAR_PATTERN.match(right[:1]):
+            return left + right
+        return f"{left} {right}"
@@ -0,0 +1,71 @@
+import re
+from typing import Optional
+
+# Nội dung thay thế khi không trích xuất được văn bản từ một trang PDF
+UNREADABLE_PAGE_TEXT = "Không thể trích xuất nội dung từ trang này"
+
+# Các đoạn không cần dịch thường rất ngắn, đoạn dài hơn chỉ kiểm tra nhanh
+MAX_CLASSIFIED_LENGTH = 200
+
+NUMBER_PATTERN = re.compile(
+    r"[+\-−]?[$€£¥₫]?\s*[\d０-９]+(?:[.,\s'][\d０-９]{3})*(?:[.,][\d０-９]+)?\s*(?:%|[$€£¥₫]|VND|USD|JPY)?",
+    re.IGNORECASE
+)
+DATE_PATTERN = re.compile(
+    r"(?:\d{4}[-/.]\d{1,2}[-/.]\d{1,2}|\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4})"
+    r"(?:[T\s]+\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+\-]\d{2}:?\d{2})?)?"
+)
+TIME_PATTERN = re.compile(r"\d{1,2}:\d{2}(?::\d{2})?(?:\s*[AaPp][Mm])?")
+URL_PATTERN = re.compile(r"(?:https?|ftp)://\S+|www\.\S+", re.IGNORECASE)
+EMAIL_PATTERN = re.compile(r"[\w.+\-]+@[\w\-]+(?:\.[\w\-]+)+")
+# Mã, ID: chữ in hoa/số không có khoảng trắng và có ít nhất một chữ số, ví dụ AB-1234, X12/3
+CODE_PATTERN = re.compile(r"(?=[^\s]*\d)[A-Z0-9#][A-Z0-9_\-./#:]*")
+# Biến giữ chỗ trong template: {0}, {{name}}, ${value}, %s, %(name)s và thẻ dạng <br/>, </p>, <a href="...">
+# (thuộc tính phải có giá trị, để câu văn trong ngoặc nhọn như "<Nhấn để tiếp tục>" vẫn được dịch)
+PLACEHOLDER_PATTERN = re.compile(
+    r"\{\{?[^{}\s]*\}?\}|\$\{[^}\s]*\}|%(?:\([^)]*\))?[sdifr]"
+    r"|</?[A-Za-z][\w:.-]*(?:\s+[\w:.-]+\s*=\s*(?:\"[^\"]*\"|'[^']*'|[^\s\"'<>]+))*\s*/?>"
+)
+# Chữ cái (không tính chữ số và dấu gạch dưới)
+LETTER_PATTERN = re.compile(r"[^\W\d_]")
+
+
+class SegmentClassifier:
+    """
+    Phân loại nhanh các đoạn không cần dịch (số, ngày tháng, mã, URL, biến giữ chỗ...)
+    để bỏ qua, không tốn lần gọi API nào
+    """
+
+    def __init__(self):
+        # Thứ tự kiểm tra: mẫu hay gặp và rẻ trước
+        self.patterns = [
+            ("number", NUMBER_PATTERN),
+            ("date", DATE_PATTERN),
+            ("date", TIME_PATTERN),
+            ("url", URL_PATTERN),
+            ("email", EMAIL_PATTERN),
+            ("placeholder", PLACEHOLDER_PATTERN),
+            ("code", CODE_PATTERN),
+        ]
+
+    def classify(self, text: str) -> Optional[str]:
+        """
+        Trả về loại của đoạn nếu không cần dịch, ngược lại trả về None
+        """
+        if not text or text.isspace():
+            return "empty"
+
+        text = text.strip()
+        if text == UNREADABLE_PAGE_TEXT:
+            return "unreadable"
+
+        if len(text) <= MAX_CLASSIFIED_LENGTH:
+            for category, pattern in self.patterns:
+                if pattern.fullmatch(text):
+                    return category
+
+        # Không có chữ cái nào: chỉ gồm số, ký hiệu, dấu câu
+        if not LETTER_PATTERN.search(text):
+            return "symbol"
+
+        return None
@@ -0,0 +1,76 @@
+import copy
+from typing import Any, Dict, List, Optional, Union
+
+
+class SegmentCodec:
+    """
+    Biểu diễn gọn nội dung tài liệu: mỗi đoạn (khối hoặc trang PDF, ô Excel, đoạn văn Word) có id là số thứ tự
+    của nó trong tài liệu, client chỉ gửi/nhận danh sách văn bản theo id thay vì cả cấu trúc kèm bản gốc
+    Bản gốc và cấu trúc (trang, địa chỉ ô, số đoạn) được giữ phía server trong kho tài liệu
+    """
+
+    def holders(self, file_type: str, content: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Các dict chứa đoạn văn bản ("content" và "translated_content") theo thứ tự id
+        """
+        if file_type == "pdf":
+            holders = []
+            for page in content:
+                holders.extend(page["blocks"] if page.get("blocks") else [page])
+            return holders
+        if file_type == "excel":
+            return [cell for sheet_data in content for cell in sheet_data["cells"]]
+        if file_type == "word":
+            return list(content)
+        raise ValueError("Loại file không hợp lệ")
+
+    def segments(self, file_type: str, content: List[Dict[str, Any]]) -> List[str]:
+        """
+        Văn bản gốc của các đoạn, vị trí trong danh sách là id
+        """
+        return [holder["content"] for holder in self.holders(file_type, content)]
+
+    def translations(self, file_type: str, translated: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """
+        Bản dịch của các đoạn theo id, None nếu đoạn giữ nguyên (số, ngày tháng, mã...)
+        """
+        result = []
+        for holder in self.holders(file_type, translated):
+            translated_content = holder.get("translated_content")
+            result.append(translated_content if translated_content != holder["content"] else None)
+        return result
+
+    def apply(self, file_type: str, base: List[Dict[str, Any]],
+              updates: Union[Dict[str, Optional[str]], List[Optional[str]]]) -> List[Dict[str, Any]]:
+        """
+        Tạo nội dung đã dịch mới từ base (nội dung đã trích xuất hoặc đã dịch) và các bản dịch theo id
+        updates là danh sách theo id (None là giữ nguyên) hoặc dict {id: bản dịch} chỉ gồm các đoạn thay đổi
+        base không bị sửa
+        """
+        result = copy.deepcopy(base)
+        holders = self.holders(file_type, result)
+        for holder in holders:
+            holder.setdefault("translated_content", holder["content"])
+
+        items = enumerate(updates) if isinstance(updates, list) else updates.items()
+        for segment_id, text in items:
+            if text is None:
+                continue
+            try:
+                index = int(segment_id)
+            except (TypeError, ValueError):
+                raise ValueError(f"Id đoạn không hợp lệ: {segment_id}")
+            if not 0 <= index < len(holders):
+                raise ValueError(f"Id đoạn không tồn tại: {segment_id}")
+            if not isinstance(text, str):
+                raise ValueError(f"Bản dịch của đoạn {segment_id} phải là chuỗi")
+            holders[index]["translated_content"] = text
+
+        # Trang PDF chia theo khối: nội dung trang là các khối ghép lại
+        if file_type == "pdf":
+            for page in result:
+                if page.get("blocks"):
+                    page["translated_content"] = "\n\n".join(
+                        block["translated_content"] for block in page["blocks"]
+                    )
+        return result
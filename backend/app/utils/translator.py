@@ -1,82 +1,443 @@
 from deep_translator import GoogleTranslator
-from typing import List, Dict, Union, Any
+from deep_translator.exceptions import RequestError, TooManyRequests, TranslationNotFound
+from deep_translator.validate import is_input_valid, request_failed
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+import requests
+from typing import List, Dict, Union, Any, Optional, Tuple, Callable, Iterator
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import hashlib
+import os
+import pathlib
+import re
+import threading
+import time
+import unicodedata
+
+from .cache import PersistentCache
+from .segment_classifier import SegmentClassifier, LETTER_PATTERN
+
+ROOT_DIR = pathlib.Path(__file__).parent.parent.parent.absolute()
+
+# Cấu hình bộ nhớ dịch (translation memory) lưu trên đĩa
+TRANSLATION_MEMORY_PATH = os.environ.get(
+    "TRANSLATION_MEMORY_PATH", str(ROOT_DIR / "cache" / "translation_memory.sqlite3")
+)
+TRANSLATION_MEMORY_MAX_ENTRIES = int(os.environ.get("TRANSLATION_MEMORY_MAX_ENTRIES", "500000"))
+TRANSLATION_MEMORY_TTL_DAYS = int(os.environ.get("TRANSLATION_MEMORY_TTL_DAYS", "90"))
+
+# Giới hạn ký tự cho mỗi lần gọi GoogleTranslator (~5000 ký tự)
+MAX_REQUEST_CHARS = 4800
+
+# Số yêu cầu dịch được gửi song song tối đa (dùng chung cho mọi request)
+TRANSLATE_CONCURRENCY = int(os.environ.get("TRANSLATE_CONCURRENCY", "4"))
+
+# Backend dịch: "google" (mặc định) hoặc "offline" (giả lập cục bộ, không cần mạng)
+TRANSLATOR_BACKEND = os.environ.get("TRANSLATOR_BACKEND", "google")
+OFFLINE_TRANSLATOR_LATENCY = float(os.environ.get("OFFLINE_TRANSLATOR_LATENCY", "0"))
+
+# Thời gian chờ tối đa (giây) cho mỗi yêu cầu HTTP tới Google
+GOOGLE_REQUEST_TIMEOUT = 30
+
+# Số khối (trang, sheet, nhóm đoạn văn) được dịch trước song song khi trả kết quả dạng stream
+STREAM_LOOKAHEAD = int(os.environ.get("TRANSLATE_STREAM_LOOKAHEAD", "4"))
+
+# Số đoạn tối đa gộp trong một lần gọi API, để khi tách lỗi thì chỉ phải dịch lại ít đoạn
+MAX_SEGMENTS_PER_BATCH = 100
+
+# Dấu phân cách giữa các đoạn khi gộp nhiều đoạn vào một lần gọi API.
+# Ký hiệu nằm trên một dòng riêng nên được giữ nguyên sau khi dịch.
+SEGMENT_SEPARATOR = "\n[#]\n"
+SEGMENT_SEPARATOR_PATTERN = re.compile(r"\s*\[\s*#\s*\]\s*")
+
+# Ký tự tiếng Nhật: dấu câu CJK, hiragana, katakana và kanji
+JAPANESE_CHAR_PATTERN = re.compile(r"[\u3001-\u30fe\u4e01-\u9ffe]")
+
+# Số ký tự tối đa lấy mẫu khi phát hiện ngôn ngữ nguồn cho cả tài liệu
+DETECTION_SAMPLE_CHARS = 20000
+# Tỷ lệ ký tự tiếng Nhật trên tổng số chữ cái để coi tài liệu là tiếng Nhật
+JAPANESE_RATIO_THRESHOLD = 0.1
+
+# Khoảng trắng trên cùng một dòng được gộp lại khi tạo key cho bộ nhớ dịch
+INLINE_WHITESPACE_PATTERN = re.compile(r"[ \t\u3000]+")
+
+
+class TranslationCancelled(Exception):
+    """
+    Việc dịch bị huỷ giữa chừng
+    """
+
+
+class ProgressTracker:
+    """
+    Theo dõi tiến độ dịch (tính theo số đoạn duy nhất) và cho phép huỷ giữa chừng
+    callback(done, total) được gọi mỗi khi tiến độ thay đổi
+    """
+    def __init__(self, callback: Optional[Callable[[int, int], None]] = None,
+                 cancel_event: Optional[threading.Event] = None):
+        self.callback = callback
+        self.cancel_event = cancel_event
+        self.total = 0
+        self.done = 0.0
+        self._lock = threading.Lock()
+    
+    def start(self, total: int) -> None:
+        with self._lock:
+            self.total = total
+            self.done = 0.0
+        self._notify()
+    
+    def advance(self, amount: float = 1) -> None:
+        with self._lock:
+            self.done = min(self.total, self.done + amount)
+        self._notify()
+    
+    def check(self) -> None:
+        """
+        Ném TranslationCancelled nếu đã có yêu cầu huỷ
+        """
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise TranslationCancelled()
+    
+    def _notify(self) -> None:
+        if self.callback is not None:
+            self.callback(int(self.done), self.total)
+
+
+class TranslationBackend:
+    """
+    Giao diện chung cho các dịch vụ dịch
+    """
+    name = "base"
+    # Bản dịch có được lưu vào bộ nhớ dịch trên đĩa (dùng lại giữa các lần chạy) hay không
+    persistent_memory = True
+    
+    def translate(self, text: str, source: str, target: str) -> str:
+        raise NotImplementedError
+
+
+class _PooledGoogleTranslator(GoogleTranslator):
+    """
+    GoogleTranslator gửi yêu cầu qua một requests.Session dùng chung (keep-alive, connection pool)
+    Không sửa trạng thái của đối tượng khi dịch nên có thể dùng đồng thời từ nhiều luồng
+    """
+    def __init__(self, session: requests.Session, source: str, target: str):
+        super().__init__(source=source, target=target)
+        self.session = session
+    
+    def translate(self, text: str, **kwargs) -> str:
+        # Sao theo GoogleTranslator.translate của deep-translator 1.11.4 (dùng thuộc tính nội bộ _url_params,
+        # _base_url, _element_tag...), vì vậy requirements.txt cố định đúng phiên bản này
+        # is_input_valid báo lỗi (NotValidPayload, NotValidLength) chứ không trả về False
+        is_input_valid(text, max_chars=5000)
+        text = text.strip()
+        if self._same_source_target() or not text:
+            return text
+        
+        params = dict(self._url_params, tl=self._target, sl=self._source)
+        params[self.payload_key] = text
+        translated = self._request(params, text)
+        # Như bản gốc: Google trả lại nguyên văn khi có tham số hl thì thử lại một lần không có hl
+        if translated == text and "hl" in params and any(ch.isalnum() for ch in text):
+            del params["hl"]
+            translated = self._request(params, text)
+        return translated
+    
+    def _request(self, params: Dict[str, str], text: str) -> str:
+        response = self.session.get(
+            self._base_url, params=params, proxies=self.proxies, timeout=GOOGLE_REQUEST_TIMEOUT
+        )
+        if response.status_code == 429:
+            raise TooManyRequests()
+        if request_failed(status_code=response.status_code):
+            raise RequestError()
+        
+        soup = BeautifulSoup(response.text, "html.parser")
+        element = soup.find(self._element_tag, self._element_query) or \
+                  soup.find(self._element_tag, self._alt_element_query)
+        if not element:
+            raise TranslationNotFound(text)
+        return element.get_text(strip=True)
+
+
+class GoogleBackend(TranslationBackend):
+    """
+    Backend Google Translate với một client lâu dài cho mỗi cặp ngôn ngữ,
+    tất cả dùng chung một session HTTP có connection pool
+    """
+    name = "google"
+    
+    def __init__(self, pool_size: int = TRANSLATE_CONCURRENCY):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._clients: Dict[Tuple[str, str], _PooledGoogleTranslator] = {}
+        self._lock = threading.Lock()
+    
+    def translate(self, text: str, source: str, target: str) -> str:
+        return self._get_client(source, target).translate(text)
+    
+    def _get_client(self, source: str, target: str) -> _PooledGoogleTranslator:
+        client = self._clients.get((source, target))
+        if client is None:
+            with self._lock:
+                client = self._clients.get((source, target))
+                if client is None:
+                    client = _PooledGoogleTranslator(self.session, source, target)
+                    self._clients[(source, target)] = client
+        return client
+
+
+class OfflineBackend(TranslationBackend):
+    """
+    Backend giả lập chạy cục bộ, không cần mạng, dùng để benchmark và kiểm thử pipeline
+    Trả lại văn bản gốc (có thể thêm tiền tố cho từng dòng) sau một độ trễ cấu hình được
+    Kết quả không phải bản dịch thật nên chỉ được nhớ trong bộ nhớ trong, không ghi vào bộ nhớ dịch trên đĩa
+    """
+    name = "offline"
+    persistent_memory = False
+    
+    def __init__(self, latency: float = OFFLINE_TRANSLATOR_LATENCY, prefix: str = ""):
+        self.latency = latency
+        self.prefix = prefix
+        self.request_count = 0
+        self.char_count = 0
+        self._lock = threading.Lock()
+    
+    def translate(self, text: str, source: str, target: str) -> str:
+        if self.latency > 0:
+            time.sleep(self.latency)
+        with self._lock:
+            self.request_count += 1
+            self.char_count += len(text)
+        
+        text = text.strip()
+        if not self.prefix:
+            return text
+        # Không thêm tiền tố cho dòng phân cách giữa các đoạn trong batch
+        return "\n".join(
+            self.prefix + line if line.strip() and not SEGMENT_SEPARATOR_PATTERN.fullmatch(line) else line
+            for line in text.split("\n")
+        )
+
+
+def create_backend(name: str = TRANSLATOR_BACKEND, pool_size: int = TRANSLATE_CONCURRENCY) -> TranslationBackend:
+    """
+    Tạo backend dịch theo tên cấu hình
+    """
+    if name == "offline":
+        return OfflineBackend()
+    if name == "google":
+        return GoogleBackend(pool_size=pool_size)
+    raise ValueError(f"Backend dịch không hợp lệ: {name}")
+
 
 class Translator:
-    def __init__(self):
-        self.translator = GoogleTranslator(source='auto', target='vi')
+    def __init__(self, max_workers: Optional[int] = None, backend: Optional[TranslationBackend] = None):
+        self.target = 'vi'
+        self.max_workers = max_workers if max_workers is not None else TRANSLATE_CONCURRENCY
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._local = threading.local()
+        self.backend = backend if backend is not None else create_backend(pool_size=self.max_workers)
+        self.classifier = SegmentClassifier()
+        self.memory = PersistentCache(
+            TRANSLATION_MEMORY_PATH if self.backend.persistent_memory else ":memory:",
+            table="translations",
+            max_entries=TRANSLATION_MEMORY_MAX_ENTRIES,
+            ttl_seconds=TRANSLATION_MEMORY_TTL_DAYS * 24 * 3600
+        )
     
-    def translate_text(self, text: str) -> str:
+    def translate_text(self, text: str, source: Optional[str] = None) -> str:
         """
         Dịch văn bản đơn từ bất kỳ ngôn ngữ nào sang tiếng Việt
         """
         if not text or text.isspace():
             return text
         
-        try:
-            # DEBUG
-            print(f"DEBUG TRANSLATE: Văn bản gốc ({len(text)} ký tự): {text[:100]}...")
-            
-            # Phát hiện ngôn ngữ tiếng Nhật
-            has_japanese = any(ord(c) > 0x3000 and ord(c) < 0x30FF for c in text) or \
-                           any(ord(c) > 0x4E00 and ord(c) < 0x9FFF for c in text)
+        # DEBUG
+        print(f"DEBUG TRANSLATE: Văn bản gốc ({len(text)} ký tự): {text[:100]}...")
+        result = self.translate_texts([text], source)[0]
+        print(f"DEBUG TRANSLATE: Văn bản đã dịch ({len(result)} ký tự): {result[:100]}...")
+        return result
+    
+    def translate_texts(self, texts: List[str], source: Optional[str] = None,
+                        progress: Optional[ProgressTracker] = None) -> List[str]:
+        """
+        Dịch nhiều văn bản (có thể dài) cùng lúc
+        Các đoạn nhỏ của mọi văn bản được dịch song song, kết quả được ghép lại theo đúng thứ tự
+        Văn bản nào dịch lỗi thì giữ nguyên văn bản gốc
+        Nếu không truyền source thì ngôn ngữ nguồn được xác định riêng cho từng văn bản
+        """
+        results = list(texts)
+        memory_keys: Dict[int, str] = {}
+        jobs: List[Tuple[int, str, str, float]] = []  # (index văn bản, đoạn nhỏ, ngôn ngữ nguồn, tỷ trọng)
+        
+        for i, text in enumerate(texts):
+            if not text or text.isspace():
+                continue
+            text_source = source or self._detect_source(text)
             
-            if has_japanese:
-                print("DEBUG TRANSLATE: Phát hiện văn bản tiếng Nhật, thiết lập nguồn là 'ja'")
-                # Thiết lập nguồn cụ thể là tiếng Nhật để dịch tốt hơn
-                self.translator = GoogleTranslator(source='ja', target='vi')
-            else:
-                # Để tự động phát hiện ngôn ngữ khác
-                self.translator = GoogleTranslator(source='auto', target='vi')
+            # Tra bộ nhớ dịch trước khi gọi API
+            memory_key = self._memory_key(text, text_source)
+            cached = self.memory.get(memory_key)
+            if cached is not None:
+                results[i] = cached
+                if progress is not None:
+                    progress.advance()
+                continue
             
             # Giới hạn độ dài văn bản để tránh lỗi từ API
-            chunks = self._split_text(text, 4800)  # GoogleTranslator limit ~5000 chars
-            translated_chunks = [self.translator.translate(chunk) for chunk in chunks if chunk]
-            result = ' '.join(translated_chunks)
-            
-            print(f"DEBUG TRANSLATE: Văn bản đã dịch ({len(result)} ký tự): {result[:100]}...")
-            return result
-        except Exception as e:
-            print(f"Lỗi khi dịch văn bản: {str(e)}")
-            return text
+            memory_keys[i] = memory_key
+            chunks = [chunk for chunk in self._split_text(text, MAX_REQUEST_CHARS) if chunk]
+            jobs.extend((i, chunk, text_source, 1 / len(chunks)) for chunk in chunks)
+        
+        translated_chunks = self._run_concurrently(
+            lambda job: self._translate_chunk(job[1], job[2]), jobs,
+            progress, [job[3] for job in jobs]
+        )
+        
+        # Ghép các đoạn đã dịch về từng văn bản theo thứ tự ban đầu
+        grouped: Dict[int, List[Optional[str]]] = {}
+        for (i, _, _, _), translated in zip(jobs, translated_chunks):
+            grouped.setdefault(i, []).append(translated)
+        for i, parts in grouped.items():
+            if any(part is None for part in parts):
+                continue
+            result = ' '.join(parts)
+            results[i] = result
+            if result:
+                self.memory.set(memory_keys[i], result)
+        
+        return results
+    
+    def translate_batch(self, texts: List[str], source: Optional[str] = None,
+                        progress: Optional[ProgressTracker] = None) -> List[str]:
+        """
+        Dịch nhiều đoạn văn bản ngắn bằng cách gộp chúng vào ít lần gọi API nhất có thể
+        Kết quả trả về theo đúng thứ tự của danh sách đầu vào
+        """
+        results = list(texts)
+        
+        # Nhóm các đoạn theo ngôn ngữ nguồn, đoạn quá dài hoặc chứa dấu phân cách thì dịch riêng
+        groups: Dict[str, List[int]] = {}
+        long_indexes: List[int] = []
+        cache_hits = 0
+        for i, text in enumerate(texts):
+            if not text or text.isspace():
+                continue
+            if len(text) > MAX_REQUEST_CHARS or SEGMENT_SEPARATOR_PATTERN.search(text):
+                long_indexes.append(i)
+                continue
+            text_source = source or self._detect_source(text)
+            cached = self.memory.get(self._memory_key(text, text_source))
+            if cached is not None:
+                results[i] = cached
+                cache_hits += 1
+                continue
+            groups.setdefault(text_source, []).append(i)
+        if progress is not None and cache_hits:
+            progress.advance(cache_hits)
+        
+        if long_indexes:
+            translated_long = self.translate_texts([texts[i] for i in long_indexes], source, progress)
+            for i, translated in zip(long_indexes, translated_long):
+                results[i] = translated
+        
+        # Các batch được gửi song song, kết quả gán lại theo index của từng đoạn
+        batches = [(source, batch) for source, indexes in groups.items()
+                   for batch in self._pack_segments(indexes, texts)]
+        translated_batches = self._run_concurrently(
+            lambda item: self._translate_packed([texts[i] for i in item[1]], item[0]), batches,
+            progress, [len(batch) for _, batch in batches]
+        )
+        for (_, batch), translated in zip(batches, translated_batches):
+            for i, translated_segment in zip(batch, translated):
+                results[i] = translated_segment
+        
+        print(f"DEBUG TRANSLATE_BATCH: {len(texts)} đoạn, {cache_hits} lấy từ bộ nhớ dịch, "
+              f"{len(batches)} lần gọi API theo batch")
+        return results
     
-    def translate_pdf_content(self, pdf_content: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    def translate_pdf_content(self, pdf_content: List[Dict[str, str]],
+                              stats: Optional[Dict[str, Any]] = None,
+                              progress: Optional[ProgressTracker] = None,
+                              source: Optional[str] = None) -> List[Dict[str, str]]:
         """
         Dịch nội dung từ file PDF
+        Các trang được dịch song song; trang đã chia theo khối ("blocks") được dịch theo từng khối
         """
         print(f"DEBUG TRANSLATE_PDF: Nhận được {len(pdf_content)} trang để dịch")
         
-        result = []
-        for i, page in enumerate(pdf_content):
-            print(f"DEBUG TRANSLATE_PDF: Dịch trang {i+1}/{len(pdf_content)}")
-            
+        pages = []
+        for page in pdf_content:
             if "content" not in page:
                 print(f"DEBUG TRANSLATE_PDF: Không tìm thấy 'content' trong dữ liệu trang. Keys: {page.keys()}")
                 continue
-            
-            translated_content = self.translate_text(page["content"])
-            result.append({
+            pages.append(page)
+        
+        # Mỗi khối là một đoạn riêng để dùng lại bộ nhớ dịch và gộp trùng ở mức khối
+        segments = []
+        for page in pages:
+            if page.get("blocks"):
+                segments.extend(block["content"] for block in page["blocks"])
+            else:
+                segments.append(page["content"])
+        has_blocks = any(page.get("blocks") for page in pages)
+        translations = iter(self._translate_document(
+            segments, self.translate_batch if has_blocks else self.translate_texts, stats,
+            progress=progress, source=source
+        ))
+        
+        result = []
+        for page in pages:
+            translated_page = {
                 "page": page["page"],
-                "content": page["content"],
-                "translated_content": translated_content
-            })
+                "content": page["content"]
+            }
+            if page.get("blocks"):
+                translated_page["blocks"] = [
+                    {**block, "translated_content": next(translations)} for block in page["blocks"]
+                ]
+                translated_page["translated_content"] = "\n\n".join(
+                    block["translated_content"] for block in translated_page["blocks"]
+                )
+            else:
+                translated_page["translated_content"] = next(translations)
+            result.append(translated_page)
         
         print(f"DEBUG TRANSLATE_PDF: Hoàn thành dịch {len(result)}/{len(pdf_content)} trang")
         return result
     
-    def translate_excel_content(self, excel_content: List[Dict[str, List[Dict[str, str]]]]) -> List[Dict[str, List[Dict[str, str]]]]:
+    def translate_excel_content(self, excel_content: List[Dict[str, List[Dict[str, str]]]],
+                                stats: Optional[Dict[str, Any]] = None,
+                                progress: Optional[ProgressTracker] = None,
+                                source: Optional[str] = None) -> List[Dict[str, List[Dict[str, str]]]]:
         """
         Dịch nội dung từ file Excel
         """
+        # Gộp tất cả các ô của mọi sheet để dịch theo batch
+        cells = [cell for sheet_data in excel_content for cell in sheet_data["cells"]]
+        translations = iter(self._translate_document(
+            [cell["content"] for cell in cells], self.translate_batch, stats,
+            categories=[cell.get("category") for cell in cells], progress=progress, source=source
+        ))
+        
         result = []
         for sheet_data in excel_content:
             translated_cells = []
             for cell in sheet_data["cells"]:
-                translated_content = self.translate_text(cell["content"])
-                translated_cells.append({
+                translated_cell = {
                     "address": cell["address"],
                     "content": cell["content"],
-                    "translated_content": translated_content
-                })
+                    "translated_content": next(translations)
+                }
+                if cell.get("category"):
+                    translated_cell["category"] = cell["category"]
+                translated_cells.append(translated_cell)
             
             result.append({
                 "sheet_name": sheet_data["sheet_name"],
@@ -85,21 +446,248 @@ class Translator:
         
         return result
     
-    def translate_word_content(self, word_content: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    def translate_word_content(self, word_content: List[Dict[str, str]],
+                               stats: Optional[Dict[str, Any]] = None,
+                               progress: Optional[ProgressTracker] = None,
+                               source: Optional[str] = None) -> List[Dict[str, str]]:
         """
         Dịch nội dung từ file Word
         """
+        translations = self._translate_document(
+            [paragraph["content"] for paragraph in word_content], self.translate_batch, stats,
+            progress=progress, source=source
+        )
+        
         result = []
-        for paragraph in word_content:
-            translated_content = self.translate_text(paragraph["content"])
-            result.append({
+        for paragraph, translated_content in zip(word_content, translations):
+            translated_paragraph = {
                 "paragraph": paragraph["paragraph"],
                 "content": paragraph["content"],
                 "translated_content": translated_content
-            })
+            }
+            # Đoạn trong bảng, header, footer có thêm tên phần chứa nó
+            if paragraph.get("part"):
+                translated_paragraph["part"] = paragraph["part"]
+            result.append(translated_paragraph)
         
         return result
     
+    def _translate_document(self, contents: List[str], translate: Callable[..., List[str]],
+                            stats: Optional[Dict[str, Any]] = None,
+                            categories: Optional[List[Optional[str]]] = None,
+                            progress: Optional[ProgressTracker] = None,
+                            source: Optional[str] = None) -> List[str]:
+        """
+        Dịch toàn bộ các đoạn của một tài liệu:
+        bỏ qua các đoạn không cần dịch, phát hiện ngôn ngữ nguồn một lần,
+        gộp các đoạn trùng nhau, dịch rồi trả kết quả về đúng vị trí
+        categories (nếu có) là loại đã biết trước của từng đoạn, ví dụ từ kiểu dữ liệu của ô Excel
+        source (nếu có) là ngôn ngữ nguồn đã xác định trước cho cả tài liệu
+        Thống kê (số đoạn, số đoạn duy nhất, tỷ lệ trùng lặp, số đoạn bỏ qua theo loại) được ghi vào stats nếu có
+        """
+        # Các đoạn như số, ngày tháng, mã, URL được giữ nguyên
+        skipped: Dict[str, int] = {}
+        translatable: List[int] = []
+        for i, text in enumerate(contents):
+            category = (categories[i] if categories else None) or self.classifier.classify(text)
+            if category:
+                skipped[category] = skipped.get(category, 0) + 1
+            else:
+                translatable.append(i)
+        
+        if source is None:
+            source = self.detect_source_language([contents[i] for i in translatable])
+        
+        # Gộp các đoạn giống nhau sau khi chuẩn hoá, mỗi đoạn duy nhất chỉ dịch một lần
+        unique_indexes: Dict[str, int] = {}
+        unique_texts: List[str] = []
+        positions: List[int] = []
+        for text in (contents[i] for i in translatable):
+            key = self._normalize_text(text)
+            index = unique_indexes.get(key)
+            if index is None:
+                index = len(unique_texts)
+                unique_indexes[key] = index
+                unique_texts.append(text)
+            positions.append(index)
+        
+        if progress is not None:
+            progress.start(len(unique_texts))
+        translated = translate(unique_texts, source, progress)
+        
+        dedup_ratio = round(len(translatable) / len(unique_texts), 2) if unique_texts else 1.0
+        print(f"DEBUG TRANSLATE: {len(contents)} đoạn, bỏ qua {len(contents) - len(translatable)} {skipped}, "
+              f"{len(unique_texts)} đoạn duy nhất (x{dedup_ratio})")
+        if stats is not None:
+            stats.update({
+                "source_language": source,
+                "segments": len(contents),
+                "translatable_segments": len(translatable),
+                "unique_segments": len(unique_texts),
+                "dedup_ratio": dedup_ratio,
+                "skipped": skipped
+            })
+        
+        results = list(contents)
+        for i, index in zip(translatable, positions):
+            results[i] = translated[index]
+        return results
+    
+    def iter_translated_blocks(self, blocks: List[Any], translate_block: Callable[[Any], Any],
+                               cancel_event: Optional[threading.Event] = None) -> Iterator[Any]:
+        """
+        Dịch từng khối (trang, sheet, nhóm đoạn văn) và trả về ngay khi khối đó xong, theo đúng thứ tự
+        Tối đa STREAM_LOOKAHEAD khối được gửi đi dịch trước; khi dừng giữa chừng thì huỷ các khối còn lại
+        """
+        if not blocks:
+            return
+        
+        executor = ThreadPoolExecutor(max_workers=STREAM_LOOKAHEAD, thread_name_prefix="translate-stream")
+        pending = iter(blocks)
+        futures = deque()
+        try:
+            # Chỉ gửi khối tiếp theo khi một khối đã được trả về, để không giữ cả tài liệu trong hàng đợi
+            for block in islice(pending, STREAM_LOOKAHEAD):
+                futures.append(executor.submit(translate_block, block))
+            while futures:
+                result = futures.popleft().result()
+                for block in islice(pending, 1):
+                    futures.append(executor.submit(translate_block, block))
+                yield result
+        finally:
+            if cancel_event is not None:
+                cancel_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def detect_source_language(self, texts: List[str]) -> str:
+        """
+        Xác định ngôn ngữ nguồn một lần cho cả tài liệu từ một mẫu văn bản rải đều trong tài liệu
+        Trả về 'ja' nếu tỷ lệ ký tự tiếng Nhật đủ lớn, ngược lại 'auto' để API tự phát hiện
+        """
+        texts = [text for text in texts if text]
+        if not texts:
+            return 'auto'
+        
+        # Lấy mẫu đều từ đầu đến cuối tài liệu cho tới khi đủ DETECTION_SAMPLE_CHARS ký tự
+        step = max(1, sum(len(text) for text in texts) // DETECTION_SAMPLE_CHARS)
+        sample = "\n".join(texts[::step])[:DETECTION_SAMPLE_CHARS]
+        
+        japanese_count = len(JAPANESE_CHAR_PATTERN.findall(sample))
+        letter_count = len(LETTER_PATTERN.findall(sample))
+        source = 'ja' if japanese_count and japanese_count >= letter_count * JAPANESE_RATIO_THRESHOLD else 'auto'
+        print(f"DEBUG TRANSLATE: Ngôn ngữ nguồn của tài liệu: {source} "
+              f"({japanese_count}/{letter_count} ký tự tiếng Nhật trong mẫu)")
+        return source
+    
+    def _detect_source(self, text: str) -> str:
+        """
+        Xác định ngôn ngữ nguồn cho một văn bản đơn lẻ: 'ja' nếu có ký tự tiếng Nhật
+        """
+        return 'ja' if JAPANESE_CHAR_PATTERN.search(text) else 'auto'
+    
+    def _normalize_text(self, text: str) -> str:
+        """
+        Chuẩn hoá văn bản để so sánh: bỏ khoảng trắng đầu/cuối, gộp khoảng trắng trong dòng, chuẩn NFC
+        """
+        return unicodedata.normalize("NFC", INLINE_WHITESPACE_PATTERN.sub(" ", text.strip()))
+    
+    def _memory_key(self, text: str, source: str) -> str:
+        """
+        Tạo key cho bộ nhớ dịch từ backend, ngôn ngữ nguồn, ngôn ngữ đích và hash của văn bản đã chuẩn hoá
+        Bản dịch của backend này không bao giờ được dùng cho backend khác
+        """
+        digest = hashlib.sha256(self._normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{self.backend.name}:{source}:{self.target}:{digest}"
+    
+    def _translate_request(self, text: str, source: str) -> str:
+        """
+        Gửi một yêu cầu dịch tới backend
+        """
+        return self.backend.translate(text, source, self.target)
+    
+    def _translate_chunk(self, text: str, source: str) -> Optional[str]:
+        """
+        Dịch một đoạn nhỏ, trả về None nếu có lỗi
+        """
+        try:
+            return self._translate_request(text, source)
+        except Exception as e:
+            print(f"Lỗi khi dịch văn bản: {str(e)}")
+            return None
+    
+    def _run_concurrently(self, func: Callable[[Any], Any], items: List[Any],
+                          progress: Optional[ProgressTracker] = None,
+                          weights: Optional[List[float]] = None) -> List[Any]:
+        """
+        Chạy func trên từng phần tử bằng thread pool dùng chung, giữ nguyên thứ tự kết quả
+        Nếu đang ở trong một worker của pool thì chạy tuần tự để tránh deadlock khi lồng nhau
+        Với progress: kiểm tra huỷ trước mỗi phần tử và cộng tiến độ (theo weights) sau khi xong
+        """
+        def run(index):
+            if progress is not None:
+                progress.check()
+            result = func(items[index])
+            if progress is not None:
+                progress.advance(weights[index] if weights else 1)
+            return result
+        
+        if len(items) <= 1 or self.max_workers <= 1 or getattr(self._local, "in_worker", False):
+            return [run(index) for index in range(len(items))]
+        
+        def run_in_worker(index):
+            self._local.in_worker = True
+            try:
+                return run(index)
+            finally:
+                self._local.in_worker = False
+        
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="translate")
+        return list(self._executor.map(run_in_worker, range(len(items))))
+    
+    def _pack_segments(self, indexes: List[int], texts: List[str]) -> List[List[int]]:
+        """
+        Gộp các đoạn (theo index) thành các batch có tổng độ dài không vượt quá MAX_REQUEST_CHARS
+        """
+        batches = []
+        current: List[int] = []
+        current_length = 0
+        for i in indexes:
+            added_length = len(texts[i]) + (len(SEGMENT_SEPARATOR) if current else 0)
+            if current and (current_length + added_length > MAX_REQUEST_CHARS
+                            or len(current) >= MAX_SEGMENTS_PER_BATCH):
+                batches.append(current)
+                current, current_length = [], 0
+                added_length = len(texts[i])
+            current.append(i)
+            current_length += added_length
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _translate_packed(self, segments: List[str], source: str) -> List[str]:
+        """
+        Dịch một batch trong một lần gọi API rồi tách kết quả về từng đoạn
+        Nếu số đoạn sau khi tách không khớp thì dịch lại từng đoạn riêng lẻ
+        """
+        if len(segments) == 1:
+            return self.translate_texts(segments, source)
+        
+        try:
+            translated = self._translate_request(SEGMENT_SEPARATOR.join(segments), source) or ""
+            parts = [part.strip() for part in SEGMENT_SEPARATOR_PATTERN.split(translated.strip())]
+            if len(parts) == len(segments):
+                for segment, part in zip(segments, parts):
+                    if part:
+                        self.memory.set(self._memory_key(segment, source), part)
+                return parts
+            print(f"DEBUG TRANSLATE_BATCH: Tách được {len(parts)}/{len(segments)} đoạn, dịch lại từng đoạn")
+        except Exception as e:
+            print(f"Lỗi khi dịch batch: {str(e)}, dịch lại từng đoạn")
+        
+        return self.translate_texts(segments, source)
+    
     def _split_text(self, text: str, max_length: int) -> List[str]:
         """
         Chia văn bản thành các đoạn nhỏ hơn max_length
@@ -1,68 +1,246 @@
-import docx
 import io
-from typing import List, Dict
+import re
+import shutil
+import zipfile
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+from xml.parsers import expat
+from xml.sax.saxutils import escape
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+W_BODY = f"{W_NS} body"
+W_P = f"{W_NS} p"
+W_R = f"{W_NS} r"
+W_T = f"{W_NS} t"
+# Các phần tử nội dung của một run và ký tự tương ứng (giống Run.text của python-docx)
+RUN_CONTENT = {W_T: "", f"{W_NS} tab": "\t", f"{W_NS} br": "\n", f"{W_NS} cr": "\n"}
+# Loại nội dung của các phần có văn bản: tài liệu chính, header, footer
+MAIN_CONTENT_TYPE = re.compile(r"wordprocessingml\.(document|template)(\.macroEnabled)?\.main\+xml$")
+HEADER_FOOTER_CONTENT_TYPE = re.compile(r"wordprocessingml\.(header|footer)\+xml$")
+CONTENT_TYPES_NS = "{http://schemas.openxmlformats.org/package/2006/content-types}"
+# Kích thước mỗi lần đọc khi duyệt XML
+XML_CHUNK_SIZE = 64 * 1024
+TAG_PREFIX_PATTERN = re.compile(rb"<([\w.-]+:)?")
+NEWLINE_PATTERN = re.compile(r"(\t|\r\n|\n|\r)")
+
 
 class WordHandler:
     def __init__(self):
         pass
-    
-    def extract_text_from_docx(self, file_content: bytes) -> List[Dict[str, str]]:
+
+    def extract_text_from_docx(self, file_content: bytes) -> List[Dict[str, Any]]:
         """
         Trích xuất văn bản từ file Word
         Trả về danh sách các đoạn, mỗi đoạn là một dictionary với key là số đoạn và value là nội dung
+        Đoạn văn trực tiếp trong thân tài liệu đánh số như doc.paragraphs của python-docx (từ 1);
+        đoạn trong bảng, text box, header, footer có thêm "part" (tên phần trong file) và đánh số riêng theo phần đó
         """
         try:
-            doc = docx.Document(io.BytesIO(file_content))
             result = []
-            
-            # Xử lý từng đoạn văn
-            for i, paragraph in enumerate(doc.paragraphs):
-                if paragraph.text and not paragraph.text.isspace():
-                    result.append({
-                        "paragraph": i + 1,
-                        "content": paragraph.text
-                    })
-            
+            with zipfile.ZipFile(io.BytesIO(file_content)) as archive:
+                for part_name, main in self._text_parts(archive):
+                    with archive.open(part_name) as source:
+                        result.extend(self._process_part(source, part_name, main))
             return result
         except Exception as e:
             raise Exception(f"Lỗi khi xử lý file Word: {str(e)}")
-    
+
     def create_translated_docx(self, original_file: bytes, translated_paragraphs: List[Dict[str, str]]) -> bytes:
         """
         Tạo file Word với nội dung đã được dịch
         """
+        output = io.BytesIO()
+        self.write_translated_docx(original_file, translated_paragraphs, output)
+        return output.getvalue()
+
+    def write_translated_docx(self, original_file: bytes, translated_paragraphs: List[Dict[str, str]],
+                              output: BinaryIO) -> None:
+        """
+        Ghi file Word đã dịch vào output (file hoặc buffer), không giữ thêm bản sao trong bộ nhớ
+        Các phần có đoạn đã dịch được duyệt và ghi lại dần theo từng khối, các phần khác được chép nguyên nội dung
+        """
         try:
-            # Đọc file Word gốc
-            doc = docx.Document(io.BytesIO(original_file))
-            
-            # Tạo mapping từ paragraph index đến translated content
-            translations = {item["paragraph"]: item.get("translated_content", "") 
-                          for item in translated_paragraphs 
-                          if "translated_content" in item}
-            
-            # Cập nhật nội dung đã dịch
-            for i, paragraph in enumerate(doc.paragraphs):
-                if i + 1 in translations and translations[i + 1]:
-                    # Giữ lại định dạng văn bản gốc
-                    paragraph_format = paragraph.paragraph_format
-                    runs_formats = [(run.bold, run.italic, run.underline, run.font.size) for run in paragraph.runs]
-                    
-                    # Cập nhật nội dung
-                    paragraph.clear()
-                    paragraph.add_run(translations[i + 1])
-                    
-                    # Áp dụng lại định dạng
-                    if paragraph.runs and runs_formats:
-                        for j, formats in enumerate(runs_formats):
-                            if j < len(paragraph.runs):
-                                run = paragraph.runs[j]
-                                run.bold, run.italic, run.underline, run.font.size = formats
-            
-            # Lưu tài liệu vào buffer
-            output = io.BytesIO()
-            doc.save(output)
-            output.seek(0)
-            
-            return output.getvalue()
+            # Tạo mapping từ (phần, số đoạn) đến translated content, bỏ qua đoạn không đổi
+            translations: Dict[Tuple[Optional[str], int], str] = {}
+            for item in translated_paragraphs:
+                translated_content = item.get("translated_content", "")
+                if translated_content and translated_content != item.get("content"):
+                    translations[(item.get("part"), item["paragraph"])] = translated_content
+
+            with zipfile.ZipFile(io.BytesIO(original_file)) as archive:
+                parts = dict(self._text_parts(archive))
+                translated_parts = {part for part, _ in translations if part is not None}
+                if any(key[0] is None for key in translations):
+                    translated_parts.update(part for part, main in parts.items() if main)
+
+                with zipfile.ZipFile(output, "w") as result:
+                    for info in archive.infolist():
+                        copied = zipfile.ZipInfo(info.filename, info.date_time)
+                        copied.compress_type = info.compress_type
+                        copied.external_attr = info.external_attr
+                        with archive.open(info) as source:
+                            if info.filename in parts and info.filename in translated_parts:
+                                with result.open(copied, "w") as target:
+                                    self._process_part(source, info.filename, parts[info.filename],
+                                                       translations, target)
+                            else:
+                                copied.file_size = info.file_size
+                                with result.open(copied, "w") as target:
+                                    shutil.copyfileobj(source, target)
         except Exception as e:
-            raise Exception(f"Lỗi khi tạo file Word đã dịch: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Lỗi khi tạo file Word đã dịch: {str(e)}")
+
+    def _text_parts(self, archive: zipfile.ZipFile) -> List[Tuple[str, bool]]:
+        """
+        Các phần chứa văn bản theo [Content_Types].xml: (tên phần, có phải tài liệu chính không)
+        Tài liệu chính đứng trước, sau đó là header và footer theo tên
+        """
+        root = ElementTree.fromstring(archive.read("[Content_Types].xml"))
+        main_parts, other_parts = [], []
+        for override in root.iter(f"{CONTENT_TYPES_NS}Override"):
+            name = override.get("PartName", "").lstrip("/")
+            content_type = override.get("ContentType", "")
+            if MAIN_CONTENT_TYPE.search(content_type):
+                main_parts.append((name, True))
+            elif HEADER_FOOTER_CONTENT_TYPE.search(content_type):
+                other_parts.append((name, False))
+        return main_parts + sorted(other_parts)
+
+    def _process_part(self, source: BinaryIO, part_name: str, main: bool,
+                      translations: Optional[Dict[Tuple[Optional[str], int], str]] = None,
+                      output: Optional[BinaryIO] = None) -> List[Dict[str, Any]]:
+        """
+        Duyệt một phần XML bằng expat theo từng khối và trả về các đoạn có văn bản
+        Nếu có output thì ghi lại phần đó: với đoạn đã dịch, phần tử nội dung đầu tiên của các run trực tiếp
+        (w:t, w:tab, w:br, w:cr) được thay bằng bản dịch, các phần tử nội dung còn lại bị xoá;
+        định dạng run, đoạn, hyperlink, bookmark, hình ảnh giữ nguyên. Các byte khác được chép nguyên vẹn
+        """
+        translations = translations or {}
+        paragraphs: List[Dict[str, Any]] = []
+        result: List[Dict[str, Any]] = []
+        stack: List[str] = []
+        counters = {"body": 0, "nested": 0}
+        # Vùng cần thay: (byte bắt đầu, byte kết thúc, nội dung mới); vùng đang mở chờ thẻ đóng
+        edits: List[Tuple[int, int, bytes]] = []
+        state: Dict[str, Any] = {"open_edit": None, "last_event": 0}
+        buffer = bytearray()
+        position = {"buffer_start": 0, "emitted": 0}
+
+        parser = expat.ParserCreate(namespace_separator=" ")
+        parser.buffer_text = True
+
+        def start(name, attrs):
+            index = parser.CurrentByteIndex
+            state["last_event"] = index
+            stack.append(name)
+            depth = len(stack)
+            if name == W_P:
+                if main and depth >= 2 and stack[-2] == W_BODY:
+                    counters["body"] += 1
+                    key = (None, counters["body"])
+                else:
+                    counters["nested"] += 1
+                    key = (part_name, counters["nested"])
+                paragraphs.append({"key": key, "depth": depth, "text": [], "run_depth": None,
+                                   "collect": False, "replaced": False,
+                                   "translation": translations.get(key)})
+                return
+            if not paragraphs:
+                return
+            paragraph = paragraphs[-1]
+            if name == W_R and paragraph["depth"] == depth - 1:
+                paragraph["run_depth"] = depth
+            elif name in RUN_CONTENT and paragraph["run_depth"] == depth - 1:
+                paragraph["text"].append(RUN_CONTENT[name])
+                paragraph["collect"] = name == W_T
+                if output is not None and paragraph["translation"] is not None:
+                    replacement = b""
+                    if not paragraph["replaced"]:
+                        prefix = TAG_PREFIX_PATTERN.match(buffer, index - position["buffer_start"]).group(1) or b""
+                        replacement = self._run_content(paragraph["translation"], prefix)
+                        paragraph["replaced"] = True
+                    # Vị trí kết thúc thẻ mở; với phần tử rỗng (<w:tab/>, <w:br/>) đó cũng là kết thúc phần tử
+                    tag_end = buffer.index(b">", index - position["buffer_start"]) + 1
+                    empty_end = tag_end + position["buffer_start"] if buffer[tag_end - 2:tag_end - 1] == b"/" else None
+                    state["open_edit"] = (index, replacement, depth, empty_end)
+
+        def end(name):
+            index = parser.CurrentByteIndex
+            state["last_event"] = index
+            depth = len(stack)
+            open_edit = state["open_edit"]
+            if open_edit is not None and open_edit[2] == depth:
+                end_index = open_edit[3]
+                if end_index is None:
+                    # Thẻ đóng </w:t> bắt đầu tại vị trí của sự kiện kết thúc
+                    end_index = buffer.index(b">", index - position["buffer_start"]) + 1 + position["buffer_start"]
+                edits.append((open_edit[0], end_index, open_edit[1]))
+                state["open_edit"] = None
+            if paragraphs:
+                paragraph = paragraphs[-1]
+                if name == W_T and paragraph["run_depth"] == depth - 1:
+                    paragraph["collect"] = False
+                elif name == W_R and paragraph["run_depth"] == depth:
+                    paragraph["run_depth"] = None
+                elif name == W_P and paragraph["depth"] == depth:
+                    paragraphs.pop()
+                    text = "".join(paragraph["text"])
+                    if text and not text.isspace():
+                        part, number = paragraph["key"]
+                        item: Dict[str, Any] = {"paragraph": number, "content": text}
+                        if part is not None:
+                            item["part"] = part
+                        result.append(item)
+            stack.pop()
+
+        def characters(data):
+            if paragraphs and paragraphs[-1]["collect"]:
+                paragraphs[-1]["text"].append(data)
+
+        def flush(safe: int) -> None:
+            # Ghi các byte trước vị trí safe, thay các vùng đã xác định
+            while edits and edits[0][0] < safe:
+                edit_start, edit_end, replacement = edits.pop(0)
+                output.write(buffer[position["emitted"] - position["buffer_start"]:edit_start - position["buffer_start"]])
+                output.write(replacement)
+                position["emitted"] = edit_end
+            if safe > position["emitted"]:
+                output.write(buffer[position["emitted"] - position["buffer_start"]:safe - position["buffer_start"]])
+                position["emitted"] = safe
+            del buffer[:position["emitted"] - position["buffer_start"]]
+            position["buffer_start"] = position["emitted"]
+
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = characters
+
+        while True:
+            chunk = source.read(XML_CHUNK_SIZE)
+            if output is not None:
+                buffer.extend(chunk)
+            parser.Parse(chunk, not chunk)
+            if not chunk:
+                break
+            if output is not None:
+                # Các byte trước sự kiện cuối cùng (hoặc trước vùng đang chờ thay) không còn thay đổi
+                open_edit = state["open_edit"]
+                flush(open_edit[0] if open_edit is not None else state["last_event"])
+
+        if output is not None:
+            flush(position["buffer_start"] + len(buffer))
+        return result
+
+    def _run_content(self, text: str, prefix: bytes) -> bytes:
+        """
+        Nội dung run cho một đoạn văn bản: tab thành w:tab, xuống dòng thành w:br (giống python-docx)
+        """
+        prefix = prefix.decode("ascii")
+        parts = []
+        for piece in NEWLINE_PATTERN.split(text):
+            if piece == "\t":
+                parts.append(f"<{prefix}tab/>")
+            elif piece in ("\n", "\r", "\r\n"):
+                parts.append(f"<{prefix}br/>")
+            elif piece:
+                parts.append(f'<{prefix}t xml:space="preserve">{escape(piece)}</{prefix}t>')
+        return "".join(parts).encode("utf-8")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Script đo kích thước response và thời gian serialize JSON của kết quả trích xuất (/upload)
+trước và sau khi dùng FastJSONResponse, nén brotli/gzip và dạng compact
+
+Cách dùng:
+    python benchmark_responses.py                 # dùng các tài liệu mẫu tự sinh
+    python benchmark_responses.py a.xlsx b.docx   # dùng tài liệu của bạn
+"""
+
+import io
+import sys
+import time
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.utils import fast_json
+from app.utils.compression import CompressionMiddleware, brotli
+from app.utils.excel_handler import ExcelHandler
+from app.utils.segment_codec import SegmentCodec
+from app.utils.word_handler import WordHandler
+
+REPEAT = 5
+
+
+def main():
+    print("===== ĐO KÍCH THƯỚC VÀ THỜI GIAN SERIALIZE RESPONSE =====")
+    print(f"orjson: {'có' if fast_json.orjson is not None else 'không có (dùng json chuẩn)'}")
+    print(f"brotli: {'có' if brotli is not None else 'không có (chỉ gzip)'}")
+
+    if len(sys.argv) > 1:
+        documents = [(Path(path).name, Path(path).read_bytes()) for path in sys.argv[1:]]
+    else:
+        documents = sample_documents()
+
+    for name, content in documents:
+        file_type, extracted = extract(name, content)
+        if extracted is None:
+            print(f"\nBỏ qua {name}: định dạng không hỗ trợ")
+            continue
+        print(f"\n===== {name} ({len(content) / 1024:.0f} KB, {len(SegmentCodec().holders(file_type, extracted))} đoạn) =====")
+        full = {"success": True, "file_type": file_type, "content": extracted, "filename": name}
+        compact = {"success": True, "file_type": file_type, "filename": name,
+                   "segments": SegmentCodec().segments(file_type, extracted)}
+
+        before, before_time = measure(lambda: JSONResponse(jsonable_encoder(full)).body)
+        after, after_time = measure(lambda: fast_json.dumps(full))
+        compact_body, compact_time = measure(lambda: fast_json.dumps(compact))
+
+        print(f"{'':28}{'JSON (byte)':>14}{'gzip':>12}{'brotli':>12}{'serialize (ms)':>16}")
+        report("Trước (JSONResponse)", before, before_time, compress=False)
+        report("Sau (FastJSONResponse)", after, after_time)
+        report("Sau, format=compact", compact_body, compact_time)
+
+
+def sample_documents():
+    """
+    Tài liệu mẫu: một workbook lớn và một file Word nhiều đoạn
+    """
+    import openpyxl
+
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    for row in range(1, 20001):
+        sheet.cell(row=row, column=1, value=f"Sản phẩm mẫu số {row}")
+        sheet.cell(row=row, column=2, value=row * 1000)
+        sheet.cell(row=row, column=3, value=f"Nhóm hàng {row % 50}")
+        sheet.cell(row=row, column=4, value=f"Ghi chú giao hàng cho đơn {row}, kiểm tra trước khi xuất kho")
+    excel_buffer = io.BytesIO()
+    workbook.save(excel_buffer)
+
+    documents = [("sample.xlsx", excel_buffer.getvalue())]
+
+    # python-docx chỉ dùng để tạo file Word mẫu, không bắt buộc
+    try:
+        import docx
+    except ImportError:
+        print("python-docx chưa được cài đặt, bỏ qua file Word mẫu")
+        return documents
+    document = docx.Document()
+    for i in range(3000):
+        document.add_paragraph(f"Đoạn văn thứ {i} của bản đặc tả kỹ thuật, mô tả yêu cầu và điều kiện nghiệm thu.")
+    word_buffer = io.BytesIO()
+    document.save(word_buffer)
+    documents.append(("sample.docx", word_buffer.getvalue()))
+    return documents
+
+
+def extract(name, content):
+    suffix = Path(name).suffix.lower()
+    if suffix == ".xlsx":
+        return "excel", ExcelHandler().extract_text_from_excel(content)
+    if suffix == ".docx":
+        return "word", WordHandler().extract_text_from_docx(content)
+    if suffix == ".pdf":
+        from app.utils.pdf_handler import PDFHandler
+        return "pdf", PDFHandler().extract_text_from_pdf(content)
+    return None, None
+
+
+def measure(serialize):
+    """
+    Serialize REPEAT lần, trả về kết quả và thời gian nhanh nhất (ms)
+    """
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        body = serialize()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return body, best
+
+
+def report(label, body, elapsed, compress=True):
+    middleware = CompressionMiddleware(app=None)
+    gzip_size = len(middleware._compress(body, "gzip")) if compress else None
+    brotli_size = len(middleware._compress(body, "br")) if compress and brotli is not None else None
+    print(f"{label:28}{len(body):>14,}{format_size(gzip_size):>12}{format_size(brotli_size):>12}{elapsed:>16.1f}")
+
+
+def format_size(size):
+    return f"{size:,}" if size is not None else "-"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# Cache của các test nằm trong thư mục tạm, không ghi vào backend/cache
+_CACHE_DIR = tempfile.mkdtemp(prefix="translator-tests-")
+os.environ.setdefault("TRANSLATION_MEMORY_PATH", os.path.join(_CACHE_DIR, "translation_memory.sqlite3"))
+os.environ.setdefault("OCR_CACHE_PATH", os.path.join(_CACHE_DIR, "ocr_cache.sqlite3"))
+os.environ.setdefault("OFFLINE_TRANSLATOR_LATENCY", "0")
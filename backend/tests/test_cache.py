@@ -0,0 +1,23 @@
+from app.utils.cache import PersistentCache
+
+
+def test_eviction_keeps_recently_read_entries(tmp_path):
+    # Không có lớp bộ nhớ trong: mọi lần đọc đều lấy từ đĩa; dọn dẹp sau mỗi lần ghi
+    cache = PersistentCache(str(tmp_path / "cache.db"), max_entries=3, memory_entries=0)
+    for key in ("a", "b", "c"):
+        cache.set(key, key.upper())
+    assert cache.get("a") == "A"
+    cache.set("d", "D")
+
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in ("a", "c", "d")] == ["A", "C", "D"]
+    assert cache.stats()["disk_entries"] == 3
+
+
+def test_reads_survive_reopening(tmp_path):
+    path = str(tmp_path / "cache.db")
+    PersistentCache(path).set("key", "value")
+
+    cache = PersistentCache(path)
+    assert cache.get("key") == "value"
+    assert cache.stats()["disk_hits"] == 1
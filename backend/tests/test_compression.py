@@ -0,0 +1,91 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.utils import compression
+from app.utils.compression import COMPRESSION_MIN_BYTES, CompressionMiddleware
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/json/{size}")
+    def json_body(size: int):
+        return PlainTextResponse("x" * size, media_type="application/json")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"a" * 2000, b"b" * 2000]), media_type="text/plain")
+
+    @app.get("/events")
+    def events():
+        return PlainTextResponse("data: x\n\n" * 500, media_type="text/event-stream")
+
+    @app.get("/file")
+    def file():
+        return PlainTextResponse("x" * 5000, media_type="application/pdf")
+
+    return TestClient(app)
+
+
+def raw_get(client, path, accept_encoding):
+    """
+    Lấy body chưa giải nén để kiểm tra đúng byte server gửi
+    """
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_gzip_when_client_accepts_it(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    response, body = raw_get(make_client(), "/json/5000", "gzip, br")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-length"] == str(len(body))
+    assert "accept-encoding" in response.headers["vary"].lower()
+    assert gzip.decompress(body) == b"x" * 5000
+
+
+@pytest.mark.skipif(compression.brotli is None, reason="brotli chưa được cài đặt")
+def test_brotli_is_preferred_when_available():
+    response, body = raw_get(make_client(), "/json/5000", "gzip, br")
+
+    assert response.headers["content-encoding"] == "br"
+    assert compression.brotli.decompress(body) == b"x" * 5000
+
+
+def test_no_compression_without_a_supported_encoding(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    client = make_client()
+
+    for accept_encoding in ("", "identity", "br", "gzip;q=0"):
+        response, body = raw_get(client, "/json/5000", accept_encoding)
+        assert "content-encoding" not in response.headers
+        assert body == b"x" * 5000
+
+
+def test_minimum_size_threshold():
+    client = make_client()
+
+    response, body = raw_get(client, f"/json/{COMPRESSION_MIN_BYTES - 1}", "gzip")
+    assert "content-encoding" not in response.headers
+    assert len(body) == COMPRESSION_MIN_BYTES - 1
+
+    response, _ = raw_get(client, f"/json/{COMPRESSION_MIN_BYTES}", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("/stream", b"a" * 2000 + b"b" * 2000),
+    ("/events", b"data: x\n\n" * 500),
+    ("/file", b"x" * 5000),
+])
+def test_streams_events_and_files_pass_through(path, expected):
+    response, body = raw_get(make_client(), path, "gzip, br")
+
+    assert "content-encoding" not in response.headers
+    assert body == expected
@@ -0,0 +1,71 @@
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils import fast_json
+from app.utils.document_store import DocumentStore
+
+
+def test_each_upload_has_its_own_id_and_state():
+    store = DocumentStore()
+    first = store.put(b"same file", "a.docx", "word")
+    second = store.put(b"same file", "b.docx", "word")
+
+    assert first.id != second.id
+    assert hashlib.sha256(b"same file").hexdigest() not in (first.id, second.id)
+    assert first.shared is second.shared
+    assert store.stats() == {"documents": 2, "contents": 1, "total_bytes": len(b"same file")}
+
+    first.translated = [{"paragraph": 1, "content": "a", "translated_content": "b"}]
+    assert store.get(second.id).translated is None
+    assert store.get(first.id).filename == "a.docx"
+
+
+def test_shared_content_is_freed_with_its_last_document():
+    store = DocumentStore(max_bytes=10)
+    first = store.put(b"12345678", "a.xlsx", "excel")
+    second = store.put(b"12345678", "b.xlsx", "excel")
+    store.put(b"abcdefgh", "c.xlsx", "excel")
+
+    # Vượt dung lượng: hai tài liệu cũ bị xoá, nội dung dùng chung chỉ được giải phóng sau tài liệu cuối
+    assert store.get(first.id) is None
+    assert store.get(second.id) is None
+    assert store.stats() == {"documents": 1, "contents": 1, "total_bytes": 8}
+
+
+def test_concurrent_uploads_extract_once():
+    store = DocumentStore()
+    calls = []
+
+    def extract():
+        calls.append(1)
+        time.sleep(0.05)
+        return [{"paragraph": 1, "content": "Hello"}]
+
+    documents = [store.put(b"same file", "a.docx", "word") for _ in range(4)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda document: store.extraction(document, None, extract), documents))
+
+    assert len(calls) == 1
+    assert sorted(reused for _, reused in results) == [False, True, True, True]
+    assert all(extracted is results[0][0] for extracted, _ in results)
+
+
+def test_extractions_and_translations_count_toward_max_bytes():
+    extracted = [{"paragraph": 1, "content": "x" * 100}]
+    store = DocumentStore(max_bytes=1000)
+    first = store.put(b"first", "a.docx", "word")
+    store.extraction(first, None, lambda: extracted)
+    assert store.stats()["total_bytes"] == len(b"first") + len(fast_json.dumps(extracted))
+
+    store.set_translated(first, [{"paragraph": 1, "content": "x" * 100, "translated_content": "y" * 100}])
+    translated_bytes = store.stats()["total_bytes"]
+    store.set_translated(first, None)
+    assert store.stats()["total_bytes"] == len(b"first") + len(fast_json.dumps(extracted))
+    assert translated_bytes > store.stats()["total_bytes"]
+
+    # Bản dịch lớn của tài liệu mới làm tài liệu cũ bị xoá dù file gốc rất nhỏ
+    second = store.put(b"second", "b.docx", "word")
+    store.set_translated(second, [{"paragraph": 1, "content": "z", "translated_content": "w" * 900}])
+    assert store.get(first.id) is None
+    assert store.stats()["contents"] == 1
@@ -0,0 +1,149 @@
+import datetime
+import io
+import re
+import zipfile
+
+import openpyxl
+from openpyxl.styles import Font
+
+from app.utils.excel_handler import ExcelHandler
+
+SHARED_STRINGS_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+SHARED_STRINGS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"
+
+
+def _sample_workbook() -> openpyxl.Workbook:
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Data"
+    sheet["A1"] = "Total"
+    sheet["A1"].font = Font(bold=True)
+    sheet["A2"] = "Total"
+    sheet["A3"] = "Price & <tax>"
+    sheet["B1"] = 42
+    sheet["B2"] = datetime.date(2024, 1, 31)
+    sheet["B3"] = True
+    sheet["C1"] = "=B1*2"
+    other = workbook.create_sheet("Other")
+    other["A1"] = "Total"
+    other["D5"] = "Note"
+    return workbook
+
+
+def _save(workbook: openpyxl.Workbook) -> bytes:
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def _with_shared_strings(content: bytes) -> bytes:
+    """
+    openpyxl ghi chuỗi inline; chuyển sang bảng sharedStrings như file do Excel tạo ra
+    """
+    source = zipfile.ZipFile(io.BytesIO(content))
+    output = io.BytesIO()
+    indexes = {}
+
+    def to_shared(match):
+        index = indexes.setdefault(match.group(2), len(indexes))
+        return match.group(1) + b' t="s"><v>' + str(index).encode() + b"</v></c>"
+
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as result:
+        for info in source.infolist():
+            data = source.read(info)
+            if info.filename.startswith("xl/worksheets/"):
+                data = re.sub(rb'(<c r="[A-Z]+\d+"(?: s="\d+")?) t="inlineStr"><is><t>(.*?)</t></is></c>', to_shared, data)
+            elif info.filename == "[Content_Types].xml":
+                data = data.replace(b"</Types>", b'<Override PartName="/xl/sharedStrings.xml" ContentType="'
+                                    + SHARED_STRINGS_TYPE.encode() + b'"/></Types>')
+            elif info.filename == "xl/_rels/workbook.xml.rels":
+                data = data.replace(b"</Relationships>", b'<Relationship Id="rIdStrings" Type="'
+                                    + SHARED_STRINGS_REL.encode() + b'" Target="sharedStrings.xml"/></Relationships>')
+            result.writestr(info, data)
+        strings = b"".join(b"<si><t>" + text + b"</t></si>" for text in indexes)
+        result.writestr("xl/sharedStrings.xml",
+                        b'<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">' + strings + b"</sst>")
+    return output.getvalue()
+
+
+def _translate(extracted, translations):
+    for sheet_data in extracted:
+        for cell in sheet_data["cells"]:
+            cell["translated_content"] = translations.get(cell["content"], cell["content"])
+    return extracted
+
+
+def _cell(extracted, sheet_name, address):
+    sheet_data = next(item for item in extracted if item["sheet_name"] == sheet_name)
+    return next(cell for cell in sheet_data["cells"] if cell["address"] == address)
+
+
+def test_extract_categories_and_sparse_cells():
+    workbook = _sample_workbook()
+    workbook["Other"]["XFD1048576"].font = Font(italic=True)
+    extracted = ExcelHandler().extract_text_from_excel(_save(workbook))
+
+    assert [item["sheet_name"] for item in extracted] == ["Data", "Other"]
+    assert _cell(extracted, "Data", "A1") == {"address": "A1", "content": "Total"}
+    assert _cell(extracted, "Data", "B1")["category"] == "number"
+    assert _cell(extracted, "Data", "B2")["category"] == "date"
+    assert _cell(extracted, "Data", "B3")["category"] == "boolean"
+    assert [cell["address"] for cell in extracted[1]["cells"]] == ["A1", "D5"]
+
+
+def test_shared_strings_round_trip_only_rewrites_string_table():
+    handler = ExcelHandler()
+    original = _with_shared_strings(_save(_sample_workbook()))
+    extracted = _translate(handler.extract_text_from_excel(original),
+                           {"Total": "Tổng", "Price & <tax>": "Giá & <thuế>", "Note": "Ghi chú"})
+
+    translated = handler.create_translated_excel(original, extracted)
+
+    workbook = openpyxl.load_workbook(io.BytesIO(translated))
+    sheet = workbook["Data"]
+    assert [sheet["A1"].value, sheet["A2"].value, sheet["A3"].value] == ["Tổng", "Tổng", "Giá & <thuế>"]
+    assert sheet["A1"].font.b is True
+    assert sheet["B1"].value == 42
+    assert sheet["C1"].value == "=B1*2"
+    assert workbook["Other"]["A1"].value == "Tổng"
+    before, after = zipfile.ZipFile(io.BytesIO(original)), zipfile.ZipFile(io.BytesIO(translated))
+    assert [name for name in before.namelist() if before.read(name) != after.read(name)] == ["xl/sharedStrings.xml"]
+
+
+def test_shared_string_kept_in_one_cell_is_not_overwritten():
+    handler = ExcelHandler()
+    original = _with_shared_strings(_save(_sample_workbook()))
+    extracted = _translate(handler.extract_text_from_excel(original), {"Total": "Tổng"})
+    _cell(extracted, "Data", "A2")["translated_content"] = "Total"
+
+    workbook = openpyxl.load_workbook(io.BytesIO(handler.create_translated_excel(original, extracted)))
+
+    assert workbook["Data"]["A1"].value == "Tổng"
+    assert workbook["Data"]["A2"].value == "Total"
+    assert workbook["Other"]["A1"].value == "Tổng"
+
+
+def test_shared_string_use_missing_from_translated_data_is_not_overwritten():
+    handler = ExcelHandler()
+    original = _with_shared_strings(_save(_sample_workbook()))
+    extracted = _translate(handler.extract_text_from_excel(original), {"Total": "Tổng"})
+    extracted = [sheet_data for sheet_data in extracted if sheet_data["sheet_name"] == "Data"]
+
+    workbook = openpyxl.load_workbook(io.BytesIO(handler.create_translated_excel(original, extracted)))
+
+    assert workbook["Data"]["A1"].value == "Tổng"
+    assert workbook["Other"]["A1"].value == "Total"
+
+
+def test_inline_strings_round_trip():
+    handler = ExcelHandler()
+    original = _save(_sample_workbook())
+    extracted = _translate(handler.extract_text_from_excel(original), {"Total": "Tổng", "Note": "Ghi chú"})
+
+    translated = handler.create_translated_excel(original, extracted)
+
+    workbook = openpyxl.load_workbook(io.BytesIO(translated))
+    assert workbook["Data"]["A2"].value == "Tổng"
+    assert workbook["Data"]["A3"].value == "Price & <tax>"
+    assert workbook["Other"]["D5"].value == "Ghi chú"
+    assert workbook["Data"]["C1"].value == "=B1*2"
@@ -0,0 +1,21 @@
+from app.utils import font_registry
+from app.utils.font_registry import FONTS_DIR, VIETNAMESE_SAMPLE, FontRegistry
+
+
+def test_bundled_fonts_cover_vietnamese(capsys):
+    registry = FontRegistry()
+
+    assert registry.content_font == "Roboto-Regular"
+    assert VIETNAMESE_SAMPLE <= registry.coverage[registry.content_font]
+    assert "VietFont" not in registry.coverage
+    assert "Lỗi" not in capsys.readouterr().out
+
+
+def test_viet_font_is_loaded_from_a_font_file_when_font_dir_is_empty(tmp_path, monkeypatch):
+    monkeypatch.setattr(font_registry, "VIET_FONT_FILES",
+                        [str(tmp_path / "missing.ttf"), str(FONTS_DIR / "Roboto-Regular.ttf")])
+    registry = FontRegistry(font_dirs=[tmp_path])
+
+    assert registry.content_font == "VietFont"
+    assert registry.font_for_char("ệ", registry.content_font) == "VietFont"
+    assert list(tmp_path.iterdir()) == []
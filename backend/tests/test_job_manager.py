@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from app.utils.job_manager import Job, JobManager, JobQueueFull
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "Hết thời gian chờ"
+        time.sleep(0.01)
+
+
+def blocking_task(started, release):
+    """
+    Công việc báo đã bắt đầu rồi chờ được giải phóng, kiểm tra yêu cầu huỷ trong lúc chờ
+    """
+    def task(job):
+        job.progress.start(2)
+        started.set()
+        while not release.wait(0.01):
+            job.progress.check()
+        job.progress.advance(2)
+        return "xong"
+    return task
+
+
+def test_status_and_result_transitions():
+    manager = JobManager(workers=1, max_queue=2)
+    started, release = threading.Event(), threading.Event()
+    job = manager.submit(blocking_task(started, release), filename="a.docx")
+
+    started.wait(5)
+    assert job.status == Job.RUNNING
+    assert job.to_dict()["progress"] == {"done": 0, "total": 2, "percent": 0.0}
+    assert job.to_dict()["filename"] == "a.docx"
+
+    release.set()
+    wait_for(lambda: job.finished)
+    assert job.status == Job.COMPLETED
+    assert job.result == "xong"
+    assert job.to_dict()["progress"]["percent"] == 100.0
+    assert manager.get(job.id) is job
+
+
+def test_failed_job_keeps_the_error():
+    manager = JobManager(workers=1, max_queue=1)
+
+    def task(job):
+        raise ValueError("file hỏng")
+
+    job = manager.submit(task)
+    wait_for(lambda: job.finished)
+    assert job.status == Job.FAILED
+    assert job.error == "file hỏng"
+    assert job.result is None
+
+
+def test_full_queue_rejects_new_jobs():
+    manager = JobManager(workers=1, max_queue=1)
+    started, release = threading.Event(), threading.Event()
+    running = manager.submit(blocking_task(started, release))
+    started.wait(5)
+    queued = manager.submit(blocking_task(threading.Event(), release))
+
+    with pytest.raises(JobQueueFull):
+        manager.submit(blocking_task(threading.Event(), release))
+    # Công việc bị từ chối không được lưu lại
+    stats = manager.stats()
+    assert (stats[Job.RUNNING], stats[Job.QUEUED], stats["queue_size"]) == (1, 1, 1)
+
+    # Hàng đợi trống lại thì nhận công việc mới
+    release.set()
+    wait_for(lambda: running.finished and queued.finished)
+    job = manager.submit(lambda job: "mới")
+    wait_for(lambda: job.finished)
+    assert job.result == "mới"
+
+
+def test_cancel_queued_job_never_runs():
+    manager = JobManager(workers=1, max_queue=2)
+    started, release = threading.Event(), threading.Event()
+    running = manager.submit(blocking_task(started, release))
+    started.wait(5)
+    calls = []
+    queued = manager.submit(calls.append)
+
+    assert manager.cancel(queued.id) is queued
+    assert queued.status == Job.CANCELLED
+
+    release.set()
+    wait_for(lambda: running.finished and manager.stats()["queue_size"] == 0)
+    time.sleep(0.05)
+    assert calls == []
+    assert queued.status == Job.CANCELLED
+    assert running.status == Job.COMPLETED
+
+
+def test_cancel_running_job_stops_at_next_progress_check():
+    manager = JobManager(workers=1, max_queue=1)
+    started, release = threading.Event(), threading.Event()
+    job = manager.submit(blocking_task(started, release))
+    started.wait(5)
+
+    manager.cancel(job.id)
+    wait_for(lambda: job.finished)
+    assert job.status == Job.CANCELLED
+    assert job.result is None
+    assert job.finished_at is not None
+
+    # Huỷ công việc đã xong không đổi trạng thái; id không tồn tại trả về None
+    assert manager.cancel(job.id).status == Job.CANCELLED
+    assert manager.cancel("missing") is None
+
+
+def test_finished_jobs_expire_after_result_ttl():
+    manager = JobManager(workers=1, max_queue=2, result_ttl=0)
+    job = manager.submit(lambda job: 1)
+    wait_for(lambda: job.finished)
+    time.sleep(0.01)
+
+    manager.submit(lambda job: 2)
+    assert manager.get(job.id) is None
@@ -0,0 +1,29 @@
+import importlib
+import sys
+
+from app.utils import memory_monitor
+
+
+def test_stats_report_peak_memory():
+    with memory_monitor.MemoryMonitor(interval=0.01) as monitor:
+        data = bytearray(32 * 1024 * 1024)
+    del data
+
+    stats = monitor.stats()
+    assert stats["peak_rss_mb"] >= stats["start_rss_mb"]
+    assert stats["children_max_rss_mb"] is not None
+
+
+def test_works_without_resource_and_proc(monkeypatch):
+    # Giống Windows: không có module resource và không có /proc/self/statm
+    monkeypatch.setitem(sys.modules, "resource", None)
+    module = importlib.reload(memory_monitor)
+    try:
+        monkeypatch.setattr(module, "current_rss", lambda: None)
+        with module.MemoryMonitor() as monitor:
+            pass
+        assert monitor.stats() == {"start_rss_mb": None, "peak_rss_mb": None,
+                                   "peak_delta_mb": None, "children_max_rss_mb": None}
+    finally:
+        monkeypatch.undo()
+        importlib.reload(memory_monitor)
@@ -0,0 +1,50 @@
+import io
+
+from PyPDF2 import PdfReader
+from reportlab.pdfgen import canvas
+
+from app.utils import pdf_handler
+from app.utils.pdf_handler import PDFHandler
+
+
+def make_pdf(pages):
+    buffer = io.BytesIO()
+    document = canvas.Canvas(buffer)
+    for i in range(pages):
+        document.drawString(72, 700, f"Page {i + 1}")
+        document.showPage()
+    document.save()
+    return buffer.getvalue()
+
+
+def page_texts(content):
+    return [page.extract_text() for page in PdfReader(io.BytesIO(content)).pages]
+
+
+def translated_pages(count):
+    # Trang 3 đủ dài để tràn sang trang sau
+    return [{"page": i + 1, "translated_content": f"Nội dung trang {i + 1}. " * (600 if i == 2 else 5)}
+            for i in range(count)]
+
+
+def test_split_page_ranges_keeps_order_and_balances_content():
+    pages = [("x" * length, i + 1, 6) for i, length in enumerate([10, 10, 100, 10, 10, 10])]
+    ranges = PDFHandler._split_page_ranges(pages, 3)
+
+    assert [page for page_range in ranges for page in page_range] == pages
+    assert len(ranges) <= 3
+    assert ranges[0][-1][1] == 3
+
+
+def test_parallel_render_matches_single_pass(monkeypatch):
+    handler = PDFHandler()
+    original = make_pdf(6)
+    single = handler.create_translated_pdf(original, translated_pages(6))
+
+    monkeypatch.setattr(pdf_handler, "PDF_RENDER_WORKERS", 2)
+    monkeypatch.setattr(pdf_handler, "PDF_PARALLEL_RENDER_MIN_PAGES", 2)
+    parallel = handler.create_translated_pdf(original, translated_pages(6))
+    handler._reset_process_executor("render")
+
+    assert page_texts(parallel) == page_texts(single)
+    assert len(page_texts(single)) > 6
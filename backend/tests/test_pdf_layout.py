@@ -0,0 +1,42 @@
+import pytest
+
+from app.utils.font_registry import get_font_registry
+from app.utils.pdf_layout import NO_LINE_START, LineBreaker
+
+
+@pytest.fixture
+def breaker():
+    fonts = get_font_registry()
+    return LineBreaker(fonts, fonts.content_font, 11, 120)
+
+
+def test_long_word_is_split_across_lines(breaker):
+    word = "Siêudàikhôngcókhoảngtrắng" * 4
+    lines = breaker.break_paragraph(f"Mở đầu {word} kết thúc")
+
+    assert "".join(lines).replace(" ", "") == f"Mở đầu {word} kết thúc".replace(" ", "")
+    assert all(breaker.width(line) <= breaker.max_width for line in lines)
+    assert len(lines) > 3
+
+
+def test_vietnamese_words_are_kept_whole(breaker):
+    text = "Bản dịch tiếng Việt được ngắt dòng theo từ, không cắt giữa các chữ có dấu như nghiêng, ướt, khuỷu."
+    lines = breaker.break_paragraph(text)
+
+    assert len(lines) > 1
+    assert " ".join(lines) == text
+    assert all(breaker.width(line) <= breaker.max_width for line in lines)
+
+
+def test_cjk_text_breaks_between_characters_with_kinsoku(breaker):
+    text = "日本語の文章は単語の間に空白がないので、文字ごとに改行できる。句読点は行頭に置かない。" * 2
+    lines = breaker.break_paragraph(text)
+
+    assert "".join(lines) == text
+    assert len(lines) > 2
+    assert not any(line[0] in NO_LINE_START for line in lines)
+
+
+def test_empty_lines_are_kept(breaker):
+    assert breaker.break_text("Một\n\nHai") == ["Một", "", "", "Hai", ""]
+    assert breaker.break_text("") == [""]
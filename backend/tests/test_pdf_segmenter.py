@@ -0,0 +1,61 @@
+import io
+
+from PyPDF2 import PdfReader
+from reportlab.pdfgen import canvas
+
+from app.utils.pdf_segmenter import PDFSegmenter
+
+
+def make_page():
+    """
+    Một trang có tiêu đề, đoạn văn hai dòng và một đoạn ở cuối trang
+    """
+    buffer = io.BytesIO()
+    document = canvas.Canvas(buffer, pagesize=(600, 800))
+    document.setFont("Helvetica-Bold", 18)
+    document.drawString(72, 740, "Quarterly report")
+    document.setFont("Helvetica", 11)
+    document.drawString(72, 700, "Revenue grew in every region")
+    document.drawString(72, 686, "compared with last year.")
+    document.drawString(300, 100, "Page footer")
+    document.save()
+    return PdfReader(io.BytesIO(buffer.getvalue())).pages[0]
+
+
+def test_page_is_split_into_blocks_with_bboxes():
+    text, blocks = PDFSegmenter().extract_page(make_page())
+
+    assert "Quarterly report" in text
+    assert [block["content"] for block in blocks] == [
+        "Quarterly report",
+        "Revenue grew in every region compared with last year.",
+        "Page footer",
+    ]
+    title, paragraph, footer = (block["bbox"] for block in blocks)
+    assert title[0] == 72 and title[1] == 740 and title[3] == 758
+    # Đoạn văn bao cả hai dòng: từ dòng thứ hai (y=686) đến đỉnh dòng đầu (700 + cỡ chữ)
+    assert paragraph[0] == 72 and paragraph[1] == 686 and paragraph[3] == 711
+    assert paragraph[2] > paragraph[0]
+    assert footer[:2] == [300, 100]
+
+
+def test_ocr_blocks_are_grouped_and_converted_to_points():
+    data = {
+        "text": ["Hello", "world", "", "Second", "block"],
+        "block_num": [1, 1, 1, 2, 2],
+        "par_num": [1, 1, 1, 1, 1],
+        "line_num": [1, 2, 2, 1, 1],
+        "left": [100, 100, 0, 100, 400],
+        "top": [100, 150, 0, 600, 600],
+        "width": [200, 180, 0, 250, 150],
+        "height": [40, 40, 0, 40, 40],
+    }
+    segmenter = PDFSegmenter()
+    blocks = segmenter.blocks_from_ocr_data(data)
+
+    assert blocks == [
+        {"content": "Hello world", "bbox": [100, 100, 300, 190]},
+        {"content": "Second block", "bbox": [100, 600, 550, 640]},
+    ]
+    # 300 DPI: 1 điểm ảnh = 0.24 point, trục y đảo chiều theo chiều cao trang
+    assert segmenter.ocr_blocks_to_page(blocks, 300, 842)[0]["bbox"] == [24.0, 796.4, 72.0, 818.0]
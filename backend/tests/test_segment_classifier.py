@@ -0,0 +1,23 @@
+import pytest
+
+from app.utils.segment_classifier import SegmentClassifier
+
+
+@pytest.mark.parametrize("text", [
+    "{0}", "{{customer_name}}", "${value}", "%s", "%(name)s",
+    "<br>", "<br/>", "</p>", '<a href="https://example.com">', "<img src='logo.png' alt=\"\" />",
+])
+def test_placeholders_are_not_translated(text):
+    assert SegmentClassifier().classify(text) == "placeholder"
+
+
+@pytest.mark.parametrize("text", [
+    "<Click here to continue>",
+    "<Nhấn vào đây để tiếp tục>",
+    "<<Important notice>>",
+    "If a < b and c > d then stop",
+    "Press <Enter> to save",
+    "<b>Bold text</b>",
+])
+def test_prose_with_angle_brackets_is_translated(text):
+    assert SegmentClassifier().classify(text) is None
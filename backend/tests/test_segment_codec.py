@@ -0,0 +1,74 @@
+import copy
+
+import pytest
+
+from app.utils import fast_json
+from app.utils.segment_codec import SegmentCodec
+from app.utils.translator import SEGMENT_SEPARATOR
+
+DOCUMENTS = {
+    "word": [
+        {"paragraph": 1, "content": "Xin chào"},
+        {"paragraph": 1, "content": "表の中の文章", "part": "word/document.xml"},
+        {"paragraph": 2, "content": f"Có dấu phân cách{SEGMENT_SEPARATOR}ở giữa"},
+    ],
+    "excel": [
+        {"sheet_name": "Trang tính", "cells": [{"address": "A1", "content": "Giá\tbán"},
+                                               {"address": "B1", "content": "1,000", "category": "number"}]},
+        {"sheet_name": "データ", "cells": [{"address": "C3", "content": "ghi chú\n\nhai đoạn"}]},
+    ],
+    "pdf": [
+        {"page": 1, "content": "Trang một", "blocks": [
+            {"content": "Tiêu đề", "bbox": [72, 740, 200, 758]},
+            {"content": "Đoạn có \"ngoặc kép\" và [#]", "bbox": [72, 600, 500, 700]},
+        ]},
+        {"page": 2, "content": "Trang hai không chia khối 😀"},
+    ],
+}
+
+
+@pytest.mark.parametrize("file_type", DOCUMENTS)
+def test_round_trip_through_json(file_type):
+    codec = SegmentCodec()
+    extracted = DOCUMENTS[file_type]
+    original = copy.deepcopy(extracted)
+    segments = fast_json.loads(fast_json.dumps(codec.segments(file_type, extracted)))
+
+    # Client dịch từng đoạn (trừ đoạn cuối giữ nguyên) và gửi lại danh sách theo id
+    translations = [f"VI {segment}" for segment in segments[:-1]] + [None]
+    translated = codec.apply(file_type, extracted, fast_json.loads(fast_json.dumps(translations)))
+
+    assert extracted == original
+    assert codec.segments(file_type, translated) == segments
+    assert codec.translations(file_type, translated) == translations
+    holders = codec.holders(file_type, translated)
+    assert holders[-1]["translated_content"] == segments[-1]
+
+
+def test_pdf_page_text_is_rebuilt_from_blocks():
+    codec = SegmentCodec()
+    translated = codec.apply("pdf", DOCUMENTS["pdf"], {"1": "Bản dịch [#] khối hai"})
+
+    assert translated[0]["translated_content"] == "Tiêu đề\n\nBản dịch [#] khối hai"
+    assert translated[0]["blocks"][0]["bbox"] == [72, 740, 200, 758]
+    assert translated[1]["translated_content"] == "Trang hai không chia khối 😀"
+
+
+def test_deltas_apply_on_top_of_previous_translation():
+    codec = SegmentCodec()
+    first = codec.apply("word", DOCUMENTS["word"], ["A", "B", "C"])
+    second = codec.apply("word", first, {"1": "B2"})
+
+    assert codec.translations("word", second) == ["A", "B2", "C"]
+    assert codec.translations("word", first) == ["A", "B", "C"]
+
+
+@pytest.mark.parametrize("updates, message", [
+    ({"x": "a"}, "Id đoạn không hợp lệ"),
+    ({"3": "a"}, "Id đoạn không tồn tại"),
+    ([None, None, None, "a"], "Id đoạn không tồn tại"),
+    ({"0": 5}, "phải là chuỗi"),
+])
+def test_invalid_updates_are_rejected(updates, message):
+    with pytest.raises(ValueError, match=message):
+        SegmentCodec().apply("word", DOCUMENTS["word"], updates)
@@ -0,0 +1,236 @@
+import threading
+
+import pytest
+from deep_translator.exceptions import NotValidLength
+
+from app.utils import translator as translator_module
+from app.utils.cache import PersistentCache
+from app.utils.translator import OfflineBackend, Translator, _PooledGoogleTranslator
+
+
+def make_translator(tmp_path, backend=None):
+    """
+    Translator dùng backend offline và bộ nhớ dịch riêng cho từng test
+    """
+    translator = Translator(backend=backend or OfflineBackend(latency=0, prefix="VI:"))
+    translator.memory = PersistentCache(str(tmp_path / "translation_memory.sqlite3"), table="translations")
+    return translator
+
+
+class MergingBackend(OfflineBackend):
+    """
+    Backend làm mất dấu phân cách giữa các đoạn trong batch, như khi API gộp câu
+    """
+
+    def translate(self, text, source, target):
+        return super().translate(translator_module.SEGMENT_SEPARATOR_PATTERN.sub(" ", text), source, target)
+
+
+class FailingBatchBackend(OfflineBackend):
+    """
+    Backend báo lỗi với yêu cầu gộp nhiều đoạn hoặc với các văn bản trong failing
+    """
+
+    def __init__(self, failing=()):
+        super().__init__(latency=0, prefix="VI:")
+        self.failing = set(failing)
+
+    def translate(self, text, source, target):
+        if translator_module.SEGMENT_SEPARATOR_PATTERN.search(text) or text.strip() in self.failing:
+            raise RuntimeError("lỗi từ API")
+        return super().translate(text, source, target)
+
+
+def test_batch_packs_short_segments_into_few_requests(tmp_path):
+    translator = make_translator(tmp_path)
+    texts = [f"Short sentence number {i}" for i in range(250)]
+
+    assert translator.translate_batch(texts, "en") == [f"VI:{text}" for text in texts]
+    # Tối đa MAX_SEGMENTS_PER_BATCH đoạn mỗi lần gọi
+    assert translator.backend.request_count == 3
+
+    # Lần sau lấy từ bộ nhớ dịch
+    assert translator.translate_batch(texts[:10], "en") == [f"VI:{text}" for text in texts[:10]]
+    assert translator.backend.request_count == 3
+
+
+def test_batch_splits_by_request_length(tmp_path):
+    translator = make_translator(tmp_path)
+    texts = [f"{i} " + "word " * 200 for i in range(10)]
+
+    translator.translate_batch(texts, "en")
+    # Mỗi đoạn khoảng 1000 ký tự: tối đa 4 đoạn trong giới hạn MAX_REQUEST_CHARS
+    assert translator.backend.request_count == 3
+    assert translator.backend.char_count <= 3 * translator_module.MAX_REQUEST_CHARS
+
+
+def test_batch_falls_back_to_single_segments_when_split_does_not_match(tmp_path):
+    translator = make_translator(tmp_path, MergingBackend(latency=0, prefix="VI:"))
+    texts = ["First line", "Second line", "Third line"]
+
+    assert translator.translate_batch(texts, "en") == ["VI:First line", "VI:Second line", "VI:Third line"]
+    assert translator.backend.request_count == 1 + len(texts)
+
+
+def test_batch_falls_back_when_batch_request_fails(tmp_path):
+    translator = make_translator(tmp_path, FailingBatchBackend(failing=["Second line"]))
+    texts = ["First line", "Second line", "Third line"]
+
+    # Đoạn vẫn lỗi khi dịch riêng thì giữ nguyên văn bản gốc và không lưu vào bộ nhớ dịch
+    assert translator.translate_batch(texts, "en") == ["VI:First line", "Second line", "VI:Third line"]
+    assert translator.memory.get(translator._memory_key("Second line", "en")) is None
+
+
+def test_stream_keeps_at_most_lookahead_blocks_submitted(tmp_path):
+    submitted = []
+    lock = threading.Lock()
+
+    def translate_block(block):
+        with lock:
+            submitted.append(block)
+        return block * 10
+
+    blocks = list(range(20))
+    stream = make_translator(tmp_path).iter_translated_blocks(blocks, translate_block)
+    results = []
+    for result in stream:
+        # Khối i đang được trả về: chỉ các khối tới i + STREAM_LOOKAHEAD được gửi đi
+        assert len(submitted) <= len(results) + 1 + translator_module.STREAM_LOOKAHEAD
+        results.append(result)
+    assert results == [block * 10 for block in blocks]
+
+
+def test_stream_stops_submitting_when_closed(tmp_path):
+    submitted = []
+    cancel_event = threading.Event()
+    stream = make_translator(tmp_path).iter_translated_blocks(list(range(100)), submitted.append, cancel_event)
+    next(stream)
+    stream.close()
+
+    assert cancel_event.is_set()
+    assert len(submitted) <= 1 + translator_module.STREAM_LOOKAHEAD
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, text):
+        self.text = f'<div class="result-container">{text}</div>'
+
+
+class FakeSession:
+    """
+    Thay requests.Session: trả lại nguyên văn khi có tham số hl, ngược lại trả bản dịch
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, params, **kwargs):
+        self.calls.append(dict(params))
+        return FakeResponse(params["q"] if "hl" in params else f"VI:{params['q']}")
+
+
+def test_pooled_google_retries_without_hl_when_text_is_unchanged():
+    session = FakeSession()
+    client = _PooledGoogleTranslator(session, "en", "vi")
+    client._url_params = {"hl": "en"}
+
+    assert client.translate("  Hello  ") == "VI:Hello"
+    assert ["hl" in params for params in session.calls] == [True, False]
+    assert client._url_params == {"hl": "en"}
+
+
+def test_pooled_google_rejects_invalid_input():
+    client = _PooledGoogleTranslator(FakeSession(), "en", "vi")
+    with pytest.raises(NotValidLength):
+        client.translate("a" * 5000)
+    assert client.translate("   ") == ""
+
+
+def test_duplicate_segments_are_translated_once(tmp_path):
+    translator = make_translator(tmp_path)
+    paragraphs = [
+        {"paragraph": 1, "content": "Hello world"},
+        {"paragraph": 2, "content": "  Hello   world "},
+        {"paragraph": 3, "content": "Goodbye"},
+        {"paragraph": 4, "content": "Hello world", "part": "word/header1.xml"},
+    ]
+    stats = {}
+
+    result = translator.translate_word_content(paragraphs, stats)
+
+    assert [item["translated_content"] for item in result] == ["VI:Hello world"] * 2 + ["VI:Goodbye", "VI:Hello world"]
+    assert result[3]["part"] == "word/header1.xml"
+    assert stats["unique_segments"] == 2
+    assert stats["dedup_ratio"] == 2.0
+    # Hai đoạn duy nhất gộp trong một batch
+    assert translator.backend.request_count == 1
+
+
+def test_duplicate_cells_across_sheets_are_translated_once(tmp_path):
+    translator = make_translator(tmp_path)
+    content = [
+        {"sheet_name": f"Sheet{n}", "cells": [{"address": "A1", "content": "Total price"},
+                                             {"address": "B1", "content": "Customer name"}]}
+        for n in range(3)
+    ]
+    stats = {}
+
+    result = translator.translate_excel_content(content, stats)
+
+    assert all(sheet["cells"][0]["translated_content"] == "VI:Total price" for sheet in result)
+    assert stats["segments"] == 6
+    assert stats["unique_segments"] == 2
+    assert translator.backend.char_count == len("Total price") + len("Customer name") + len(translator_module.SEGMENT_SEPARATOR)
+
+
+def test_non_translatable_segments_pass_through(tmp_path):
+    translator = make_translator(tmp_path)
+    paragraphs = [{"paragraph": i + 1, "content": text} for i, text in enumerate([
+        "1,250.00 USD", "2024-03-15", "https://example.com/docs", "AB-1234", "{{customer_name}}", "Send the invoice",
+    ])]
+    stats = {}
+
+    result = translator.translate_word_content(paragraphs, stats)
+
+    assert [item["translated_content"] for item in result] == [
+        "1,250.00 USD", "2024-03-15", "https://example.com/docs", "AB-1234", "{{customer_name}}", "VI:Send the invoice",
+    ]
+    assert stats["translatable_segments"] == 1
+    assert stats["skipped"]["number"] == 1 and stats["skipped"]["url"] == 1
+    assert translator.backend.char_count == len("Send the invoice")
+
+
+def test_known_cell_categories_are_not_translated(tmp_path):
+    translator = make_translator(tmp_path)
+    content = [{"sheet_name": "Sheet", "cells": [
+        {"address": "A1", "content": "TRUE", "category": "boolean"},
+        {"address": "A2", "content": "Unit price"},
+    ]}]
+    stats = {}
+
+    cells = translator.translate_excel_content(content, stats)[0]["cells"]
+
+    assert [cell["translated_content"] for cell in cells] == ["TRUE", "VI:Unit price"]
+    assert cells[0]["category"] == "boolean"
+    assert stats["skipped"] == {"boolean": 1}
+
+
+class OtherBackend(OfflineBackend):
+    name = "google"
+
+
+def test_translation_memory_is_separate_per_backend(tmp_path):
+    offline = make_translator(tmp_path, OfflineBackend(latency=0))
+    assert offline.translate_batch(["Hello world"], "en") == ["Hello world"]
+
+    # Cùng file bộ nhớ dịch nhưng backend khác: không dùng lại kết quả của backend offline
+    other = make_translator(tmp_path, OtherBackend(latency=0, prefix="G:"))
+    assert other.translate_batch(["Hello world"], "en") == ["G:Hello world"]
+    assert other.backend.request_count == 1
+
+
+def test_offline_backend_does_not_write_the_translation_memory_file():
+    translator = Translator(backend=OfflineBackend(latency=0))
+    assert translator.memory.path == ":memory:"
@@ -0,0 +1,81 @@
+import io
+
+import docx
+import pytest
+
+from app.utils.word_handler import WordHandler
+import app.utils.word_handler as word_handler_module
+
+
+def _sample_docx() -> bytes:
+    document = docx.Document()
+    paragraph = document.add_paragraph("First ")
+    run = paragraph.add_run("Second\tline")
+    run.bold = True
+    run.add_break()
+    paragraph.add_run("after break")
+    document.add_paragraph("")
+    document.add_paragraph("Plain text")
+    table = document.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = "Cell A"
+    table.cell(1, 1).text = "Cell\tD"
+    document.add_paragraph("Last paragraph")
+    section = document.sections[0]
+    section.header.paragraphs[0].text = "Header text"
+    section.footer.paragraphs[0].text = "Footer\ttext"
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def _translate(items):
+    return [{**item, "translated_content": "VI:" + item["content"]} for item in items]
+
+
+@pytest.mark.parametrize("chunk_size", [64 * 1024, 97])
+def test_docx_round_trip(monkeypatch, chunk_size):
+    # Khối nhỏ để thử các thẻ nằm vắt qua ranh giới khối
+    monkeypatch.setattr(word_handler_module, "XML_CHUNK_SIZE", chunk_size)
+    handler = WordHandler()
+    original = _sample_docx()
+
+    extracted = handler.extract_text_from_docx(original)
+    body = [(item["paragraph"], item["content"]) for item in extracted if "part" not in item]
+    expected = [(i + 1, p.text) for i, p in enumerate(docx.Document(io.BytesIO(original)).paragraphs)
+                if p.text and not p.text.isspace()]
+    assert body == expected
+
+    translated = handler.create_translated_docx(original, _translate(extracted))
+    document = docx.Document(io.BytesIO(translated))
+
+    assert document.paragraphs[0].text == "VI:First Second\tline\nafter break"
+    assert document.paragraphs[0].runs[0].bold is None
+    assert document.paragraphs[2].text == "VI:Plain text"
+    assert document.tables[0].cell(0, 0).text == "VI:Cell A"
+    assert document.tables[0].cell(1, 1).text == "VI:Cell\tD"
+    assert document.paragraphs[-1].text == "VI:Last paragraph"
+    assert document.sections[0].header.paragraphs[0].text == "VI:Header text"
+    assert document.sections[0].footer.paragraphs[0].text == "VI:Footer\ttext"
+
+    reextracted = handler.extract_text_from_docx(translated)
+    assert [item["content"] for item in reextracted] == ["VI:" + item["content"] for item in extracted]
+
+
+def test_docx_untranslated_paragraphs_are_kept():
+    handler = WordHandler()
+    original = _sample_docx()
+    extracted = _translate(handler.extract_text_from_docx(original))
+    extracted[0]["translated_content"] = extracted[0]["content"]
+
+    document = docx.Document(io.BytesIO(handler.create_translated_docx(original, extracted)))
+
+    assert document.paragraphs[0].text == "First Second\tline\nafter break"
+    assert document.paragraphs[0].runs[1].bold is True
+    assert document.paragraphs[2].text == "VI:Plain text"
+
+
+def test_docx_without_translations_is_unchanged():
+    handler = WordHandler()
+    original = _sample_docx()
+    output = handler.create_translated_docx(original, [])
+    assert handler.extract_text_from_docx(output) == handler.extract_text_from_docx(original)